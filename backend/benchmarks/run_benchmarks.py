@@ -0,0 +1,262 @@
+# Times every stage of the training pipeline on synthetic data, e.g. from backend/:
+#
+#   python benchmarks/run_benchmarks.py --rows 1000,10000 --output bench.json
+#   python benchmarks/run_benchmarks.py --baseline baseline.json --fail-on-regression
+#
+# Cases are generated from a fixed seed so runs on the same machine are comparable.
+# Per stage it records the median wall time over --repeat runs and the peak memory
+# allocated during the stage (tracemalloc).
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+STAGES = ["load", "preprocess", "fit", "metrics", "plots", "save"]
+
+# Service modules are imported inside the functions below: they create their
+# working directories on import, which must happen inside the scratch dir.
+
+
+def make_dataset(task_type, rows, numeric, categorical, cardinality, seed=0):
+    from sklearn.datasets import make_blobs, make_classification, make_regression
+
+    rng = np.random.default_rng(seed)
+    if task_type == "Classification":
+        X, y = make_classification(rows, numeric, n_informative=max(2, numeric // 2), n_classes=3, random_state=seed)
+    elif task_type == "Regression":
+        X, y = make_regression(rows, numeric, noise=10.0, random_state=seed)
+    else:
+        X, y = make_blobs(rows, numeric, centers=5, random_state=seed)
+        y = None
+
+    df = pd.DataFrame(X, columns=[f"num_{i}" for i in range(numeric)])
+    for i in range(categorical):
+        df[f"cat_{i}"] = rng.integers(0, cardinality, rows).astype(str)
+        df[f"cat_{i}"] = "c" + df[f"cat_{i}"]
+    if y is not None:
+        df["target"] = y
+    return df
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, func, *args, **kwargs):
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stages[name] = {"seconds": seconds, "peak_mb": peak / 1024 ** 2}
+
+
+def run_case(task_type, model_name, df, dataset_name):
+    from services import dataset_store
+    from services.preprocessing import UPLOAD_DIR, load_dataset, preprocess_data
+    from services.model_factory import get_model, supports_sparse
+    from services.metrics_engine import calculate_metrics
+    from services.training_engine import downsample, save_model
+    from services.resource_governor import choose_sample, matrix_shape
+    from services import visualization_engine as viz
+    from sklearn.model_selection import train_test_split
+    import scipy.sparse as sp
+
+    csv_path = os.path.join(UPLOAD_DIR, dataset_name)
+    if not os.path.exists(csv_path):
+        df.to_csv(csv_path, index=False)
+    target = "target" if task_type != "Clustering" else None
+    timer = StageTimer()
+
+    def load():
+        dataset_store.ingest_csv(csv_path, dataset_name)
+        return load_dataset(dataset_name)
+
+    loaded = timer.run("load", load)
+    X, y, feature_names, preprocessor, label_encoder = timer.run("preprocess", preprocess_data, loaded, target, task_type)
+
+    def fit():
+        X_s, y_s = downsample(X, y, task_type, choose_sample(model_name, task_type, matrix_shape(X))["sample_rows"])
+        if sp.issparse(X_s) and not supports_sparse(model_name):
+            X_s = X_s.toarray()
+        model = get_model(task_type, model_name)
+        if task_type == "Clustering":
+            return model, X_s, None, model.fit_predict(X_s)
+        X_train, X_test, y_train, y_test = train_test_split(X_s, y_s, test_size=0.2, random_state=42)
+        model.fit(X_train, y_train)
+        return model, X_test, y_test, None
+
+    model, X_eval, y_test, labels = timer.run("fit", fit)
+
+    def metrics():
+        if task_type == "Clustering":
+            return labels, calculate_metrics(labels, labels, task_type, X_eval)
+        y_pred = model.predict(X_eval)
+        return y_pred, calculate_metrics(y_test, y_pred, task_type)
+
+    y_pred, _ = timer.run("metrics", metrics)
+
+    def plots():
+        if task_type == "Classification":
+            data = {"confusion_matrix": viz.confusion_matrix_data(y_test, y_pred),
+                    "feature_importance": viz.feature_importance_data(model, feature_names)}
+        elif task_type == "Regression":
+            data = {"residual_plot": viz.residual_data(y_test, y_pred),
+                    "feature_importance": viz.feature_importance_data(model, feature_names)}
+        else:
+            data = {"cluster_plot": viz.cluster_data(X_eval, y_pred)}
+        return {kind: len(viz.RENDERERS[kind](d)) for kind, d in data.items() if d is not None}
+
+    timer.run("plots", plots)
+    timer.run("save", save_model, model, task_type, model_name, preprocessor, label_encoder)
+    return timer.stages
+
+
+def run_benchmarks(args):
+    from services.model_factory import AVAILABLE_MODELS
+
+    results = []
+    for task_type in args.tasks:
+        for rows in args.rows:
+            df = make_dataset(task_type, rows, args.numeric, args.categorical, args.cardinality, args.seed)
+            dataset_name = f"bench_{task_type.lower()}_{rows}.csv"
+            for model_name in AVAILABLE_MODELS[task_type]:
+                if args.models and model_name not in args.models:
+                    continue
+                case = {"task_type": task_type, "model_name": model_name, "rows": rows,
+                        "numeric": args.numeric, "categorical": args.categorical, "cardinality": args.cardinality}
+                runs = []
+                try:
+                    for _ in range(args.repeat):
+                        runs.append(run_case(task_type, model_name, df, dataset_name))
+                except Exception as e:
+                    case["error"] = str(e) or e.__class__.__name__
+                if runs:
+                    case["stages"] = {
+                        stage: {
+                            "seconds": float(np.median([r[stage]["seconds"] for r in runs])),
+                            "peak_mb": float(max(r[stage]["peak_mb"] for r in runs)),
+                        }
+                        for stage in STAGES
+                    }
+                    case["total_seconds"] = sum(s["seconds"] for s in case["stages"].values())
+                results.append(case)
+                print(_format_case(case), flush=True)
+    return results
+
+
+def _case_key(case):
+    return (case["task_type"], case["model_name"], case["rows"], case["numeric"], case["categorical"], case["cardinality"])
+
+
+def compare(results, baseline, tolerance):
+    # Marks every stage whose time grew by more than `tolerance` (a fraction)
+    baseline_cases = {_case_key(c): c for c in baseline["results"] if "stages" in c}
+    regressions = []
+    for case in results:
+        base = baseline_cases.get(_case_key(case))
+        if base is None or "stages" not in case:
+            continue
+        case["baseline"] = {}
+        for stage in STAGES:
+            before, after = base["stages"][stage]["seconds"], case["stages"][stage]["seconds"]
+            ratio = after / before if before > 0 else None
+            case["baseline"][stage] = {"seconds": before, "ratio": ratio}
+            # Sub-10ms stages are mostly timer noise
+            if ratio is not None and ratio > 1 + tolerance and after - before > 0.01:
+                regressions.append(f"{case['task_type']} / {case['model_name']} / {case['rows']} rows: "
+                                   f"{stage} {before:.3f}s -> {after:.3f}s ({ratio:.2f}x)")
+    return regressions
+
+
+def _format_case(case):
+    label = f"{case['task_type']:<15} {case['model_name']:<25} {case['rows']:>9,}"
+    if "error" in case:
+        return f"{label}  ERROR: {case['error']}"
+    stages = "  ".join(f"{s}={case['stages'][s]['seconds']:.3f}s/{case['stages'][s]['peak_mb']:.0f}MB" for s in STAGES)
+    return f"{label}  total={case['total_seconds']:.3f}s  {stages}"
+
+
+def _csv_list(cast=str):
+    return lambda value: [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ML Studio training pipeline")
+    parser.add_argument("--tasks", type=_csv_list(), default=["Classification", "Regression", "Clustering"])
+    parser.add_argument("--models", type=_csv_list(), default=None, help="only these model names")
+    parser.add_argument("--rows", type=_csv_list(int), default=[1000, 10000])
+    parser.add_argument("--numeric", type=int, default=10, help="numeric feature columns")
+    parser.add_argument("--categorical", type=int, default=3, help="categorical feature columns")
+    parser.add_argument("--cardinality", type=int, default=20, help="distinct values per categorical column")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown per stage, e.g. 0.2 = 20%%")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    # Every directory the services create (uploads, models_saved, ...) lands in a scratch dir
+    with tempfile.TemporaryDirectory(prefix="ml-studio-bench-") as workdir:
+        os.chdir(workdir)
+        results = run_benchmarks(args)
+
+    import sklearn
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if baseline_path and os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+        print(f"\n{len(regressions)} stage(s) slower than baseline by more than {args.tolerance:.0%}")
+        for line in regressions:
+            print("  " + line)
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    if args.save_baseline and baseline_path:
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {baseline_path}")
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
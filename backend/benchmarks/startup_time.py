@@ -0,0 +1,60 @@
+# Measures how long a fresh API process takes to import and answer its first
+# request, e.g. from backend/:
+#
+#   python benchmarks/startup_time.py --repeat 5
+#
+# Each run is a new interpreter in a scratch directory, with the background
+# warm-up disabled so only the lazy import path is timed.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["sklearn", "scipy", "pandas", "matplotlib", "seaborn", "joblib", "pyarrow"]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    client.get("/")
+    first_response = time.perf_counter() - start
+print(json.dumps({
+    "import_seconds": imported,
+    "first_response_seconds": first_response,
+    "heavy_modules_loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_once(workdir):
+    env = dict(os.environ, WARMUP_ON_STARTUP="0", PYTHONPATH=BACKEND_DIR)
+    output = subprocess.run([sys.executable, "-c", CHILD], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure ML Studio API startup time")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="ml-studio-startup-") as workdir:
+        runs = [measure_once(workdir) for _ in range(args.repeat)]
+
+    for key in ("import_seconds", "first_response_seconds"):
+        values = [r[key] for r in runs]
+        print(f"{key:<24} median={statistics.median(values):.3f}s  min={min(values):.3f}s  max={max(values):.3f}s")
+    print(f"heavy modules loaded at startup: {', '.join(runs[-1]['heavy_modules_loaded']) or 'none'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
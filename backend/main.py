@@ -1,13 +1,54 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from database import engine, Base
-from routes import upload, train, history
+from migrations import run_migrations
+from routes import upload, train, history, jobs, sweep, visualization, predict, metrics
+from services import job_manager, result_writer, telemetry
+import importlib
+import logging
 import os
+import threading
 
-# Create DB tables
+# Create DB tables, then bring tables from older versions up to date
 Base.metadata.create_all(bind=engine)
+run_migrations()
+
+# Routes import scikit-learn, pandas and matplotlib on first use, so the API
+# answers as soon as it starts. Unless WARMUP_ON_STARTUP=0, a background thread
+# then loads them ahead of the first prediction or plot request.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+WARMUP_MODULES = ["services.dataset_store", "services.prediction_service", "services.visualization_engine", "services.tuning_engine"]
+
+_startup_seconds = {"import": time.perf_counter() - _import_started}
+telemetry.register_gauge("ml_startup_seconds", "Seconds spent in each startup phase",
+                         lambda: [({"phase": phase}, seconds) for phase, seconds in _startup_seconds.items()])
 
-app = FastAPI(title="ML Studio API", description="Backend for ML Studio", version="1.0.0")
+def warm_up():
+    start = time.perf_counter()
+    try:
+        for name in WARMUP_MODULES:
+            importlib.import_module(name)
+        importlib.import_module("services.visualization_engine").load_plotting()
+    except Exception:
+        # Everything still loads on first use
+        logging.getLogger(__name__).exception("Warm-up failed")
+    _startup_seconds["warmup"] = time.perf_counter() - start
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _startup_seconds["ready"] = time.perf_counter() - _import_started
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+    # Store results that are still queued, then stop the training worker pool
+    result_writer.shutdown()
+    job_manager.shutdown()
+
+app = FastAPI(title="ML Studio API", description="Backend for ML Studio", version="1.0.0", lifespan=lifespan)
 
 # CORS
 origins = [
@@ -25,13 +66,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so /api/history/1 and /api/history/2 share a series
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    telemetry.observe("ml_http_request_duration_seconds", "HTTP request latency by route", time.perf_counter() - start,
+                      method=request.method, route=route, status=f"{response.status_code // 100}xx")
+    return response
+
 # Include Routers
 app.include_router(upload.router, prefix="/api", tags=["Upload"])
 app.include_router(train.router, prefix="/api", tags=["Train"])
 app.include_router(history.router, prefix="/api", tags=["History"])
+app.include_router(jobs.router, prefix="/api", tags=["Jobs"])
+app.include_router(sweep.router, prefix="/api", tags=["Sweep"])
+app.include_router(visualization.router, prefix="/api", tags=["Visualization"])
+app.include_router(predict.router, prefix="/api", tags=["Predict"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 from fastapi.responses import FileResponse
-from services.training_engine import MODEL_DIR
+from services.paths import MODEL_DIR
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,54 @@
+from sqlalchemy import inspect, select, text, update
+from database import engine, Base
+from models.db_models import Experiment
+
+# create_all only creates missing tables. Columns and indexes added to existing
+# tables after their first release are added here at startup, so databases
+# created by an older version keep working. Every step is idempotent.
+
+
+def _backfill_summary(connection):
+    # Experiments stored before the summary column keep their metric values in metrics["metrics"]
+    experiments = Experiment.__table__
+    rows = connection.execute(select(experiments.c.id, experiments.c.metrics).where(experiments.c.summary.is_(None))).all()
+    for experiment_id, metrics in rows:
+        if isinstance(metrics, dict) and metrics.get("metrics") is not None:
+            connection.execute(update(experiments).where(experiments.c.id == experiment_id).values(summary=metrics["metrics"]))
+
+
+# (table, column, fills the new column on existing rows or None), in release order
+ADDED_COLUMNS = [
+    ("experiments", "summary", _backfill_summary),
+    ("experiments", "timings", None),
+    ("experiments", "request_key", None),
+    ("experiments", "sampling", None),
+]
+
+# Indexes declared on the models after their tables were first created
+ADDED_INDEXES = [
+    ("experiments", "ix_experiments_task_type"),
+    ("experiments", "ix_experiments_model_name"),
+    ("experiments", "ix_experiments_created_at"),
+    ("experiments", "ix_experiments_created_at_id"),
+    ("experiments", "ix_experiments_request_key"),
+]
+
+
+def run_migrations():
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing = {}
+        for table_name, column_name, backfill in ADDED_COLUMNS:
+            if table_name not in existing:
+                existing[table_name] = {c["name"] for c in inspector.get_columns(table_name)}
+            if column_name in existing[table_name]:
+                continue
+            column_type = Base.metadata.tables[table_name].c[column_name].type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+            existing[table_name].add(column_name)
+            if backfill is not None:
+                backfill(connection)
+
+        for table_name, index_name in ADDED_INDEXES:
+            index = next(i for i in Base.metadata.tables[table_name].indexes if i.name == index_name)
+            index.create(connection, checkfirst=True)
@@ -1,14 +1,48 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, Float
+from sqlalchemy import Column, Integer, String, JSON, DateTime, Float, ForeignKey, LargeBinary, Index
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 from database import Base
 
+def _utcnow():
+    # Set client-side so stored values keep microseconds and compare exactly
+    # against keyset pagination cursors (SQLite's CURRENT_TIMESTAMP has seconds only)
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class Experiment(Base):
     __tablename__ = "experiments"
 
     id = Column(Integer, primary_key=True, index=True)
     dataset_name = Column(String, index=True)
-    task_type = Column(String) # Classification, Regression, Clustering
-    model_name = Column(String)
-    metrics = Column(JSON) # Store metrics dictionary
+    task_type = Column(String, index=True) # Classification, Regression, Clustering
+    model_name = Column(String, index=True)
+    metrics = Column(JSON) # Lightweight result: metrics, explanation, model id (heavy parts live in artifacts)
+    summary = Column(JSON) # Metric values only, used by the history list
     parameters = Column(JSON) # Store hyperparameters used
+    timings = Column(JSON) # Per-stage wall time and memory of the run
+    sampling = Column(JSON) # Rows used out of those available, and the estimates/budgets that decided it
+    request_key = Column(String, index=True) # Hash of dataset content + training request, for the result cache
+    created_at = Column(DateTime, default=_utcnow, server_default=func.now(), index=True)
+
+    # Keyset pagination walks (created_at, id) in descending order
+    __table_args__ = (Index("ix_experiments_created_at_id", "created_at", "id"),)
+
+class Artifact(Base):
+    __tablename__ = "artifacts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    experiment_id = Column(Integer, ForeignKey("experiments.id", ondelete="CASCADE"), index=True)
+    name = Column(String) # e.g. "plot_data/confusion_matrix", "tuning"
+    content_type = Column(String)
+    data = Column(LargeBinary)
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (Index("ix_artifacts_experiment_id_name", "experiment_id", "name", unique=True),)
+
+class Sweep(Base):
+    __tablename__ = "sweeps"
+
+    id = Column(Integer, primary_key=True, index=True)
+    dataset_name = Column(String, index=True)
+    task_type = Column(String)
+    leaderboard = Column(JSON) # Ranked candidates with their experiment ids
     created_at = Column(DateTime, server_default=func.now())
@@ -14,20 +14,80 @@ class ExperimentCreate(ExperimentBase):
 class ExperimentResponse(ExperimentBase):
     id: int
     metrics: Dict[str, Any]
+    timings: Optional[Dict[str, Any]] = None  # per-stage breakdown of the training run
+    sampling: Optional[Dict[str, Any]] = None  # rows trained on and why (resource_governor decision)
     created_at: datetime
 
     class Config:
         from_attributes = True
 
-class TrainRequest(BaseModel):
+class ExperimentSummary(BaseModel):
+    id: int
     dataset_name: str
-    task_type: str  # "Classification", "Regression", "Clustering"
+    task_type: str
     model_name: str
+    metrics: Dict[str, Any]  # metric values only
+    created_at: datetime
+
+class HistoryPage(BaseModel):
+    items: List[ExperimentSummary]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
+
+class DatasetOptions(BaseModel):
+    # Dataset and preprocessing options shared by every training-style request
+    dataset_name: str
+    task_type: str  # "Classification", "Regression", "Clustering"
     target_column: Optional[str] = None  # None for clustering
     test_size: float = 0.2
     random_state: int = 42
     use_scaling: bool = True
+    sparse_mode: str = "auto"  # "auto", "dense" or "sparse" feature matrix
+    max_categories: Optional[int] = None  # cap one-hot columns per categorical, rare values are grouped
+    hash_buckets: Optional[int] = None  # hash very high-cardinality categoricals into this many columns
+    feature_columns: Optional[List[str]] = None  # train on these columns only (None = every column)
+    optimize_memory: bool = False  # downcast numerics and load repeated strings as categories
+
+class TrainRequest(DatasetOptions):
+    model_name: str
+    params: Optional[Dict[str, Any]] = None  # hyperparameters passed to the estimator
     use_cross_validation: bool = False
+    cv_folds: int = 5
+    streaming: bool = False  # train chunk by chunk on the full dataset (partial_fit models only)
+    chunk_rows: int = 50000
+    force: bool = False  # retrain even if an identical request already has a stored result
+    warm_start_model_id: Optional[str] = None  # continue this model on rows appended since it was trained
+
+class TuneRequest(DatasetOptions):
+    model_name: str
+    # Per-parameter search space: a list of choices, or {"low", "high", "log", "type": "int"}
+    param_space: Dict[str, Any]
+    strategy: str = "halving"  # "halving" or "hyperband"
+    n_candidates: int = 20  # starting configurations for plain successive halving
+    factor: int = 3  # 1/factor of the configurations survive each rung
+    min_resources: Optional[int] = None  # training rows in the first rung
+    cv_folds: int = 3
+
+class SweepRequest(DatasetOptions):
+    model_names: List[str]
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    model_name: str
+    score: Optional[float] = None
+    metric: str
+    fit_seconds: Optional[float] = None
+    experiment_id: Optional[int] = None
+    error: Optional[str] = None
+
+class SweepResponse(BaseModel):
+    id: int
+    dataset_name: str
+    task_type: str
+    leaderboard: List[LeaderboardEntry]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
 
 class PredictionResponse(BaseModel):
     metrics: Dict[str, Any]
@@ -37,3 +97,27 @@ class PredictionResponse(BaseModel):
     cluster_plot: Optional[str] = None
     residual_plot: Optional[str] = None
     explanation: str
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    status: str  # "queued", "running", "completed", "failed", "cancelled"
+    stage: Optional[str] = None
+    progress: float = 0.0
+    details: Dict[str, Any] = {}
+    error: Optional[str] = None
+    result_id: Optional[int] = None  # Experiment id once the job has completed
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+class PredictRequest(BaseModel):
+    rows: List[Dict[str, Any]]  # raw feature values keyed by column name
+
+class PredictResponse(BaseModel):
+    predictions: List[Any]
+    probabilities: Optional[List[Dict[str, float]]] = None
+
+class BatchPredictRequest(BaseModel):
+    model_id: str
+    dataset_name: str  # an uploaded CSV / stored dataset
+    chunk_rows: int = 100000
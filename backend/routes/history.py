@@ -1,13 +1,91 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
-from typing import List
-from models.schemas import ExperimentResponse
+from typing import Optional
+from datetime import datetime
+import base64
+from models.schemas import ExperimentResponse, HistoryPage
 from database import get_db
 from models.db_models import Experiment
+from services import experiment_store, telemetry
 
 router = APIRouter()
 
-@router.get("/history", response_model=List[ExperimentResponse])
-async def get_history(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    experiments = db.query(Experiment).order_by(Experiment.created_at.desc()).offset(skip).limit(limit).all()
-    return experiments
+def _encode_cursor(created_at: datetime, experiment_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{experiment_id}".encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, experiment_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(experiment_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/history", response_model=HistoryPage)
+def get_history(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    dataset_name: Optional[str] = None,
+    model_name: Optional[str] = None,
+    task_type: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    timings = telemetry.StageTimings()
+    # Only summary columns are selected; full results come from /history/{id}
+    query = db.query(
+        Experiment.id,
+        Experiment.dataset_name,
+        Experiment.task_type,
+        Experiment.model_name,
+        Experiment.summary,
+        Experiment.created_at,
+    )
+    if dataset_name:
+        query = query.filter(Experiment.dataset_name == dataset_name)
+    if model_name:
+        query = query.filter(Experiment.model_name == model_name)
+    if task_type:
+        query = query.filter(Experiment.task_type == task_type)
+
+    # Keyset pagination on (created_at, id): cost doesn't grow with the page number
+    if cursor:
+        created_at, experiment_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            Experiment.created_at < created_at,
+            and_(Experiment.created_at == created_at, Experiment.id < experiment_id),
+        ))
+
+    with timings.stage("query"):
+        rows = query.order_by(Experiment.created_at.desc(), Experiment.id.desc()).limit(limit + 1).all()
+    items = [
+        {
+            "id": row.id,
+            "dataset_name": row.dataset_name,
+            "task_type": row.task_type,
+            "model_name": row.model_name,
+            "metrics": row.summary or {},
+            "created_at": row.created_at,
+        }
+        for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = _encode_cursor(last.created_at, last.id)
+    telemetry.observe_stages("history", timings.as_dict())
+    response.headers["Server-Timing"] = timings.server_timing()
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/history/{experiment_id}", response_model=ExperimentResponse)
+def get_experiment(experiment_id: int, response: Response, db: Session = Depends(get_db)):
+    timings = telemetry.StageTimings()
+    with timings.stage("query"):
+        experiment = db.query(Experiment).filter(Experiment.id == experiment_id).first()
+    if experiment is None:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    with timings.stage("artifacts"):
+        detail = experiment_store.experiment_detail(db, experiment)
+    telemetry.observe_stages("history_detail", timings.as_dict())
+    response.headers["Server-Timing"] = timings.server_timing()
+    return detail
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session
+from models.schemas import JobResponse, ExperimentResponse
+from services import job_manager, experiment_store
+from database import get_db
+from models.db_models import Experiment
+
+router = APIRouter()
+
+def _get_job_or_404(job_id: str):
+    job = job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    return _get_job_or_404(job_id)
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    _get_job_or_404(job_id)
+    return job_manager.cancel_job(job_id)
+
+@router.get("/jobs/{job_id}/result", response_model=ExperimentResponse)
+def get_job_result(job_id: str, db: Session = Depends(get_db)):
+    job = _get_job_or_404(job_id)
+    if job["kind"] == "batch_predict":
+        # Predictions are written to a file rather than stored as an Experiment
+        raise HTTPException(status_code=409, detail=f"Batch prediction output is served at /api/batch-predict/{job_id}/output")
+    if job["kind"] == "sweep" and job["status"] == job_manager.COMPLETED:
+        # result_id is the Sweep, whose leaderboard links the per-model experiments
+        raise HTTPException(status_code=409, detail=f"Sweep results are served at /api/sweeps/{job['result_id']}")
+    if job["status"] == job_manager.FAILED:
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != job_manager.COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    experiment = db.query(Experiment).filter(Experiment.id == job["result_id"]).first()
+    if experiment is None:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    return experiment_store.experiment_detail(db, experiment)
@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services import job_manager, telemetry
+
+router = APIRouter()
+
+telemetry.register_gauge(
+    "ml_jobs_in_flight",
+    "Unfinished background jobs by kind and status",
+    lambda: [({"kind": kind, "status": status}, count) for (kind, status), count in job_manager.in_flight().items()],
+)
+telemetry.register_gauge(
+    "ml_training_memory_reserved_mb",
+    "Estimated memory reserved by running training jobs",
+    lambda: [({}, job_manager.reserved_memory_mb())],
+)
+telemetry.register_gauge(
+    "ml_jobs_waiting_for_memory",
+    "Jobs queued until enough of the training memory budget is free",
+    lambda: [({}, job_manager.waiting_count())],
+)
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
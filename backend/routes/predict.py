@@ -0,0 +1,76 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from models.schemas import PredictRequest, PredictResponse, BatchPredictRequest, JobResponse
+from services import job_manager
+from services.paths import UPLOAD_DIR, prediction_path
+import os
+import uuid
+
+router = APIRouter()
+
+@router.post("/predict/{model_id}", response_model=PredictResponse)
+async def predict(model_id: str, request: PredictRequest):
+    # Scoring needs pandas and scikit-learn; they load on the first prediction
+    # unless the startup warm-up got there first
+    from services import prediction_service
+    try:
+        return await prediction_service.predict(model_id, request.rows)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Model not found")
+    except (ValueError, TypeError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/batch-predict", response_model=JobResponse, status_code=202)
+def batch_predict(request: BatchPredictRequest):
+    from services import dataset_store, prediction_service
+    if request.chunk_rows < 1:
+        raise HTTPException(status_code=400, detail="chunk_rows must be positive")
+    try:
+        pipeline, metadata = prediction_service.load_model(request.model_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Model not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not hasattr(pipeline, "predict"):
+        raise HTTPException(status_code=400, detail=f"{metadata['model_name']} cannot score new rows")
+    if not dataset_store.exists(request.dataset_name) and not os.path.exists(os.path.join(UPLOAD_DIR, request.dataset_name)):
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    output_id = str(uuid.uuid4())
+    job_id = job_manager.submit(
+        "batch_predict",
+        "services.batch_prediction:predict_file",
+        args=(request, output_id),
+        details={"output_id": output_id},
+    )
+    return job_manager.get_job(job_id)
+
+def _read_prefix(path, length, chunk_size=1024 * 1024):
+    with open(path, "rb") as f:
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+@router.get("/batch-predict/{job_id}/output")
+def batch_predict_output(job_id: str):
+    job = job_manager.get_job(job_id)
+    if job is None or job["kind"] != "batch_predict":
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] in (job_manager.FAILED, job_manager.CANCELLED):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    path = prediction_path(job["details"]["output_id"])
+    filename = f"predictions_{job_id}.csv"
+    if job["status"] == job_manager.COMPLETED:
+        return FileResponse(path, filename=filename, media_type="text/csv")
+
+    # While scoring, only the chunks written so far are served
+    written = job["details"].get("bytes_written", 0)
+    return StreamingResponse(
+        _read_prefix(path, written) if written else iter(()),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Rows-Scored": str(job["details"].get("rows_scored", 0))},
+    )
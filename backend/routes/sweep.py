@@ -0,0 +1,78 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session
+from models.schemas import SweepRequest, SweepResponse, JobResponse
+from services import job_manager, experiment_store, resource_governor, result_writer
+from services.model_factory import get_model
+from database import get_db
+from models.db_models import Sweep
+from functools import partial
+
+router = APIRouter()
+
+def write_sweep(request, results, db):
+    # One Experiment per successful candidate plus the sweep's leaderboard
+    sweep = Sweep(dataset_name=request.dataset_name, task_type=request.task_type, leaderboard=[])
+    db.add(sweep)
+    db.flush()
+
+    parameters = request.model_dump(exclude={"dataset_name", "task_type", "model_names"})
+    parameters["sweep_id"] = sweep.id
+    experiment_ids = {}
+    for candidate in results["candidates"]:
+        if candidate.get("error"):
+            continue
+        experiment = experiment_store.save_experiment(
+            db,
+            request.dataset_name,
+            request.task_type,
+            candidate["model_name"],
+            parameters,
+            {k: candidate.get(k) for k in ("metrics", "explanation", "plot_data", "model_id", "sampling")}
+        )
+        experiment_ids[candidate["model_name"]] = experiment.id
+
+    sweep.leaderboard = [
+        {**entry, "experiment_id": experiment_ids.get(entry["model_name"])}
+        for entry in results["leaderboard"]
+    ]
+    return sweep.id
+
+def save_sweep(request, results):
+    return result_writer.submit(partial(write_sweep, request, results))
+
+@router.post("/sweep", response_model=JobResponse, status_code=202)
+def sweep(request: SweepRequest):
+    if not request.model_names:
+        raise HTTPException(status_code=400, detail="At least one model is required")
+    if len(set(request.model_names)) != len(request.model_names):
+        raise HTTPException(status_code=400, detail="Model names must be unique")
+    try:
+        for model_name in request.model_names:
+            get_model(request.task_type, model_name)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    # Candidates are sized to fit side by side; the sweep reserves the largest estimate
+    try:
+        plans, memory_mb = resource_governor.admit(request, request.model_names)
+    except resource_governor.InsufficientMemory as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    try:
+        job_id = job_manager.submit(
+            "sweep",
+            "services.sweep_engine:run_sweep",
+            args=(request,),
+            kwargs={"sampling": plans},
+            on_result=partial(save_sweep, request),
+            memory_mb=memory_mb,
+        )
+    except job_manager.QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Training capacity is exhausted: {e}", headers={"Retry-After": "30"})
+    return job_manager.get_job(job_id)
+
+@router.get("/sweeps/{sweep_id}", response_model=SweepResponse)
+def get_sweep(sweep_id: int, db: Session = Depends(get_db)):
+    sweep = db.query(Sweep).filter(Sweep.id == sweep_id).first()
+    if sweep is None:
+        raise HTTPException(status_code=404, detail="Sweep not found")
+    return sweep
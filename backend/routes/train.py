@@ -1,35 +1,151 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
-from models.schemas import TrainRequest, ExperimentResponse
-from services.training_engine import train_model
+from models.schemas import TrainRequest, TuneRequest, JobResponse
+from services import job_manager, experiment_store, resource_governor, result_cache, result_writer, telemetry
+from services.model_factory import get_model, supports_partial_fit, supports_warm_start
+from services.paths import MODEL_DIR
 from database import get_db
-from models.db_models import Experiment
+from functools import partial
 import json
+import os
 
 router = APIRouter()
 
-@router.post("/train", response_model=ExperimentResponse)
-async def train(request: TrainRequest, db: Session = Depends(get_db)):
-    try:
-        # Run training pipeline
-        results = train_model(request)
-        
-        # Save to DB
-        # Store full result in metrics column for simple retrieval (metrics, explanation, viz)
-        experiment = Experiment(
-            dataset_name=request.dataset_name,
-            task_type=request.task_type,
-            model_name=request.model_name,
-            metrics=results, 
-            parameters=request.model_dump(exclude={"dataset_name", "task_type", "model_name"})
+def record_timings(results):
+    timings = results.get("timings")
+    telemetry.observe_stages("train", timings)
+    if timings and timings.get("feature_cache") in ("hit", "miss"):
+        telemetry.cache_lookup("feature", timings["feature_cache"] == "hit")
+
+def save_experiment(request, results, request_key=None):
+    # Runs in the API process once the worker has finished training; the rows
+    # are written by the result writer thread
+    record_timings(results)
+
+    def write(db):
+        experiment = experiment_store.save_experiment(
+            db,
+            request.dataset_name,
+            request.task_type,
+            request.model_name,
+            request.model_dump(exclude={"dataset_name", "task_type", "model_name", "force"}),
+            results,
+            request_key=request_key
         )
-        
-        db.add(experiment)
-        db.commit()
-        db.refresh(experiment)
-        
-        return experiment
+        return experiment.id
+
+    return result_writer.submit(write)
+
+def admit(request, model_names):
+    # Sampling plans per model and the memory to reserve; 413 when the job
+    # could never fit in the training memory budget
+    try:
+        return resource_governor.admit(request, model_names)
+    except resource_governor.InsufficientMemory as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+def submit_admitted(kind, target, request, memory_mb, **options):
+    # 503 while too many jobs are already waiting for memory
+    try:
+        return job_manager.submit(kind, target, args=(request,), memory_mb=memory_mb, **options)
+    except job_manager.QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Training capacity is exhausted: {e}", headers={"Retry-After": "30"})
+
+@router.post("/train", response_model=JobResponse, status_code=202)
+def train(request: TrainRequest, db: Session = Depends(get_db)):
+    try:
+        # Fail fast on unknown models or parameters instead of inside the worker
+        get_model(request.task_type, request.model_name, request.params)
+    except (ValueError, TypeError) as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    if request.use_cross_validation and request.cv_folds < 2:
+        raise HTTPException(status_code=400, detail="cv_folds must be at least 2")
+
+    target = "services.training_engine:train_model"
+    if request.streaming:
+        # Out-of-core training uses the whole dataset instead of a downsample
+        if not supports_partial_fit(request.model_name):
+            raise HTTPException(status_code=400, detail=f"{request.model_name} does not support streaming training")
+        if request.use_cross_validation:
+            raise HTTPException(status_code=400, detail="Cross-validation is not available for streaming training")
+        if request.chunk_rows < 1:
+            raise HTTPException(status_code=400, detail="chunk_rows must be positive")
+        target = "services.incremental_engine:train_incremental"
+    if request.warm_start_model_id:
+        # Continues an earlier model on the rows appended to its dataset since
+        if not supports_warm_start(request.model_name):
+            raise HTTPException(status_code=400, detail=f"{request.model_name} does not support warm-start retraining")
+        if request.streaming or request.use_cross_validation:
+            raise HTTPException(status_code=400, detail="Warm-start retraining can't be combined with streaming or cross-validation")
+        # The saved estimator and its fitted preprocessing are continued as they are
+        if request.params:
+            raise HTTPException(status_code=400, detail="Warm-start retraining keeps the model's hyperparameters; params must be empty")
+        model_id = request.warm_start_model_id
+        metadata_path = os.path.join(MODEL_DIR, f"{model_id}.json")
+        if os.path.basename(model_id) != model_id or not os.path.exists(metadata_path):
+            raise HTTPException(status_code=404, detail="Model not found")
+        with open(metadata_path) as f:
+            input_columns = json.load(f)["input_columns"]
+        if request.feature_columns is not None and sorted(request.feature_columns) != sorted(input_columns):
+            raise HTTPException(status_code=400, detail=f"Warm-start retraining uses the model's feature columns: {', '.join(input_columns)}")
+        target = "services.retrain_engine:retrain_model"
+
+    # Identical requests on unchanged data are answered from the stored result,
+    # and join the running job if one is already computing it. force=true retrains.
+    key = result_cache.request_key(request)
+    if key is not None and not request.force:
+        experiment = result_cache.find_experiment(db, key)
+        telemetry.cache_lookup("result", experiment is not None)
+        if experiment is not None:
+            return job_manager.get_job(job_manager.record_completed("train", experiment.id, details={"cached": True}))
+
+    # Streaming and warm-start runs read the dataset in bounded chunks or only
+    # its new rows, so only full trainings are sized and admitted
+    plans, memory_mb = {}, None
+    if target == "services.training_engine:train_model":
+        plans, memory_mb = admit(request, [request.model_name])
+    job_id = submit_admitted(
+        "train",
+        target,
+        request,
+        memory_mb,
+        kwargs={"sampling": plans[request.model_name]} if plans else None,
+        on_result=partial(save_experiment, request, request_key=key),
+        dedup_key=None if request.force else key,
+    )
+    return job_manager.get_job(job_id)
+
+@router.post("/tune", response_model=JobResponse, status_code=202)
+def tune(request: TuneRequest):
+    if request.strategy not in ("halving", "hyperband"):
+        raise HTTPException(status_code=400, detail="Strategy must be 'halving' or 'hyperband'")
+    if request.factor < 2:
+        raise HTTPException(status_code=400, detail="Factor must be at least 2")
+    if request.cv_folds < 2:
+        raise HTTPException(status_code=400, detail="cv_folds must be at least 2")
+    if request.task_type == "Clustering":
+        raise HTTPException(status_code=400, detail="Hyperparameter search needs a supervised task")
+    # tuning_engine pulls in scipy and the search estimators, so it is only
+    # imported once a search is requested
+    from services.tuning_engine import build_distributions
+    try:
+        estimator = get_model(request.task_type, request.model_name)
+        build_distributions(request.param_space)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Unknown parameters would only fail once every configuration has been tried
+    unknown = sorted(set(request.param_space) - set(estimator.get_params()))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"{request.model_name} has no parameter(s): {', '.join(unknown)}")
+
+    # The refit best model is stored as a regular Experiment with the search report
+    plans, memory_mb = admit(request, [request.model_name])
+    job_id = submit_admitted(
+        "tune",
+        "services.tuning_engine:tune_model",
+        request,
+        memory_mb,
+        kwargs={"sampling": plans[request.model_name]},
+        on_result=partial(save_experiment, request),
+    )
+    return job_manager.get_job(job_id)
@@ -1,23 +1,200 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-import shutil
+from fastapi import APIRouter, HTTPException, Request, Response
+from starlette.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+from python_multipart.exceptions import MultipartParseError
+import hashlib
+import logging
 import os
-from services.preprocessing import get_columns, UPLOAD_DIR
+import uuid
+from services.paths import UPLOAD_DIR
+from services import telemetry
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Uploads above this size are rejected, before the body is read when the client
+# sends a Content-Length and as soon as the limit is crossed otherwise
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 10 * 1024 ** 3))
+
+# Received bytes are parsed, hashed and written to disk in a worker thread, in
+# batches of about this size, so the event loop never waits on the disk
+_WRITE_BATCH_BYTES = 1024 * 1024
+
+class _UploadTooLarge(Exception):
+    pass
+
+class _StreamedFile:
+    # Receives the "file" part of a multipart body chunk by chunk, writing it to
+    # disk and hashing it as the bytes arrive so nothing is buffered in memory.
+    # The file lands in UPLOAD_DIR under its own name unless `path` is given.
+    def __init__(self, path=None):
+        self.filename = None
+        self.path = None
+        self._target_path = path
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self._out = None
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, params = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if params.get(b"name") != b"file" or self._out is not None:
+            return
+        self.filename = os.path.basename(params.get(b"filename", b"").decode("utf-8"))
+        if not self.filename.endswith('.csv'):
+            raise HTTPException(status_code=400, detail="Only CSV files are supported")
+        self.path = self._target_path or os.path.join(UPLOAD_DIR, self.filename)
+        self._out = open(self.path, "wb")
+
+    def on_part_data(self, data, start, end):
+        if self._out is None or self._out.closed:
+            return
+        chunk = data[start:end]
+        self.size += len(chunk)
+        if self.size > MAX_UPLOAD_BYTES:
+            raise _UploadTooLarge()
+        self._out.write(chunk)
+        self.sha256.update(chunk)
+
+    def on_part_end(self):
+        if self._out is not None:
+            self._out.close()
+
+    def callbacks(self):
+        return {name: getattr(self, name) for name in (
+            "on_part_begin", "on_header_field", "on_header_value", "on_header_end",
+            "on_headers_finished", "on_part_data", "on_part_end",
+        )}
+
+    def discard(self):
+        if self._out is not None:
+            self._out.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+async def _receive(request, timings, path=None):
+    content_length = request.headers.get("content-length")
+    if content_length and int(content_length) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    upload = _StreamedFile(path)
+    parser = MultipartParser(params[b"boundary"], upload.callbacks())
+    try:
+        with timings.stage("receive"):
+            pending = []
+            pending_bytes = 0
+            async for chunk in request.stream():
+                pending.append(chunk)
+                pending_bytes += len(chunk)
+                if pending_bytes >= _WRITE_BATCH_BYTES:
+                    await run_in_threadpool(parser.write, b"".join(pending))
+                    pending = []
+                    pending_bytes = 0
+            if pending:
+                await run_in_threadpool(parser.write, b"".join(pending))
+            await run_in_threadpool(parser.finalize)
+    except _UploadTooLarge:
+        upload.discard()
+        raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+    except HTTPException:
+        upload.discard()
+        raise
+    except MultipartParseError as e:
+        upload.discard()
+        raise HTTPException(status_code=400, detail=f"Malformed upload: {e}")
+
+    if upload.path is None:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+    return upload
+
+async def _build_profile(dataset_name, timings):
+    # A stored dataset is usable without its profile, and get_profile rebuilds
+    # a missing or stale one on demand, so a failure here only gets logged
+    from services import profiling_engine
+    try:
+        with timings.stage("profile"):
+            await run_in_threadpool(profiling_engine.build_profile, dataset_name)
+    except Exception:
+        logger.exception("Building the profile of %s failed", dataset_name)
 
 @router.post("/upload")
-async def upload_dataset(file: UploadFile = File(...)):
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are supported")
-        
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
+async def upload_dataset(request: Request, response: Response):
+    timings = telemetry.StageTimings()
+    upload = await _receive(request, timings)
+    # dataset_store loads pyarrow and numpy, so it is imported with the first
+    # upload rather than at startup
+    from services import dataset_store
     try:
-        details = get_columns(file.filename)
-        return {"filename": file.filename, "details": details}
+        # Single streaming pass into the columnar store; types, null counts and
+        # row counts are collected per block along the way
+        with timings.stage("ingest"):
+            schema = await run_in_threadpool(dataset_store.ingest_csv, upload.path, upload.filename, upload.sha256.hexdigest())
     except Exception as e:
-        if os.path.exists(file_path):
-             os.remove(file_path)
+        upload.discard()
+        dataset_store.delete(upload.filename)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+
+    # The profile only reads the summaries collected during ingest, so it's cheap to build now
+    await _build_profile(upload.filename, timings)
+    details = {key: schema[key] for key in ("columns", "dtypes", "null_counts", "num_rows")}
+    telemetry.observe_stages("upload", timings.as_dict())
+    response.headers["Server-Timing"] = timings.server_timing()
+    return {"filename": upload.filename, "details": details, "timings": timings.as_dict()}
+
+@router.post("/datasets/{dataset_name}/append")
+async def append_dataset(dataset_name: str, request: Request, response: Response):
+    # Adds a CSV of new rows (same columns) to a stored dataset as a new part,
+    # leaving the existing rows untouched
+    from services import dataset_store
+    if not dataset_store.exists(dataset_name):
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    timings = telemetry.StageTimings()
+    upload = await _receive(request, timings, path=os.path.join(UPLOAD_DIR, f".append-{uuid.uuid4()}.csv"))
+    try:
+        with timings.stage("append"):
+            schema, rows_added = await run_in_threadpool(dataset_store.append_csv, upload.path, dataset_name, upload.sha256.hexdigest())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    finally:
+        upload.discard()
+
+    await _build_profile(dataset_name, timings)
+    details = {key: schema[key] for key in ("columns", "dtypes", "null_counts", "num_rows")}
+    telemetry.observe_stages("append", timings.as_dict())
+    response.headers["Server-Timing"] = timings.server_timing()
+    return {"filename": dataset_name, "rows_added": rows_added, "details": details, "timings": timings.as_dict()}
+
+
+@router.get("/datasets/{dataset_name}/profile")
+def dataset_profile(dataset_name: str, target: str = None):
+    # Per-column statistics cached at upload; `target` adds each column's correlation with it
+    from services import profiling_engine
+    try:
+        return profiling_engine.get_profile(dataset_name, target)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
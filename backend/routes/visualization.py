@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from sqlalchemy.orm import Session
+from database import get_db
+from services import experiment_store
+import hashlib
+
+router = APIRouter()
+
+# Bump when rendering changes so clients drop previously cached images
+PLOT_VERSION = "2"
+
+@router.get("/experiments/{experiment_id}/plots/{kind}")
+def get_plot(experiment_id: int, kind: str, request: Request, db: Session = Depends(get_db)):
+    # The plotting stack loads on the first plot request (or the startup warm-up)
+    from services import visualization_engine
+    if kind not in visualization_engine.RENDERERS:
+        raise HTTPException(status_code=404, detail=f"Unknown plot {kind}")
+
+    # Experiments never change once stored, so the image for (experiment, kind) is immutable
+    etag = '"' + hashlib.sha256(f"{experiment_id}:{kind}:{PLOT_VERSION}".encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    # Only the one plot's artifact is loaded, never the experiment's other payloads
+    data = experiment_store.load_artifact(db, experiment_id, experiment_store.PLOT_PREFIX + kind)
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"No {kind} for this experiment")
+
+    png = visualization_engine.render_plot((experiment_id, kind), kind, data)
+    return Response(content=png, media_type="image/png", headers=headers)
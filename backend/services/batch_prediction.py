@@ -0,0 +1,99 @@
+from services import dataset_store
+from services.paths import UPLOAD_DIR, prediction_path
+from services.prediction_service import load_model, score_frame
+from services.job_manager import CORES_PER_WORKER, report
+from joblib import Parallel, delayed
+import pandas as pd
+import io
+import os
+
+# Worker processes scoring chunks side by side (default: the job's share of the
+# cores, -1 = all cores). At most 2 * n_jobs chunks are in flight, so memory
+# follows the chunk size, not the file.
+BATCH_PREDICT_N_JOBS = int(os.getenv("BATCH_PREDICT_N_JOBS", CORES_PER_WORKER))
+
+
+def _read_store_chunk(dataset_name, columns, offset, length):
+    # Every worker memory-maps the stored dataset and materializes only its slice
+    return dataset_store.read_table(dataset_name, columns).slice(offset, length).to_pandas()
+
+
+def _score_chunk(model_id, chunk, header):
+    if isinstance(chunk, tuple):
+        chunk = _read_store_chunk(*chunk)
+    pipeline, metadata = load_model(model_id)
+    result = score_frame(pipeline, metadata, chunk)
+
+    output = pd.DataFrame({"prediction": result["predictions"]})
+    if "probabilities" in result:
+        probabilities = pd.DataFrame.from_records(result["probabilities"])
+        output = pd.concat([output, probabilities.add_prefix("probability_")], axis=1)
+    buf = io.StringIO()
+    output.to_csv(buf, index=False, header=header)
+    return len(output), buf.getvalue().encode("utf-8")
+
+
+def _header(pipeline, metadata):
+    # The output's column row on its own, for datasets without rows to score
+    columns = ["prediction"]
+    classes = metadata.get("classes")
+    if classes is not None and hasattr(pipeline, "predict_proba"):
+        columns += [f"probability_{c}" for c in map(str, classes)]
+    return pd.DataFrame(columns=columns).to_csv(index=False).encode("utf-8")
+
+
+def _chunks(dataset_name, columns, chunk_rows):
+    # Stored datasets are split into row ranges the workers read themselves;
+    # plain CSVs are parsed here chunk by chunk
+    if dataset_store.exists(dataset_name):
+        schema = dataset_store.read_schema(dataset_name)
+        columns = [c for c in columns if c in schema["columns"]]
+        num_rows = schema["num_rows"]
+        for offset in range(0, num_rows, chunk_rows):
+            yield (dataset_name, columns, offset, min(chunk_rows, num_rows - offset))
+        return
+
+    file_path = os.path.join(UPLOAD_DIR, dataset_name)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Dataset {dataset_name} not found")
+    for chunk in pd.read_csv(file_path, chunksize=chunk_rows, usecols=lambda c: c in columns):
+        if len(chunk):
+            yield chunk
+
+
+def predict_file(request, output_id, progress=None):
+    # request is BatchPredictRequest object
+    pipeline, metadata = load_model(request.model_id)
+    if not hasattr(pipeline, "predict"):
+        raise ValueError(f"{metadata['model_name']} cannot score new rows")
+
+    total_rows = None
+    if dataset_store.exists(request.dataset_name):
+        total_rows = dataset_store.read_schema(request.dataset_name)["num_rows"]
+
+    parallel = Parallel(n_jobs=BATCH_PREDICT_N_JOBS, return_as="generator", pre_dispatch="2*n_jobs")
+    tasks = (
+        delayed(_score_chunk)(request.model_id, chunk, i == 0)
+        for i, chunk in enumerate(_chunks(request.dataset_name, metadata["input_columns"], request.chunk_rows))
+    )
+
+    # Chunks come back in order and are appended as they finish; bytes_written
+    # marks how much of the file is complete for downloads taken mid-run
+    rows_scored = 0
+    bytes_written = 0
+    report(progress, "scoring", 0.0, rows_scored=0, bytes_written=0)
+    with open(prediction_path(output_id), "wb") as f:
+        for rows, data in parallel(tasks):
+            f.write(data)
+            f.flush()
+            rows_scored += rows
+            bytes_written += len(data)
+            fraction = rows_scored / total_rows if total_rows else 0.5
+            report(progress, "scoring", min(fraction, 0.99), rows_scored=rows_scored, bytes_written=bytes_written)
+        if bytes_written == 0:
+            data = _header(pipeline, metadata)
+            f.write(data)
+            bytes_written = len(data)
+            report(progress, "scoring", 0.99, rows_scored=0, bytes_written=bytes_written)
+
+    return {"output_id": output_id, "rows_scored": rows_scored, "bytes_written": bytes_written}
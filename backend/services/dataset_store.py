@@ -0,0 +1,479 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+from services import sketches
+
+# Uploaded CSVs are converted once into Arrow IPC files (uncompressed so they can be
+# memory-mapped) plus a small schema file, and every later read goes through here.
+STORE_DIR = "dataset_store"
+if not os.path.exists(STORE_DIR):
+    os.makedirs(STORE_DIR)
+
+SCHEMA_FILE = "schema.json"
+INGEST_BLOCK_SIZE = int(os.getenv("INGEST_BLOCK_SIZE", 16 * 1024 * 1024))
+
+# Appends add a part file and never rewrite existing ones. Running column
+# statistics (numeric moments, value counts) are kept next to the schema and
+# merged batch by batch, so they stay current without rescanning the dataset.
+STATS_FILE = "stats.json"
+# Value counts are dropped for columns with more distinct values than this
+STATS_MAX_DISTINCT = int(os.getenv("STATS_MAX_DISTINCT", 1000))
+# A uniform sample of this many rows is kept alongside (see services/sketches.py)
+SAMPLE_FILE = "sample.ipc"
+SAMPLE_ROWS = int(os.getenv("DATASET_SAMPLE_ROWS", 20000))
+
+_append_lock = threading.Lock()
+
+
+def _dataset_dir(name: str) -> str:
+    return os.path.join(STORE_DIR, name)
+
+
+def _part_paths(name: str):
+    # The schema lists the committed parts; a part written by an unfinished append is ignored
+    dataset_dir = _dataset_dir(name)
+    parts = read_schema(name).get("parts")
+    if parts is None:
+        return sorted(os.path.join(dataset_dir, f) for f in os.listdir(dataset_dir) if f.endswith(".arrow"))
+    return [os.path.join(dataset_dir, part["file"]) for part in parts]
+
+
+def _write_json(path, value):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+def _chain_hash(previous, content_hash):
+    # Identifies the dataset after appending content_hash to previous contents
+    if previous is None or content_hash is None:
+        return None
+    return hashlib.sha256(f"{previous}:{content_hash}".encode("utf-8")).hexdigest()
+
+
+def _normalize_table(table: pa.Table) -> pa.Table:
+    # Arrow infers dates/timestamps while pandas.read_csv keeps them as strings;
+    # keep the pandas behaviour so preprocessing treats them the same way.
+    for i, field in enumerate(table.schema):
+        if pa.types.is_temporal(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+    return table
+
+
+def _pandas_dtypes(schema: pa.Schema):
+    return schema.empty_table().to_pandas().dtypes.astype(str).to_dict()
+
+
+def _new_stats(schema: pa.Schema):
+    stats = {}
+    for field in schema:
+        entry = {}
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type) or pa.types.is_boolean(field.type):
+            entry.update(count=0, mean=0.0, m2=0.0, min=None, max=None)
+        if pa.types.is_floating(field.type):
+            entry["hll"] = sketches.new_hll()
+        else:
+            entry["values"] = {}
+        stats[field.name] = entry
+    return stats
+
+
+def _update_stats(stats, table: pa.Table):
+    for name, column in zip(table.column_names, table.columns):
+        entry = stats[name]
+        if "mean" in entry:
+            values = column.cast(pa.float64())
+            n = len(values) - values.null_count
+            if n:
+                # Chan et al.'s pairwise update of the running mean and sum of squares
+                mean = pc.mean(values).as_py()
+                m2 = pc.variance(values, ddof=0).as_py() * n
+                total = entry["count"] + n
+                delta = mean - entry["mean"]
+                entry["m2"] += m2 + delta ** 2 * entry["count"] * n / total
+                entry["mean"] += delta * n / total
+                entry["count"] = total
+                bounds = pc.min_max(values).as_py()
+                entry["min"] = bounds["min"] if entry["min"] is None else min(entry["min"], bounds["min"])
+                entry["max"] = bounds["max"] if entry["max"] is None else max(entry["max"], bounds["max"])
+        if column.null_count == len(column):
+            continue
+        if entry.get("values") is not None:
+            counts = pc.value_counts(column.drop_null())
+            for value, count in zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist()):
+                entry["values"][value] = entry["values"].get(value, 0) + count
+            if len(entry["values"]) > STATS_MAX_DISTINCT:
+                # From here on only an approximate distinct count is kept
+                entry["hll"] = sketches.hll_add(sketches.new_hll(), np.array(list(entry["values"])))
+                entry["values"] = None
+        elif entry.get("hll") is not None:
+            sketches.hll_add(entry["hll"], column.drop_null().to_numpy(zero_copy_only=False))
+
+
+def _save_stats(dataset_dir, stats):
+    # Value counts are stored as [value, count] pairs so integer values keep their type
+    serializable = {}
+    for name, entry in stats.items():
+        entry = dict(entry)
+        if entry.get("values") is not None:
+            entry["values"] = list(entry["values"].items())
+        if entry.get("hll") is not None:
+            entry["hll"] = sketches.hll_to_hex(entry["hll"])
+        serializable[name] = entry
+    _write_json(os.path.join(dataset_dir, STATS_FILE), serializable)
+
+
+def read_stats(name: str):
+    # {column: {"count", "mean", "m2", "min", "max"} for numerics, {"values": {value: count}}
+    # for non-float columns (None once a column exceeds STATS_MAX_DISTINCT) and a
+    # HyperLogLog sketch "hll" for floats and for columns past that limit}
+    path = os.path.join(_dataset_dir(name), STATS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        stats = json.load(f)
+    for entry in stats.values():
+        if entry.get("values") is not None:
+            entry["values"] = {value: count for value, count in entry["values"]}
+        if entry.get("hll") is not None:
+            entry["hll"] = sketches.hll_from_hex(entry["hll"])
+    return stats
+
+
+def read_sample(name: str):
+    # Up to SAMPLE_ROWS uniformly sampled rows (plus their sketches.PRIORITY_COLUMN)
+    path = os.path.join(_dataset_dir(name), SAMPLE_FILE)
+    if not os.path.exists(path):
+        return None
+    # Read into memory rather than mapped: appends replace the file
+    with pa.OSFile(path, "rb") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+class _Summaries:
+    # Running statistics and row sample of a dataset, updated block by block
+    def __init__(self, stats=None, sample=None):
+        self.stats = stats or {}
+        self.sample = sample
+
+    def update(self, table: pa.Table):
+        if not self.stats:
+            self.stats.update(_new_stats(table.schema))
+        _update_stats(self.stats, table)
+        self.sample = sketches.update_sample(self.sample, table, SAMPLE_ROWS)
+
+    def save(self, dataset_dir):
+        _save_stats(dataset_dir, self.stats)
+        path = os.path.join(dataset_dir, SAMPLE_FILE)
+        with pa.OSFile(path + ".tmp", "wb") as sink:
+            with pa.ipc.new_file(sink, self.sample.schema) as writer:
+                writer.write_table(self.sample)
+        os.replace(path + ".tmp", path)
+
+
+def _scan_summaries(name: str) -> _Summaries:
+    # One pass over the stored parts, for datasets stored before summaries were kept
+    summaries = _Summaries()
+    for path in _part_paths(name):
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        if not summaries.stats:
+            summaries.update(table.schema.empty_table())
+        for batch in table.to_batches(max_chunksize=100_000):
+            summaries.update(pa.Table.from_batches([batch]))
+    return summaries
+
+
+def _load_summaries(name: str) -> _Summaries:
+    stats = read_stats(name)
+    sample = read_sample(name)
+    if stats is None or sample is None:
+        return _scan_summaries(name)
+    return _Summaries(stats, sample)
+
+
+def rebuild_summaries(name: str):
+    with _append_lock:
+        _scan_summaries(name).save(_dataset_dir(name))
+
+
+def exists(name: str) -> bool:
+    return os.path.exists(os.path.join(_dataset_dir(name), SCHEMA_FILE))
+
+
+class _TypeDrift(Exception):
+    # A later block held values that don't fit the type inferred from the first one
+    def __init__(self, column, new_type):
+        self.column = column
+        self.new_type = new_type
+
+
+def _widen(current_type):
+    # int -> float -> string, which mirrors how pandas.read_csv would have typed it
+    if pa.types.is_integer(current_type):
+        return pa.float64()
+    return pa.string()
+
+
+def _csv_blocks(csv_path):
+    # The CSV's header line, then its rows cut at line ends into blocks of about
+    # INGEST_BLOCK_SIZE bytes, each prefixed with the header so it parses on its
+    # own. Like pyarrow's block reader, this assumes no line breaks inside values.
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        if not header.endswith(b"\n"):
+            header += b"\n"
+        yield header
+        rest = b""
+        emitted = False
+        while True:
+            data = f.read(INGEST_BLOCK_SIZE)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b"\n") + 1
+            if cut:
+                yield header + data[:cut]
+                emitted = True
+            rest = data[cut:]
+        if rest or not emitted:
+            yield header + rest
+
+
+def _parse_block(block, column_types, infer=False):
+    # The first block of a new dataset is inferred as a whole, as pyarrow's
+    # streaming reader does; later blocks are converted to the fixed types.
+    # Blank and NA cells are null in string columns too, as pandas reads them.
+    read_options = pv.ReadOptions(block_size=len(block) + 1) if infer else None
+    convert_options = pv.ConvertOptions(column_types=column_types, strings_can_be_null=True,
+                                        quoted_strings_can_be_null=False)
+    return pv.read_csv(pa.py_buffer(block), read_options=read_options, convert_options=convert_options)
+
+
+def _rewrite_part(part_path, schema, summaries):
+    # Casts the batches written so far to a widened schema, reading the Arrow
+    # part rather than the CSV, and rebuilds their summaries. Returns the open
+    # sink and writer to continue with.
+    old_path = part_path + ".old"
+    os.replace(part_path, old_path)
+    sink = pa.OSFile(part_path, "wb")
+    writer = pa.ipc.new_file(sink, schema)
+    if summaries is not None:
+        summaries.stats.clear()
+        summaries.sample = None
+    with pa.memory_map(old_path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            table = pa.Table.from_batches([reader.get_batch(i)]).cast(schema)
+            writer.write_table(table)
+            if summaries is not None:
+                summaries.update(table)
+    os.remove(old_path)
+    return sink, writer
+
+
+def _write_part(csv_path, part_path, column_types, summaries=None, expected_schema=None):
+    # With expected_schema (appends) the column types are fixed and a value that
+    # doesn't fit raises _TypeDrift. Otherwise types are inferred from the first
+    # block, and a later block that contradicts them widens the column: the
+    # output written so far is cast to the wider type and only that block is
+    # parsed again, so the CSV is read once.
+    blocks = _csv_blocks(csv_path)
+    names = pv.read_csv(pa.py_buffer(next(blocks))).column_names
+    if expected_schema is not None and sorted(names) != sorted(expected_schema.names):
+        raise ValueError(f"Columns must match the stored dataset: {', '.join(expected_schema.names)}")
+
+    column_types = dict(column_types)
+    num_rows = 0
+    null_counts = dict.fromkeys(names, 0)
+    schema = None
+    sink = writer = None
+    try:
+        for block in blocks:
+            while True:
+                try:
+                    table = _parse_block(block, column_types, infer=expected_schema is None and schema is None)
+                    break
+                except pa.ArrowInvalid as e:
+                    match = re.search(r"CSV column #(\d+)", str(e))
+                    if match is None:
+                        raise
+                    column = names[int(match.group(1))]
+                    current_type = column_types.get(column)
+                    if expected_schema is not None or current_type is None:
+                        raise _TypeDrift(column, _widen(current_type) if current_type is not None else pa.string())
+                    if current_type == pa.string():
+                        raise ValueError(f"Could not infer a type for column {column}")
+                    column_types[column] = _widen(current_type)
+                    index = schema.get_field_index(column)
+                    if schema.field(index).type != column_types[column]:
+                        schema = schema.set(index, pa.field(column, column_types[column]))
+                        writer.close()
+                        sink.close()
+                        sink = writer = None
+                        sink, writer = _rewrite_part(part_path, schema, summaries)
+
+            if schema is None and expected_schema is None:
+                # Later blocks are converted to what the first one was inferred as
+                column_types = dict(zip(table.column_names, table.schema.types))
+
+            table = _normalize_table(table)
+            if expected_schema is not None:
+                table = table.select(expected_schema.names)
+            if writer is None:
+                schema = table.schema
+                sink = pa.OSFile(part_path, "wb")
+                writer = pa.ipc.new_file(sink, schema)
+            writer.write_table(table)
+            if summaries is not None:
+                summaries.update(table)
+
+            num_rows += table.num_rows
+            for column_name, column in zip(table.column_names, table.columns):
+                null_counts[column_name] += column.null_count
+    finally:
+        if writer is not None:
+            writer.close()
+        if sink is not None:
+            sink.close()
+    return schema, num_rows, null_counts
+
+
+def ingest_csv(csv_path: str, name: str, content_hash: str = None):
+    # Streams the CSV block by block, so peak memory depends on INGEST_BLOCK_SIZE
+    # rather than on the file size. Column types are inferred from the first block
+    # and widened in place if a later block contradicts them.
+    dataset_dir = _dataset_dir(name)
+    if os.path.exists(dataset_dir):
+        shutil.rmtree(dataset_dir)
+    os.makedirs(dataset_dir)
+    summaries = _Summaries()
+    schema, num_rows, null_counts = _write_part(csv_path, os.path.join(dataset_dir, "part-00000.arrow"), {}, summaries)
+
+    metadata = {
+        "columns": schema.names,
+        "dtypes": _pandas_dtypes(schema),
+        "null_counts": null_counts,
+        "num_rows": num_rows,
+        "source_bytes": os.path.getsize(csv_path),
+        "content_hash": content_hash,
+        "parts": [{"file": "part-00000.arrow", "rows": num_rows, "content_hash": content_hash}],
+    }
+    summaries.save(dataset_dir)
+    _write_json(os.path.join(dataset_dir, SCHEMA_FILE), metadata)
+    return metadata
+
+
+def append_csv(csv_path: str, name: str, content_hash: str = None):
+    # Adds the CSV's rows as a new part file. Columns must match the stored
+    # dataset (in any order) and values must fit the stored column types, since
+    # widening a type would mean rewriting every existing part.
+    with _append_lock:
+        dataset_dir = _dataset_dir(name)
+        metadata = read_schema(name)
+        parts = metadata.get("parts") or [{"file": os.path.basename(p), "rows": None, "content_hash": None} for p in _part_paths(name)]
+        stored_schema = pa.ipc.open_file(pa.memory_map(os.path.join(dataset_dir, parts[0]["file"]), "r")).schema
+        summaries = _load_summaries(name)
+
+        part_file = f"part-{len(parts):05d}.arrow"
+        part_path = os.path.join(dataset_dir, part_file)
+        column_types = {field.name: field.type for field in stored_schema}
+        tmp_path = part_path + ".tmp"
+        try:
+            _, num_rows, null_counts = _write_part(csv_path, tmp_path, column_types, summaries, stored_schema)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if isinstance(e, _TypeDrift):
+                raise ValueError(f"Values in column {e.column} don't fit its stored type")
+            if isinstance(e, pa.ArrowInvalid):
+                # Raised when the CSV is opened, which already converts the first block
+                raise ValueError(f"Appended rows don't fit the stored column types: {e}")
+            raise
+        os.replace(tmp_path, part_path)
+
+        # The schema file is the commit point: readers only see parts it lists
+        metadata["content_hash"] = _chain_hash(metadata.get("content_hash"), content_hash)
+        metadata["parts"] = parts + [{"file": part_file, "rows": num_rows, "content_hash": metadata["content_hash"]}]
+        metadata["num_rows"] += num_rows
+        metadata["source_bytes"] += os.path.getsize(csv_path)
+        for column, count in null_counts.items():
+            metadata["null_counts"][column] = metadata["null_counts"].get(column, 0) + count
+        summaries.save(dataset_dir)
+        _write_json(os.path.join(dataset_dir, SCHEMA_FILE), metadata)
+        return metadata, num_rows
+
+
+def version(name: str):
+    # Identifies the dataset's current contents; rows appended later start at num_rows
+    if not exists(name):
+        return None
+    metadata = read_schema(name)
+    return {"name": name, "num_rows": metadata["num_rows"], "content_hash": metadata.get("content_hash")}
+
+
+def rows_at_version(name: str, content_hash: str):
+    # Number of rows the dataset had when its content hash was content_hash, or
+    # None if it never had that content (e.g. it was re-uploaded since)
+    if content_hash is None:
+        return None
+    rows = 0
+    for part in read_schema(name).get("parts") or []:
+        rows += part["rows"] or 0
+        if part["content_hash"] == content_hash:
+            return rows
+    return None
+
+
+def read_schema(name: str):
+    with open(os.path.join(_dataset_dir(name), SCHEMA_FILE)) as f:
+        return json.load(f)
+
+
+def load_json(name: str, filename: str):
+    # Derived files kept with the dataset (e.g. its profile); removed with it on re-upload
+    path = os.path.join(_dataset_dir(name), filename)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_json(name: str, filename: str, value):
+    _write_json(os.path.join(_dataset_dir(name), filename), value)
+
+
+def read_table(name: str, columns=None) -> pa.Table:
+    tables = []
+    for path in _part_paths(name):
+        # Memory-mapped reads only touch the pages of the selected columns
+        reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+        table = reader.read_all()
+        if columns is not None:
+            table = table.select(columns)
+        tables.append(table)
+    return pa.concat_tables(tables)
+
+
+def iter_dataframes(name: str, chunk_rows: int, columns=None):
+    # Zero-copy slices of the memory-mapped table; only one chunk is converted at a time
+    table = read_table(name, columns)
+    for offset in range(0, table.num_rows, chunk_rows):
+        yield table.slice(offset, chunk_rows).to_pandas()
+
+
+def read_dataframe(name: str, columns=None):
+    return read_table(name, columns).to_pandas()
+
+
+def delete(name: str):
+    dataset_dir = _dataset_dir(name)
+    if os.path.exists(dataset_dir):
+        shutil.rmtree(dataset_dir)
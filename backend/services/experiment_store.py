@@ -0,0 +1,79 @@
+import json
+from models.db_models import Experiment, Artifact
+
+# Parts of a training result that are large or only needed on the detail view.
+# They are stored as artifacts so history queries never load them.
+ARTIFACT_KEYS = ("cross_validation", "tuning")
+PLOT_PREFIX = "plot_data/"
+
+
+def _json_artifact(experiment_id, name, value):
+    return Artifact(
+        experiment_id=experiment_id,
+        name=name,
+        content_type="application/json",
+        data=json.dumps(value).encode("utf-8"),
+    )
+
+
+def save_experiment(db, dataset_name, task_type, model_name, parameters, results, request_key=None):
+    # Adds the experiment and its artifacts to the session; the caller commits
+    plot_data = results.get("plot_data") or {}
+    light = {k: v for k, v in results.items() if k not in ARTIFACT_KEYS and k not in ("plot_data", "timings", "sampling")}
+    light["plots"] = sorted(plot_data)
+
+    experiment = Experiment(
+        dataset_name=dataset_name,
+        task_type=task_type,
+        model_name=model_name,
+        metrics=light,
+        summary=results.get("metrics"),
+        parameters=parameters,
+        timings=results.get("timings"),
+        sampling=results.get("sampling"),
+        request_key=request_key
+    )
+    db.add(experiment)
+    db.flush()
+
+    for kind, data in plot_data.items():
+        db.add(_json_artifact(experiment.id, PLOT_PREFIX + kind, data))
+    for key in ARTIFACT_KEYS:
+        if results.get(key) is not None:
+            db.add(_json_artifact(experiment.id, key, results[key]))
+    return experiment
+
+
+def load_artifact(db, experiment_id, name):
+    artifact = db.query(Artifact.data).filter(Artifact.experiment_id == experiment_id, Artifact.name == name).first()
+    if artifact is None:
+        return None
+    return json.loads(artifact.data)
+
+
+def full_result(db, experiment):
+    # Reassembles the complete training result of one experiment
+    result = dict(experiment.metrics or {})
+    result.pop("plots", None)
+    result["plot_data"] = {}
+    for artifact in db.query(Artifact).filter(Artifact.experiment_id == experiment.id).all():
+        value = json.loads(artifact.data)
+        if artifact.name.startswith(PLOT_PREFIX):
+            result["plot_data"][artifact.name[len(PLOT_PREFIX):]] = value
+        else:
+            result[artifact.name] = value
+    return result
+
+
+def experiment_detail(db, experiment):
+    return {
+        "id": experiment.id,
+        "dataset_name": experiment.dataset_name,
+        "task_type": experiment.task_type,
+        "model_name": experiment.model_name,
+        "parameters": experiment.parameters,
+        "metrics": full_result(db, experiment),
+        "timings": experiment.timings,
+        "sampling": experiment.sampling,
+        "created_at": experiment.created_at,
+    }
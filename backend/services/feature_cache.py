@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+import joblib
+import numpy as np
+import scipy.sparse as sp
+
+# Preprocessed feature matrices, with their fitted preprocessor and target encoder,
+# keyed by dataset content and preprocessing options.
+# Entries live in a per-process LRU (bounded by FEATURE_CACHE_MEMORY_BYTES) and are
+# spilled to CACHE_DIR as .npy files that later loads memory-map, so every worker
+# process shares the disk tier (bounded by FEATURE_CACHE_DISK_BYTES).
+CACHE_DIR = "feature_cache"
+if not os.path.exists(CACHE_DIR):
+    os.makedirs(CACHE_DIR)
+
+MEMORY_BUDGET_BYTES = int(os.getenv("FEATURE_CACHE_MEMORY_BYTES", 512 * 1024 ** 2))
+DISK_BUDGET_BYTES = int(os.getenv("FEATURE_CACHE_DISK_BYTES", 5 * 1024 ** 3))
+
+_lock = threading.Lock()
+_memory = OrderedDict()  # key -> (entry, nbytes)
+_memory_bytes = 0
+
+
+def cache_key(dataset_hash, **options):
+    payload = json.dumps({"dataset": dataset_hash, **options}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _nbytes(entry):
+    X, y = entry[0], entry[1]
+    if sp.issparse(X):
+        X_bytes = X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    else:
+        X_bytes = X.nbytes
+    return X_bytes + (y.nbytes if y is not None else 0)
+
+
+def _remember(key, entry):
+    global _memory_bytes
+    nbytes = _nbytes(entry)
+    if nbytes > MEMORY_BUDGET_BYTES:
+        return
+    with _lock:
+        if key in _memory:
+            _memory_bytes -= _memory.pop(key)[1]
+        _memory[key] = (entry, nbytes)
+        _memory_bytes += nbytes
+        while _memory_bytes > MEMORY_BUDGET_BYTES:
+            _, (_, evicted_bytes) = _memory.popitem(last=False)
+            _memory_bytes -= evicted_bytes
+
+
+def _entry_dir(key):
+    return os.path.join(CACHE_DIR, key)
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def _evict_disk():
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        if name.startswith(".") or not os.path.isdir(path):
+            continue
+        try:
+            entries.append((os.path.getmtime(path), _dir_size(path), path))
+        except FileNotFoundError:
+            continue  # evicted by another worker meanwhile
+
+    total = sum(size for _, size, _ in entries)
+    # Oldest access first; directory mtimes are bumped on every hit
+    for _, size, path in sorted(entries):
+        if total <= DISK_BUDGET_BYTES:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def _spill(key, entry):
+    X, y, feature_names, preprocessor, label_encoder = entry
+    if X.dtype == object or (y is not None and y.dtype == object):
+        return  # only plain numeric arrays can be memory-mapped back
+
+    # Write into a private directory and rename it into place so concurrent
+    # workers never see a half-written entry
+    tmp_dir = os.path.join(CACHE_DIR, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    try:
+        if sp.issparse(X):
+            # CSR is stored as its three arrays so each one can be memory-mapped
+            X = X.tocsr()
+            for part in ("data", "indices", "indptr"):
+                np.save(os.path.join(tmp_dir, f"X_{part}.npy"), getattr(X, part))
+            np.save(os.path.join(tmp_dir, "X_shape.npy"), np.array(X.shape))
+        else:
+            np.save(os.path.join(tmp_dir, "X.npy"), X)
+        if y is not None:
+            np.save(os.path.join(tmp_dir, "y.npy"), y)
+        meta = {"feature_names": list(feature_names), "preprocessor": preprocessor, "label_encoder": label_encoder}
+        joblib.dump(meta, os.path.join(tmp_dir, "meta.joblib"))
+        os.replace(tmp_dir, _entry_dir(key))
+    except OSError:
+        pass  # another worker stored the same entry first
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    _evict_disk()
+
+
+def _load_spilled(key):
+    path = _entry_dir(key)
+    try:
+        if os.path.exists(os.path.join(path, "X_shape.npy")):
+            parts = [np.load(os.path.join(path, f"X_{part}.npy"), mmap_mode="r") for part in ("data", "indices", "indptr")]
+            X = sp.csr_matrix(tuple(parts), shape=tuple(np.load(os.path.join(path, "X_shape.npy"))), copy=False)
+        else:
+            X = np.load(os.path.join(path, "X.npy"), mmap_mode="r")
+        y_path = os.path.join(path, "y.npy")
+        y = np.load(y_path, mmap_mode="r") if os.path.exists(y_path) else None
+        meta = joblib.load(os.path.join(path, "meta.joblib"))
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return X, y, meta["feature_names"], meta["preprocessor"], meta.get("label_encoder")
+
+
+def get(key):
+    with _lock:
+        cached = _memory.get(key)
+        if cached is not None:
+            _memory.move_to_end(key)
+            return cached[0]
+
+    entry = _load_spilled(key)
+    if entry is not None:
+        _remember(key, entry)
+    return entry
+
+
+def put(key, X, y, feature_names, preprocessor, label_encoder=None):
+    entry = (X, y, feature_names, preprocessor, label_encoder)
+    _remember(key, entry)
+    _spill(key, entry)
+
+
+def clear():
+    global _memory_bytes
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
+    for name in os.listdir(CACHE_DIR):
+        shutil.rmtree(os.path.join(CACHE_DIR, name), ignore_errors=True)
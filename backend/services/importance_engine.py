@@ -0,0 +1,138 @@
+from services.job_manager import CORES_PER_WORKER
+from joblib import Parallel, delayed, effective_n_jobs
+import numpy as np
+import scipy.sparse as sp
+import os
+import time
+
+# Model-agnostic feature importance for estimators without feature_importances_
+# or coef_. All transformed features of one input column (e.g. its one-hot
+# columns) are shuffled together on a capped sample of the test split, and the
+# drop in model.score is that column's importance. Columns are scored in
+# parallel batches, and the computation stops at IMPORTANCE_TIME_BUDGET seconds;
+# columns not reached by then are left out of the result, and the column being
+# scored at the cut-off keeps the repeats it finished.
+IMPORTANCE_SAMPLE_SIZE = int(os.getenv("IMPORTANCE_SAMPLE_SIZE", 2000))
+IMPORTANCE_REPEATS = int(os.getenv("IMPORTANCE_REPEATS", 5))
+IMPORTANCE_TIME_BUDGET = float(os.getenv("IMPORTANCE_TIME_BUDGET", 10))
+# Default: the job's share of the cores, -1 = all cores
+IMPORTANCE_N_JOBS = int(os.getenv("IMPORTANCE_N_JOBS", CORES_PER_WORKER))
+# Below this much estimated work, starting worker processes costs more than it saves
+PARALLEL_MIN_SECONDS = 1.0
+
+
+def _onehot_widths(encoder):
+    # Output columns per encoded input column, counting the infrequent bucket once
+    infrequent = getattr(encoder, "infrequent_categories_", None) or [None] * len(encoder.categories_)
+    return [len(c) - (len(i) - 1 if i is not None else 0) for c, i in zip(encoder.categories_, infrequent)]
+
+
+def feature_groups(preprocessor, n_features):
+    # [(input column, [transformed feature indices])] following the fitted
+    # ColumnTransformer's layout, or None if it can't be mapped
+    if preprocessor is None or not hasattr(preprocessor, "output_indices_"):
+        return None
+    groups = []
+    for name, transformer, columns in preprocessor.transformers_:
+        positions = preprocessor.output_indices_.get(name)
+        if positions is None or positions.stop == positions.start or transformer == "drop":
+            continue
+        positions = list(range(positions.start, positions.stop))
+        if name == "hash":
+            # Hashed columns share their buckets, so they can only be shuffled as one
+            groups.append((", ".join(map(str, columns)), positions))
+        elif name == "cat":
+            # The imputer may drop all-missing columns before the encoder sees them
+            encoded = transformer[:-1].get_feature_names_out(columns)
+            widths = _onehot_widths(transformer.named_steps["encoder"])
+            if sum(widths) != len(positions):
+                return None
+            offsets = np.cumsum([0] + widths)
+            groups.extend((str(c), positions[offsets[i]:offsets[i + 1]]) for i, c in enumerate(encoded))
+        else:
+            names = transformer.get_feature_names_out(columns)
+            if len(names) != len(positions):
+                return None
+            groups.extend((str(c), [p]) for c, p in zip(names, positions))
+    if sum(len(p) for _, p in groups) != n_features:
+        return None
+    return groups
+
+
+def _shuffled(X, positions, order):
+    # Copy of X with the rows of the given columns reordered
+    if sp.issparse(X):
+        others = np.setdiff1d(np.arange(X.shape[1]), positions)
+        columns = np.concatenate([others, positions])
+        shuffled = sp.hstack([X[:, others], X[order][:, positions]], format="csc")
+        return shuffled[:, np.argsort(columns)].tocsr()
+    shuffled = X.copy()
+    shuffled[:, positions] = X[np.ix_(order, positions)]
+    return shuffled
+
+
+def _score_groups(model, X, y, groups, repeats, seed, deadline):
+    rng = np.random.default_rng(seed)
+    results = []
+    for name, positions in groups:
+        scores = []
+        for _ in range(repeats):
+            if time.time() > deadline:
+                break
+            scores.append(model.score(_shuffled(X, positions, rng.permutation(X.shape[0])), y))
+        if scores:
+            results.append((name, scores))
+        if len(scores) < repeats:
+            break
+    return results
+
+
+def permutation_importance_data(model, X, y, groups, top_k=10, random_state=42):
+    # Same shape as visualization_engine.feature_importance_data, plus how it was computed
+    started = time.time()
+    deadline = started + IMPORTANCE_TIME_BUDGET
+    if X.shape[0] > IMPORTANCE_SAMPLE_SIZE:
+        rows = np.sort(np.random.RandomState(random_state).choice(X.shape[0], IMPORTANCE_SAMPLE_SIZE, replace=False))
+        X, y = X[rows], y[rows]
+    if sp.issparse(X):
+        X = X.tocsr()
+    y = np.asarray(y)
+
+    score_started = time.time()
+    baseline = model.score(X, y)
+    score_seconds = time.time() - score_started
+
+    # Use fewer repeats when one pass over every column already takes much of the budget
+    n_jobs = min(effective_n_jobs(IMPORTANCE_N_JOBS), len(groups))
+    pass_seconds = score_seconds * len(groups) / n_jobs
+    repeats = int(max(1, min(IMPORTANCE_REPEATS, (deadline - time.time()) / max(pass_seconds, 1e-9))))
+    if score_seconds * len(groups) * repeats < PARALLEL_MIN_SECONDS:
+        n_jobs = 1
+
+    # Interleaved batches, so a cut-off drops columns evenly across the feature layout
+    batches = [groups[i::n_jobs] for i in range(n_jobs)]
+    if n_jobs == 1:
+        scored = [_score_groups(model, X, y, groups, repeats, random_state, deadline)]
+    else:
+        scored = Parallel(n_jobs=n_jobs)(
+            delayed(_score_groups)(model, X, y, batch, repeats, random_state + i, deadline) for i, batch in enumerate(batches)
+        )
+    scored = [entry for batch in scored for entry in batch]
+    if not scored:
+        return None
+
+    drops = [baseline - np.array(scores) for _, scores in scored]
+    importances = np.array([d.mean() for d in drops])
+    indices = np.argsort(importances)[-top_k:]
+    return {
+        "features": [scored[i][0] for i in indices],
+        "importances": [float(importances[i]) for i in indices],
+        "std": [float(drops[i].std()) for i in indices],
+        "method": "permutation",
+        "baseline_score": float(baseline),
+        "repeats": repeats,
+        "sample_size": int(X.shape[0]),
+        "columns_scored": len(scored),
+        "columns_total": len(groups),
+        "seconds": time.time() - started,
+    }
@@ -0,0 +1,340 @@
+from services.preprocessing import iter_dataset, training_columns, split_columns, choose_sparse, HashingEncoder, HIGH_CARDINALITY_THRESHOLD
+from services.model_factory import get_model
+from services.metrics_engine import calculate_metrics, StreamingMetrics
+from services.explanation_engine import generate_explanation
+from services.training_engine import save_model
+from services.visualization_engine import feature_importance_data, residual_data, cluster_data, PLOT_SAMPLE_SIZE
+from services.importance_engine import feature_groups
+from services.job_manager import report
+from services import dataset_store
+from services.telemetry import StageTimings, note
+from sklearn.preprocessing import StandardScaler, LabelEncoder, OneHotEncoder
+from sklearn.impute import SimpleImputer
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from collections import Counter
+import numpy as np
+import scipy.sparse as sp
+
+# Streaming training makes three passes over the dataset, one chunk in memory at a
+# time: (1) collect preprocessing statistics and target classes, (2) partial_fit
+# the model on the training rows, (3) score the holdout rows into running metrics.
+# Pass 1 is skipped when the dataset store's running column statistics cover it.
+
+
+def _split_target(chunk, target_column):
+    if not target_column:
+        return chunk, None
+    # Rows without a target can neither be learned from nor scored
+    chunk = chunk[chunk[target_column].notna()]
+    return chunk.drop(columns=[target_column]), chunk[target_column]
+
+
+def _holdout_mask(n_rows, chunk_index, test_size, random_state):
+    # Deterministic per chunk, so every pass agrees on which rows are held out
+    return np.random.default_rng([random_state, chunk_index]).random(n_rows) < test_size
+
+
+def _sample_mask(n_rows, chunk_index, fraction, random_state):
+    return np.random.default_rng([random_state, chunk_index, 1]).random(n_rows) < fraction
+
+
+def _chunks(request):
+    columns = training_columns(request.feature_columns, request.target_column)
+    for i, chunk in enumerate(iter_dataset(request.dataset_name, request.chunk_rows, columns)):
+        X, y = _split_target(chunk, request.target_column)
+        if request.task_type == "Clustering":
+            holdout = np.zeros(len(X), dtype=bool)
+        else:
+            holdout = _holdout_mask(len(X), i, request.test_size, request.random_state)
+        yield i, X, y, holdout
+
+
+def scan_dataset(request, progress=None):
+    # Pass 1: column types, numeric mean/variance, category frequencies and target classes
+    stats = None
+    for i, X, y, _ in _chunks(request):
+        if stats is None:
+            numeric, categorical = split_columns(X)
+            stats = {
+                "rows": 0,
+                "numeric": numeric,
+                "categorical": categorical,
+                "scaler": StandardScaler(),
+                "counts": {c: Counter() for c in categorical},
+                "hashed": [],
+                "classes": set(),
+                "first_chunk": X,
+            }
+
+        stats["rows"] += len(X)
+        if stats["numeric"] and len(X):
+            # StandardScaler ignores NaNs when accumulating its statistics
+            stats["scaler"].partial_fit(X[stats["numeric"]].to_numpy(dtype="float64"))
+        for c in stats["categorical"]:
+            if c in stats["hashed"]:
+                continue
+            stats["counts"][c].update(X[c].dropna().astype(str).value_counts().to_dict())
+            if request.hash_buckets and len(stats["counts"][c]) > HIGH_CARDINALITY_THRESHOLD:
+                stats["hashed"].append(c)
+                stats["counts"][c] = None
+        if y is not None and request.task_type == "Classification":
+            stats["classes"].update(y.unique().tolist())
+        report(progress, "scanning", 0.05, rows_scanned=stats["rows"])
+
+    if stats is None or stats["rows"] == 0:
+        raise ValueError("Dataset is empty")
+    return stats
+
+
+def stats_from_store(request):
+    # Same result as scan_dataset, built from the statistics the store keeps
+    # up to date on ingest and append. None when they can't stand in for a scan.
+    name = request.dataset_name
+    if not dataset_store.exists(name):
+        return None
+    stored = dataset_store.read_stats(name)
+    schema = dataset_store.read_schema(name)
+    # scan_dataset skips rows without a target, the stored statistics don't
+    if stored is None or schema["num_rows"] == 0 or (request.target_column and schema["null_counts"].get(request.target_column)):
+        return None
+
+    _, X, y, _ = next(_chunks(request))
+    numeric, categorical = split_columns(X)
+    if any("mean" not in stored.get(c, {}) for c in numeric):
+        return None
+
+    counts, hashed = {}, []
+    for c in categorical:
+        values = stored.get(c, {}).get("values")
+        if request.hash_buckets and (values is None or len(values) > HIGH_CARDINALITY_THRESHOLD):
+            hashed.append(c)
+            counts[c] = None
+        elif values is None:
+            return None
+        else:
+            counts[c] = Counter({str(value): count for value, count in values.items()})
+
+    classes = set()
+    if y is not None and request.task_type == "Classification":
+        target_values = stored.get(request.target_column, {}).get("values")
+        if target_values is None:
+            return None
+        classes = set(target_values)
+
+    scaler = StandardScaler()
+    if numeric:
+        n = np.array([stored[c]["count"] for c in numeric])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scaler.mean_ = np.where(n > 0, [stored[c]["mean"] for c in numeric], np.nan)
+            scaler.var_ = np.array([stored[c]["m2"] for c in numeric]) / n
+        scale = np.sqrt(scaler.var_)
+        scaler.scale_ = np.where(np.isfinite(scale) & (scale > 0), scale, 1.0)
+        scaler.n_samples_seen_ = n
+        scaler.n_features_in_ = len(numeric)
+
+    return {
+        "rows": schema["num_rows"],
+        "numeric": numeric,
+        "categorical": categorical,
+        "scaler": scaler,
+        "counts": counts,
+        "hashed": hashed,
+        "classes": classes,
+        "first_chunk": X,
+    }
+
+
+def build_preprocessor(stats, request):
+    # Same layout as preprocess_data, with statistics taken from the whole stream
+    # rather than from a fit on the full matrix
+    onehot = [c for c in stats["categorical"] if c not in stats["hashed"]]
+    categories = {}
+    bucketed = {}  # column -> values to fit its encoder on
+    for c in onehot:
+        ranked = [value for value, _ in stats["counts"][c].most_common()]
+        if request.max_categories and len(ranked) > request.max_categories:
+            # Past the most frequent values, the rest (and unseen values) share
+            # one infrequent column, as in preprocess_data. The encoder ranks
+            # categories by their frequency in the rows it is fitted on, so it
+            # gets the kept values twice and two of the rest once.
+            kept = ranked[:request.max_categories - 1]
+            bucketed[c] = kept * 2 + ranked[len(kept):len(kept) + 2]
+            categories[c] = sorted(set(bucketed[c]))
+        else:
+            categories[c] = sorted(ranked) or ["missing"]
+
+    encoded_widths = [min(len(categories[c]), request.max_categories or len(categories[c])) for c in onehot]
+    if stats["hashed"]:
+        encoded_widths.append(request.hash_buckets)
+    sparse = choose_sparse(request.chunk_rows, len(stats["numeric"]), encoded_widths, request.sparse_mode)
+
+    numeric_steps = [('imputer', SimpleImputer(strategy='mean', keep_empty_features=True))]
+    if request.use_scaling:
+        numeric_steps.append(('scaler', StandardScaler()))
+    transformers = [
+        ('num', Pipeline(steps=numeric_steps), stats["numeric"]),
+        ('cat', Pipeline(steps=[
+            ('imputer', SimpleImputer(strategy='most_frequent', keep_empty_features=True)),
+            ('encoder', OneHotEncoder(categories=[categories[c] for c in onehot], max_categories=request.max_categories,
+                                      handle_unknown='infrequent_if_exist' if request.max_categories else 'ignore',
+                                      sparse_output=sparse))
+        ]), onehot),
+    ]
+    if stats["hashed"]:
+        transformers.append(('hash', HashingEncoder(n_features=request.hash_buckets), stats["hashed"]))
+    preprocessor = ColumnTransformer(transformers=transformers, remainder='drop', sparse_threshold=1.0 if sparse else 0.0)
+
+    # Fit on the first chunk to set up the column bookkeeping, then swap in the
+    # statistics gathered over every chunk
+    first_chunk = stats.pop("first_chunk").copy()
+    for c in onehot:
+        first_chunk[c] = first_chunk[c].astype(object).where(first_chunk[c].isna(), first_chunk[c].astype(str))
+    if bucketed:
+        rows = max(len(first_chunk), *(len(values) for values in bucketed.values()))
+        first_chunk = first_chunk.iloc[np.arange(rows) % len(first_chunk)].reset_index(drop=True)
+        for c, values in bucketed.items():
+            first_chunk[c] = (values * (rows // len(values) + 1))[:rows]
+    preprocessor.fit(first_chunk)
+
+    if stats["numeric"]:
+        numeric_pipeline = preprocessor.named_transformers_['num']
+        means = np.nan_to_num(stats["scaler"].mean_)
+        numeric_pipeline.named_steps['imputer'].statistics_ = means
+        if request.use_scaling:
+            numeric_pipeline.steps[-1] = ('scaler', stats["scaler"])
+    if onehot:
+        most_frequent = [stats["counts"][c].most_common(1)[0][0] if stats["counts"][c] else "missing" for c in onehot]
+        preprocessor.named_transformers_['cat'].named_steps['imputer'].statistics_ = np.array(most_frequent, dtype=object)
+
+    feature_names = list(stats["numeric"])
+    if onehot:
+        feature_names.extend(preprocessor.named_transformers_['cat'].named_steps['encoder'].get_feature_names_out(onehot))
+    if stats["hashed"]:
+        feature_names.extend(preprocessor.named_transformers_['hash'].get_feature_names_out())
+    return preprocessor, feature_names
+
+
+def _transform(preprocessor, X, categorical):
+    # CSV chunks may type a categorical column as numbers; the encoder expects strings
+    X = X.copy()
+    for c in categorical:
+        X[c] = X[c].astype(object).where(X[c].isna(), X[c].astype(str))
+    return preprocessor.transform(X)
+
+
+def train_incremental(request, progress=None):
+    # request is TrainRequest object with streaming=True
+    task_type = request.task_type
+    timings = StageTimings()
+    dataset_version = dataset_store.version(request.dataset_name)
+    with timings.stage("scan"):
+        stats = stats_from_store(request)
+        note(timings, "scan", "stored_stats" if stats is not None else "full_pass")
+        if stats is None:
+            stats = scan_dataset(request, progress)
+    with timings.stage("preprocess"):
+        preprocessor, feature_names = build_preprocessor(stats, request)
+    categorical = [c for c in stats["categorical"] if c not in stats["hashed"]] + stats["hashed"]
+
+    label_encoder = None
+    partial_fit_kwargs = {}
+    if task_type == "Classification":
+        label_encoder = LabelEncoder().fit(sorted(stats["classes"], key=str))
+        partial_fit_kwargs["classes"] = np.arange(len(label_encoder.classes_))
+
+    # Pass 2: train on every non-holdout row
+    model = get_model(task_type, request.model_name, request.params)
+    rows_seen = 0
+    rows_trained = 0
+    chunks = 0
+    with timings.stage("fit"):
+        for i, X, y, holdout in _chunks(request):
+            rows_seen += len(X)
+            chunks += 1
+            train = ~holdout
+            if train.any():
+                X_train = _transform(preprocessor, X[train], categorical)
+                if task_type == "Clustering":
+                    model.partial_fit(X_train)
+                elif task_type == "Classification":
+                    model.partial_fit(X_train, label_encoder.transform(y[train]), **partial_fit_kwargs)
+                    partial_fit_kwargs = {}
+                else:
+                    model.partial_fit(X_train, y[train].to_numpy(dtype="float64"))
+                rows_trained += int(train.sum())
+            report(progress, "training", 0.1 + 0.6 * rows_seen / stats["rows"], rows_trained=rows_trained)
+
+    # Pass 3: metrics over the holdout (every row for clustering), plus a bounded
+    # sample of points for the plots
+    report(progress, "evaluating", 0.7)
+    n_classes = len(label_encoder.classes_) if label_encoder is not None else None
+    streaming_metrics = StreamingMetrics(task_type, n_classes)
+    expected_rows = stats["rows"] if task_type == "Clustering" else stats["rows"] * request.test_size
+    sample_fraction = min(1.0, PLOT_SAMPLE_SIZE / max(expected_rows, 1))
+    samples = {"X": [], "y_true": [], "y_pred": []}
+    rows_evaluated = 0
+    with timings.stage("evaluate"):
+        for i, X, y, holdout in _chunks(request):
+            evaluate = holdout if task_type != "Clustering" else np.ones(len(X), dtype=bool)
+            if not evaluate.any():
+                continue
+            X_eval = _transform(preprocessor, X[evaluate], categorical)
+            y_pred = model.predict(X_eval)
+            if task_type == "Classification":
+                y_true = label_encoder.transform(y[evaluate])
+            elif task_type == "Regression":
+                y_true = y[evaluate].to_numpy(dtype="float64")
+            else:
+                y_true = None
+            if y_true is not None:
+                streaming_metrics.update(y_true, y_pred)
+            rows_evaluated += len(y_pred)
+
+            sample = _sample_mask(len(y_pred), i, sample_fraction, request.random_state)
+            if task_type == "Clustering":
+                samples["X"].append(X_eval[sample])
+            if y_true is not None:
+                samples["y_true"].append(y_true[sample])
+            samples["y_pred"].append(y_pred[sample])
+            report(progress, "evaluating", 0.7 + 0.2 * rows_evaluated / max(expected_rows, 1), rows_evaluated=rows_evaluated)
+
+    if rows_evaluated == 0:
+        raise ValueError("No rows were held out for evaluation; increase test_size or the dataset size")
+
+    y_pred_sample = np.concatenate(samples["y_pred"])
+    plot_data = {}
+    if task_type == "Clustering":
+        X_sample = sp.vstack(samples["X"]) if sp.issparse(samples["X"][0]) else np.vstack(samples["X"])
+        with timings.stage("metrics"):
+            metrics = calculate_metrics(y_pred_sample, y_pred_sample, task_type, X_sample)
+        with timings.stage("plots"):
+            plot_data["cluster_plot"] = cluster_data(X_sample, y_pred_sample)
+    else:
+        metrics = streaming_metrics.result()
+        with timings.stage("plots"):
+            plot_data["feature_importance"] = feature_importance_data(model, feature_names,
+                                                                      groups=feature_groups(preprocessor, len(feature_names)))
+            if task_type == "Classification":
+                plot_data["confusion_matrix"] = {"matrix": streaming_metrics.confusion.tolist()}
+            else:
+                y_true_sample = np.concatenate(samples["y_true"])
+                plot_data["residual_plot"] = residual_data(y_true_sample, y_pred_sample)
+    plot_data = {kind: data for kind, data in plot_data.items() if data is not None}
+
+    report(progress, "saving", 0.95)
+    with timings.stage("save"):
+        model_id = save_model(model, task_type, request.model_name, preprocessor, label_encoder, dataset_version)
+    return {
+        "metrics": metrics,
+        "explanation": generate_explanation(metrics, task_type),
+        "plot_data": plot_data,
+        "model_id": model_id,
+        "streaming": {
+            "chunk_rows": request.chunk_rows,
+            "chunks": chunks,
+            "rows_trained": rows_trained,
+            "rows_evaluated": rows_evaluated,
+        },
+        "timings": timings.as_dict(),
+    }
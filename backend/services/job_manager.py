@@ -0,0 +1,362 @@
+import importlib
+import multiprocessing
+import os
+import threading
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from services.resource_governor import MEMORY_BUDGET_MB, QUEUE_LIMIT
+
+# Number of worker processes used for CPU-bound jobs (training, sweeps, ...)
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", os.cpu_count() or 1))
+# Cores each of those workers may use for parallelism inside a job, so that a
+# full pool of jobs does not oversubscribe the machine
+CORES_PER_WORKER = max(1, (os.cpu_count() or 1) // TRAINING_WORKERS)
+
+# Finished jobs stay pollable for this many seconds, and at most this many are kept
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", 3600))
+MAX_FINISHED_JOBS = int(os.getenv("MAX_FINISHED_JOBS", 1000))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = {COMPLETED, FAILED, CANCELLED}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ProgressReporter:
+    # Lives in the worker process. Progress goes through a manager dict so the
+    # API process can read it, and every report is also a cancellation checkpoint.
+    def __init__(self, job_id, progress_state, cancel_flags):
+        self.job_id = job_id
+        self.progress_state = progress_state
+        self.cancel_flags = cancel_flags
+
+    def __call__(self, stage, fraction, **extra):
+        if self.cancel_flags.get(self.job_id):
+            raise JobCancelled(f"Job {self.job_id} was cancelled")
+        state = {"stage": stage, "progress": float(fraction)}
+        state.update(extra)
+        self.progress_state[self.job_id] = state
+
+
+def report(progress, stage, fraction, **extra):
+    # progress is the job reporter when running in the worker pool, None otherwise
+    if progress is not None:
+        progress(stage, fraction, **extra)
+
+
+def _resolve(target):
+    # Targets are "module:function" strings so this module stays import-light
+    module_name, func_name = target.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _run_job(job_id, target, args, kwargs, progress_state, cancel_flags):
+    reporter = ProgressReporter(job_id, progress_state, cancel_flags)
+    reporter("starting", 0.0)
+    return _resolve(target)(*args, progress=reporter, **kwargs)
+
+
+_lock = threading.Lock()
+_jobs = {}
+_dedup_keys = {}  # dedup key -> id of the unfinished job computing it
+_waiting = deque()  # ids of jobs held back until their memory reservation fits
+_reserved_mb = 0.0  # memory reserved by the jobs handed to the pool
+_executor = None
+_manager = None
+_progress_state = None
+_cancel_flags = None
+
+
+def _get_executor():
+    global _executor, _manager, _progress_state, _cancel_flags
+    with _lock:
+        if _executor is None:
+            context = multiprocessing.get_context("spawn")
+            _manager = context.Manager()
+            _progress_state = _manager.dict()
+            _cancel_flags = _manager.dict()
+            _executor = ProcessPoolExecutor(max_workers=TRAINING_WORKERS, mp_context=context)
+        return _executor
+
+
+def _new_job(kind, details):
+    return {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "status": QUEUED,
+        "stage": None,
+        "progress": 0.0,
+        "error": None,
+        "details": dict(details or {}),
+        "result_id": None,
+        "created_at": datetime.now(timezone.utc),
+        "finished_at": None,
+        "future": None,
+        "dedup_key": None,
+        "memory_mb": None,
+        "launch": None,
+    }
+
+
+# Runs `target` in the worker pool and returns the job id immediately.
+# `on_result` is called in the API process with the worker's return value and
+# may return an id (e.g. the saved Experiment) that is stored on the job, or a
+# Future of that id, in which case the job completes when the Future resolves.
+# `details` seeds the job's details, e.g. where its output will be written.
+# Submitting with the `dedup_key` of an unfinished job returns that job's id
+# instead of starting a second identical computation.
+# A job given `memory_mb` reserves that much of MEMORY_BUDGET_MB while it runs,
+# and waits (in submission order) until running jobs leave enough of it free.
+# QueueFull is raised when QUEUE_LIMIT jobs are already waiting.
+def submit(kind, target, args=(), kwargs=None, on_result=None, details=None, dedup_key=None, memory_mb=None):
+    _get_executor()
+    with _lock:
+        if dedup_key is not None and dedup_key in _dedup_keys:
+            return _dedup_keys[dedup_key]
+        if memory_mb is not None and _waiting and len(_waiting) >= QUEUE_LIMIT:
+            raise QueueFull(f"{len(_waiting)} jobs are already waiting for memory")
+        _prune()
+        job = _new_job(kind, details)
+        job["dedup_key"] = dedup_key
+        job["memory_mb"] = memory_mb
+        job["launch"] = (target, tuple(args), kwargs or {}, on_result)
+        job_id = job["id"]
+        _jobs[job_id] = job
+        if dedup_key is not None:
+            _dedup_keys[dedup_key] = job_id
+        if memory_mb is None:
+            ready = [job_id]
+        else:
+            job["stage"] = "waiting_for_memory"
+            _waiting.append(job_id)
+            ready = _admit()
+
+    for ready_id in ready:
+        _start(ready_id)
+    return job_id
+
+
+def _admit():
+    # Called with _lock held; reserves memory for the waiting jobs that can
+    # start now and returns their ids. Jobs start in submission order so large
+    # ones aren't starved, and one larger than the budget runs on its own.
+    global _reserved_mb
+    ready = []
+    while _waiting:
+        job = _jobs[_waiting[0]]
+        if _reserved_mb + job["memory_mb"] > MEMORY_BUDGET_MB and _reserved_mb > 0:
+            break
+        _waiting.popleft()
+        _reserved_mb += job["memory_mb"]
+        job["stage"] = None
+        job["details"]["reserved_memory_mb"] = job["memory_mb"]
+        job["details"]["memory_wait_seconds"] = (datetime.now(timezone.utc) - job["created_at"]).total_seconds()
+        ready.append(job["id"])
+    return ready
+
+
+def _release(job):
+    global _reserved_mb
+    with _lock:
+        if job["memory_mb"] is not None:
+            _reserved_mb = max(_reserved_mb - job["memory_mb"], 0.0)
+            job["memory_mb"] = None  # released
+        ready = _admit()
+    for ready_id in ready:
+        _start(ready_id)
+
+
+def _start(job_id):
+    global _executor
+    job = _jobs[job_id]
+    target, args, kwargs, on_result = job["launch"]
+    executor = _get_executor()
+    try:
+        future = executor.submit(_run_job, job_id, target, args, kwargs, _progress_state, _cancel_flags)
+    except Exception as e:
+        traceback.print_exc()
+        if isinstance(e, BrokenProcessPool):
+            # A worker died (e.g. OOM-killed); later jobs get a fresh pool
+            with _lock:
+                if _executor is executor:
+                    _executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+        # The job never ran: fail it and hand its reservation to the next in line
+        _close(job_id, FAILED, error=f"Failed to start job: {e}")
+        _release(job)
+        return
+    job["future"] = future
+    future.add_done_callback(lambda f: _finish(job_id, f, on_result))
+
+
+def _finish(job_id, future, on_result):
+    # The worker is done with the job's memory, whatever happens to its result
+    _release(_jobs[job_id])
+    if future.cancelled():
+        _close(job_id, CANCELLED)
+        return
+    try:
+        result = future.result()
+    except JobCancelled:
+        _close(job_id, CANCELLED)
+        return
+    except Exception as e:
+        _close(job_id, FAILED, error=str(e) or e.__class__.__name__)
+        return
+
+    try:
+        result_id = on_result(result) if on_result is not None else None
+    except Exception as e:
+        traceback.print_exc()
+        _close(job_id, FAILED, error=f"Failed to store result: {e}")
+        return
+    if isinstance(result_id, Future):
+        # Written in the background (see services/result_writer); the job
+        # completes once the write is committed
+        result_id.add_done_callback(lambda f: _stored(job_id, f))
+    else:
+        _close(job_id, COMPLETED, result_id=result_id)
+
+
+def _stored(job_id, future):
+    try:
+        result_id = future.result()
+    except Exception as e:
+        _close(job_id, FAILED, error=f"Failed to store result: {e}")
+        return
+    _close(job_id, COMPLETED, result_id=result_id)
+
+
+def _close(job_id, status, error=None, result_id=None):
+    job = _jobs[job_id]
+    if status == COMPLETED:
+        job["result_id"] = result_id
+        job["progress"] = 1.0
+        job["stage"] = "done"
+    job["error"] = error
+    job["finished_at"] = datetime.now(timezone.utc)
+    # Keep the last reported details (e.g. per-fold scores) on the finished job
+    state = _progress_state.pop(job_id, None) or {}
+    job["details"].update({k: v for k, v in state.items() if k not in ("stage", "progress")})
+    _cancel_flags.pop(job_id, None)
+    # The future holds the worker's return value; results live in the database
+    job["future"] = None
+    job["launch"] = None
+    # Set last: pollers treat the status as the signal that everything else is in place
+    job["status"] = status
+    with _lock:
+        if job["dedup_key"] is not None and _dedup_keys.get(job["dedup_key"]) == job_id:
+            del _dedup_keys[job["dedup_key"]]
+
+
+def record_completed(kind, result_id, details=None):
+    # Registers a job that is already done, e.g. a result served from a cache,
+    # so clients poll and fetch it exactly like a computed one
+    job = _new_job(kind, details)
+    now = datetime.now(timezone.utc)
+    job.update(status=COMPLETED, stage="done", progress=1.0, result_id=result_id, created_at=now, finished_at=now)
+    with _lock:
+        _prune()
+        _jobs[job["id"]] = job
+    return job["id"]
+
+
+def _prune():
+    # Called with _lock held: drops finished jobs past their retention, oldest first
+    now = datetime.now(timezone.utc)
+    finished = sorted(
+        (job["finished_at"], job_id) for job_id, job in _jobs.items()
+        if job["status"] in FINISHED_STATES and job["finished_at"] is not None
+    )
+    excess = len(finished) - MAX_FINISHED_JOBS
+    for i, (finished_at, job_id) in enumerate(finished):
+        if i < excess or (now - finished_at).total_seconds() > JOB_RETENTION_SECONDS:
+            del _jobs[job_id]
+
+
+def get_job(job_id):
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+
+    # Jobs stay "queued" until they finish; running state comes from the worker
+    view = dict(job)
+    if view["status"] == QUEUED:
+        state = _progress_state.get(job_id)
+        if state:
+            view["status"] = RUNNING
+            view["stage"] = state.get("stage")
+            view["progress"] = state.get("progress", view["progress"])
+            view["details"] = {**job["details"], **{k: v for k, v in state.items() if k not in ("stage", "progress")}}
+    return view
+
+
+def cancel_job(job_id):
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    if job["status"] not in FINISHED_STATES:
+        with _lock:
+            waiting = job_id in _waiting
+            if waiting:
+                _waiting.remove(job_id)
+                job["memory_mb"] = None  # never reserved
+        # Pending jobs never reach a worker; running ones stop at their next checkpoint
+        if waiting:
+            _close(job_id, CANCELLED)
+            _release(job)  # jobs queued behind it may fit now
+        elif job["future"] is None or not job["future"].cancel():
+            _cancel_flags[job_id] = True
+    return get_job(job_id)
+
+
+def active_count():
+    return sum(1 for job in list(_jobs.values()) if job["status"] not in FINISHED_STATES)
+
+
+def in_flight():
+    # {(kind, status): count} of unfinished jobs, with queued/running told apart
+    counts = {}
+    for job_id, job in list(_jobs.items()):
+        if job["status"] in FINISHED_STATES:
+            continue
+        view = get_job(job_id)
+        key = (view["kind"], view["status"])
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def reserved_memory_mb():
+    return _reserved_mb
+
+
+def waiting_count():
+    return len(_waiting)
+
+
+def shutdown():
+    global _executor, _manager
+    with _lock:
+        # Jobs still waiting for memory would otherwise start a new pool
+        _waiting.clear()
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+        if _manager is not None:
+            _manager.shutdown()
+            _manager = None
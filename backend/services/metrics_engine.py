@@ -1,5 +1,66 @@
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, mean_absolute_error, mean_squared_error, r2_score, silhouette_score
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, mean_absolute_error, mean_squared_error, r2_score
+from sklearn.metrics import silhouette_samples, davies_bouldin_score, calinski_harabasz_score
 import numpy as np
+import scipy.sparse as sp
+import os
+
+# Silhouette is O(n^2), so it is estimated on a cluster-stratified sample of this
+# many points; distances are computed in blocks bounded by sklearn's working_memory.
+SILHOUETTE_SAMPLE_SIZE = int(os.getenv("SILHOUETTE_SAMPLE_SIZE", 5000))
+# Each cluster contributes at least this many sampled points (when it has them)
+SILHOUETTE_MIN_PER_CLUSTER = int(os.getenv("SILHOUETTE_MIN_PER_CLUSTER", 20))
+
+def stratified_sample(labels, sample_size, min_per_cluster=SILHOUETTE_MIN_PER_CLUSTER, random_state=42):
+    # Returns sampled row indices and, per sampled row, the number of rows it stands for
+    labels = np.asarray(labels)
+    rng = np.random.RandomState(random_state)
+    clusters, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    quotas = np.minimum(counts, np.maximum(min_per_cluster, np.round(sample_size * counts / len(labels)).astype(int)))
+    if quotas.sum() > sample_size:
+        # The per-cluster minimum pushed the total over; shrink every quota
+        # proportionally, keeping at least one point per cluster
+        quotas = np.maximum(1, (quotas * sample_size // quotas.sum()).astype(int))
+    # Row indices grouped by cluster in one sort instead of a scan per cluster
+    members_by_cluster = np.split(np.argsort(inverse, kind="stable"), np.cumsum(counts)[:-1])
+    indices = []
+    weights = []
+    for members, count, quota in zip(members_by_cluster, counts, quotas):
+        if quota < count:
+            members = rng.choice(members, quota, replace=False)
+        indices.append(members)
+        weights.append(np.full(len(members), count / len(members)))
+    order = np.argsort(np.concatenate(indices))
+    return np.concatenate(indices)[order], np.concatenate(weights)[order]
+
+def clustering_metrics(X, labels, sample_size=SILHOUETTE_SAMPLE_SIZE, random_state=42):
+    labels = np.asarray(labels)
+    n_labels = len(np.unique(labels))
+    if n_labels < 2 or n_labels >= len(labels):
+        return {"silhouette": -1.0} # Error case usually implies < 2 labels
+
+    indices, weights = stratified_sample(labels, sample_size, random_state=random_state)
+    X_sample = X[indices]
+    values = silhouette_samples(X_sample, labels[indices])
+
+    # Weighted mean over the stratified sample, with a normal-approximation 95% interval
+    weights = weights / weights.sum()
+    mean = float(np.sum(weights * values))
+    standard_error = float(np.sqrt(np.sum(weights ** 2 * (values - mean) ** 2)))
+    metrics = {
+        "silhouette": mean,
+        "silhouette_ci_low": mean - 1.96 * standard_error,
+        "silhouette_ci_high": mean + 1.96 * standard_error,
+        "silhouette_sample_size": len(indices),
+    }
+
+    # Both are O(n * k); they need dense input, so sparse matrices use the sample
+    X_full, labels_full = X, labels
+    if sp.issparse(X):
+        X_full, labels_full = X_sample.toarray(), labels[indices]
+    if len(np.unique(labels_full)) >= 2:
+        metrics["davies_bouldin"] = float(davies_bouldin_score(X_full, labels_full))
+        metrics["calinski_harabasz"] = float(calinski_harabasz_score(X_full, labels_full))
+    return metrics
 
 def calculate_metrics(y_true, y_pred, task_type, X=None):
     metrics = {}
@@ -18,9 +79,58 @@ def calculate_metrics(y_true, y_pred, task_type, X=None):
         
     elif task_type == "Clustering":
         if X is not None:
-             try:
-                 metrics["silhouette"] = float(silhouette_score(X, y_pred))
-             except ValueError:
-                 metrics["silhouette"] = -1.0 # Error case usually implies < 2 labels
+             metrics.update(clustering_metrics(X, y_pred))
                  
     return metrics
+
+class StreamingMetrics:
+    # Accumulates holdout predictions chunk by chunk and yields the same values as
+    # calculate_metrics would on the concatenated arrays. Classification labels
+    # must be encoded as 0..n_classes-1.
+    def __init__(self, task_type, n_classes=None):
+        self.task_type = task_type
+        self.count = 0
+        if task_type == "Classification":
+            self.confusion = np.zeros((n_classes, n_classes), dtype=np.int64)
+        else:
+            self.sums = np.zeros(4)  # sum of |error|, error^2, y and y^2
+
+    def update(self, y_true, y_pred):
+        y_true = np.asarray(y_true)
+        y_pred = np.asarray(y_pred)
+        self.count += len(y_true)
+        if self.task_type == "Classification":
+            n = self.confusion.shape[0]
+            self.confusion += np.bincount(y_true * n + y_pred, minlength=n * n).reshape(n, n)
+        else:
+            errors = y_true - y_pred
+            self.sums += [np.abs(errors).sum(), (errors ** 2).sum(), y_true.sum(), (y_true ** 2).sum()]
+
+    def result(self):
+        metrics = {}
+        if self.count == 0:
+            return metrics
+
+        if self.task_type == "Classification":
+            true_positives = np.diag(self.confusion).astype(float)
+            support = self.confusion.sum(axis=1)
+            predicted = self.confusion.sum(axis=0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                precision = np.where(predicted > 0, true_positives / predicted, 0.0)
+                recall = np.where(support > 0, true_positives / support, 0.0)
+                f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+            weights = support / support.sum()
+            metrics["accuracy"] = float(true_positives.sum() / self.count)
+            metrics["precision"] = float((precision * weights).sum())
+            metrics["recall"] = float((recall * weights).sum())
+            metrics["f1"] = float((f1 * weights).sum())
+
+        elif self.task_type == "Regression":
+            abs_errors, squared_errors, y_sum, y_squared = self.sums
+            total_variance = y_squared - y_sum ** 2 / self.count
+            metrics["mae"] = float(abs_errors / self.count)
+            metrics["mse"] = float(squared_errors / self.count)
+            metrics["rmse"] = float(np.sqrt(metrics["mse"]))
+            metrics["r2"] = float(1 - squared_errors / total_variance) if total_variance > 0 else 0.0
+
+        return metrics
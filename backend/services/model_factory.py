@@ -1,37 +1,62 @@
-from sklearn.linear_model import LogisticRegression, LinearRegression
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, GradientBoostingRegressor
-from sklearn.svm import SVC
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.cluster import KMeans, DBSCAN, AgglomerativeClustering
+import importlib
+
+# (module, class, default parameters) per task and model name. Classes are
+# imported on first use, so listing or validating models doesn't load
+# scikit-learn until a model is actually built. Insertion order is the order
+# the UI lists them in.
+MODEL_REGISTRY = {
+    "Classification": {
+        "Logistic Regression": ("sklearn.linear_model", "LogisticRegression", {"max_iter": 1000}),
+        "Random Forest": ("sklearn.ensemble", "RandomForestClassifier", {}),
+        "SVM": ("sklearn.svm", "SVC", {"probability": True}),
+        "KNN": ("sklearn.neighbors", "KNeighborsClassifier", {}),
+        "SGD Classifier": ("sklearn.linear_model", "SGDClassifier", {"loss": "log_loss"}),
+    },
+    "Regression": {
+        "Linear Regression": ("sklearn.linear_model", "LinearRegression", {}),
+        "Random Forest Regressor": ("sklearn.ensemble", "RandomForestRegressor", {}),
+        "Gradient Boosting": ("sklearn.ensemble", "GradientBoostingRegressor", {}),
+        "SGD Regressor": ("sklearn.linear_model", "SGDRegressor", {}),
+    },
+    "Clustering": {
+        "KMeans": ("sklearn.cluster", "KMeans", {}),
+        "DBSCAN": ("sklearn.cluster", "DBSCAN", {}),
+        "Agglomerative Clustering": ("sklearn.cluster", "AgglomerativeClustering", {}),
+        "MiniBatch KMeans": ("sklearn.cluster", "MiniBatchKMeans", {}),
+    },
+}
+
+# Models offered per task, in the order the UI lists them
+AVAILABLE_MODELS = {task: list(models) for task, models in MODEL_REGISTRY.items()}
+
+# Estimators that cannot fit on scipy.sparse input; their X is densified after downsampling
+SPARSE_UNSUPPORTED_MODELS = {"Agglomerative Clustering"}
+
+# Estimators with partial_fit, which can train chunk by chunk on the full dataset
+INCREMENTAL_MODELS = {"SGD Classifier", "SGD Regressor", "MiniBatch KMeans"}
+
+# Ensembles that can grow with warm_start, adding estimators fitted on new rows
+WARM_START_MODELS = {"Random Forest", "Random Forest Regressor", "Gradient Boosting"}
+
+def supports_sparse(model_name):
+    return model_name not in SPARSE_UNSUPPORTED_MODELS
+
+def supports_partial_fit(model_name):
+    return model_name in INCREMENTAL_MODELS
+
+def supports_warm_start(model_name):
+    # Models that can continue training from a previous model_id on appended rows
+    return model_name in WARM_START_MODELS or supports_partial_fit(model_name)
 
 def get_model(task_type, model_name, params=None):
     if params is None:
         params = {}
-        
-    if task_type == "Classification":
-        if model_name == "Logistic Regression":
-            return LogisticRegression(max_iter=1000, **params)
-        elif model_name == "Random Forest":
-            return RandomForestClassifier(**params)
-        elif model_name == "SVM":
-            return SVC(probability=True, **params)
-        elif model_name == "KNN":
-            return KNeighborsClassifier(**params)
-            
-    elif task_type == "Regression":
-        if model_name == "Linear Regression":
-            return LinearRegression(**params)
-        elif model_name == "Random Forest Regressor":
-            return RandomForestRegressor(**params)
-        elif model_name == "Gradient Boosting":
-            return GradientBoostingRegressor(**params)
-            
-    elif task_type == "Clustering":
-        if model_name == "KMeans":
-            return KMeans(**params)
-        elif model_name == "DBSCAN":
-            return DBSCAN(**params)
-        elif model_name == "Agglomerative Clustering":
-            return AgglomerativeClustering(**params)
-            
-    raise ValueError(f"Model {model_name} not supported for task {task_type}")
+
+    entry = MODEL_REGISTRY.get(task_type, {}).get(model_name)
+    if entry is None:
+        raise ValueError(f"Model {model_name} not supported for task {task_type}")
+    module_name, class_name, defaults = entry
+    # import_module is a dict lookup once the module has been loaded
+    estimator_class = getattr(importlib.import_module(module_name), class_name)
+    # Caller parameters override the registry defaults
+    return estimator_class(**{**defaults, **params})
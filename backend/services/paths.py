@@ -0,0 +1,15 @@
+import os
+
+# Working directories shared by the API and the workers. Kept free of heavy
+# imports so routes can resolve paths without loading pandas or scikit-learn.
+UPLOAD_DIR = "uploads"
+MODEL_DIR = "models_saved"
+PREDICTION_DIR = "predictions"
+
+for _directory in (UPLOAD_DIR, MODEL_DIR, PREDICTION_DIR):
+    if not os.path.exists(_directory):
+        os.makedirs(_directory)
+
+
+def prediction_path(output_id):
+    return os.path.join(PREDICTION_DIR, f"{output_id}.csv")
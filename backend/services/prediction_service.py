@@ -0,0 +1,167 @@
+from services.paths import MODEL_DIR
+from services import telemetry
+from starlette.concurrency import run_in_threadpool
+from collections import OrderedDict
+import pandas as pd
+import numpy as np
+import asyncio
+import joblib
+import json
+import os
+import threading
+
+# Loaded pipelines are kept in a per-process LRU bounded by MODEL_CACHE_BYTES
+# (estimated from the pickle size) so repeat predictions skip joblib.load.
+MODEL_CACHE_BYTES = int(os.getenv("MODEL_CACHE_BYTES", 512 * 1024 ** 2))
+
+# Concurrent requests for the same model arriving within PREDICT_BATCH_WINDOW_MS
+# are scored together in one vectorized call, up to PREDICT_MAX_BATCH_ROWS rows.
+BATCH_WINDOW_MS = float(os.getenv("PREDICT_BATCH_WINDOW_MS", 5))
+MAX_BATCH_ROWS = int(os.getenv("PREDICT_MAX_BATCH_ROWS", 1024))
+
+_lock = threading.Lock()
+_models = OrderedDict()  # model_id -> ((pipeline, metadata), nbytes)
+_models_bytes = 0
+
+
+def _model_path(model_id, ext):
+    # model ids are uuids; anything else must not escape MODEL_DIR
+    if not model_id or os.path.basename(model_id) != model_id:
+        raise FileNotFoundError(f"Model {model_id} not found")
+    return os.path.join(MODEL_DIR, f"{model_id}.{ext}")
+
+
+def load_model(model_id):
+    global _models_bytes
+    with _lock:
+        cached = _models.get(model_id)
+        if cached is not None:
+            _models.move_to_end(model_id)
+            telemetry.cache_lookup("model", True)
+            return cached[0]
+
+    telemetry.cache_lookup("model", False)
+    pkl_path = _model_path(model_id, "pkl")
+    meta_path = _model_path(model_id, "json")
+    if not os.path.exists(pkl_path):
+        raise FileNotFoundError(f"Model {model_id} not found")
+    if not os.path.exists(meta_path):
+        raise ValueError("This model was saved without its preprocessing pipeline; retrain it to serve predictions")
+    with open(meta_path) as f:
+        metadata = json.load(f)
+    if not metadata.get("pipeline"):
+        raise ValueError("This model was saved without its preprocessing pipeline; retrain it to serve predictions")
+
+    entry = (joblib.load(pkl_path), metadata)
+    nbytes = os.path.getsize(pkl_path)
+    if nbytes <= MODEL_CACHE_BYTES:
+        with _lock:
+            if model_id not in _models:
+                _models[model_id] = (entry, nbytes)
+                _models_bytes += nbytes
+            while _models_bytes > MODEL_CACHE_BYTES:
+                _, (_, evicted_bytes) = _models.popitem(last=False)
+                _models_bytes -= evicted_bytes
+    return entry
+
+
+def prepare_frame(df, metadata):
+    # Unknown columns are dropped and missing ones left to the pipeline's imputers
+    df = df.reindex(columns=metadata["input_columns"])
+    for column in metadata["input_columns"]:
+        if column in metadata["categorical_columns"]:
+            df[column] = df[column].map(lambda v: np.nan if pd.isna(v) else str(v)).astype(object)
+        else:
+            df[column] = pd.to_numeric(df[column]).astype("float64")
+    return df
+
+
+def score_frame(pipeline, metadata, df):
+    if not hasattr(pipeline, "predict"):
+        raise ValueError(f"{metadata['model_name']} cannot score new rows")
+    df = prepare_frame(df, metadata)
+
+    predictions = pipeline.predict(df)
+    result = {"predictions": predictions.tolist()}
+    classes = metadata.get("classes")
+    if classes is not None:
+        result["predictions"] = [classes[i] for i in predictions]
+        if hasattr(pipeline, "predict_proba"):
+            probabilities = np.round(pipeline.predict_proba(df), 6)
+            result["probabilities"] = [dict(zip(map(str, classes), p)) for p in probabilities.tolist()]
+    return result
+
+
+def predict_rows(model_id, rows):
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ValueError("rows must be a list of objects keyed by column name")
+    pipeline, metadata = load_model(model_id)
+    return score_frame(pipeline, metadata, pd.DataFrame.from_records(rows))
+
+
+# --- Micro-batching (runs on the API event loop) ---
+
+_pending = {}  # model_id -> (list of (rows, future), flush timer)
+
+
+def _split(result, sizes):
+    parts = []
+    start = 0
+    for size in sizes:
+        parts.append({key: values[start:start + size] for key, values in result.items()})
+        start += size
+    return parts
+
+
+def _resolve(future, result=None, error=None):
+    # The awaiting request may have been cancelled (client disconnected)
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+async def _run_batch(model_id, batch):
+    rows = [row for request_rows, _ in batch for row in request_rows]
+    try:
+        result = await run_in_threadpool(predict_rows, model_id, rows)
+    except Exception as e:
+        if len(batch) == 1:
+            _resolve(batch[0][1], error=e)
+            return
+        # Score the requests one by one so a bad request only fails itself
+        for request_rows, future in batch:
+            try:
+                _resolve(future, await run_in_threadpool(predict_rows, model_id, request_rows))
+            except Exception as request_error:
+                _resolve(future, error=request_error)
+        return
+
+    for (_, future), part in zip(batch, _split(result, [len(r) for r, _ in batch])):
+        _resolve(future, part)
+
+
+def _flush(model_id):
+    batch, timer = _pending.pop(model_id, (None, None))
+    if batch is None:
+        return
+    timer.cancel()
+    asyncio.ensure_future(_run_batch(model_id, batch))
+
+
+async def predict(model_id, rows):
+    if not isinstance(rows, list) or not rows:
+        raise ValueError("rows must be a non-empty list")
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    if model_id not in _pending:
+        timer = loop.call_later(BATCH_WINDOW_MS / 1000, _flush, model_id)
+        _pending[model_id] = ([], timer)
+    batch = _pending[model_id][0]
+    batch.append((rows, future))
+    if sum(len(r) for r, _ in batch) >= MAX_BATCH_ROWS:
+        _flush(model_id)
+    return await future
@@ -5,25 +5,130 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder, OneHotEncoder
 from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction import FeatureHasher
+from services import dataset_store, feature_cache
+from services.telemetry import span, note
+from services.paths import UPLOAD_DIR
 import os
 
-UPLOAD_DIR = "uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+# In "auto" sparse mode the one-hot output stays sparse when it would be mostly
+# zeros and the dense matrix would be large enough to matter
+SPARSE_DENSITY_THRESHOLD = float(os.getenv("SPARSE_DENSITY_THRESHOLD", 0.3))
+SPARSE_MIN_DENSE_BYTES = int(os.getenv("SPARSE_MIN_DENSE_BYTES", 64 * 1024 ** 2))
+# Categoricals with more distinct values than this are hashed when hash_buckets is set
+HIGH_CARDINALITY_THRESHOLD = int(os.getenv("HIGH_CARDINALITY_THRESHOLD", 1000))
+# With optimize_memory, string columns whose distinct values are at most this
+# fraction of the rows are loaded as pandas categories
+CATEGORY_MAX_FRACTION = float(os.getenv("CATEGORY_MAX_FRACTION", 0.5))
 
-def load_dataset(filename: str) -> pd.DataFrame:
+class HashingEncoder(BaseEstimator, TransformerMixin):
+    # Hashes "column=value" tokens into a fixed number of sparse columns, for
+    # categoricals too wide to one-hot encode
+    def __init__(self, n_features=1024):
+        self.n_features = n_features
+
+    def fit(self, X, y=None):
+        self.columns_ = list(X.columns)
+        return self
+
+    def transform(self, X):
+        tokens = [(c + "=" + X[c].astype(str)).tolist() for c in self.columns_]
+        hasher = FeatureHasher(n_features=self.n_features, input_type="string", alternate_sign=False)
+        return hasher.transform(zip(*tokens))
+
+    def get_feature_names_out(self, input_features=None):
+        return np.array([f"hash_{i}" for i in range(self.n_features)], dtype=object)
+
+def choose_sparse(n_rows, n_numeric, encoded_widths, sparse_mode="auto"):
+    if sparse_mode != "auto":
+        return sparse_mode == "sparse"
+    width = n_numeric + sum(encoded_widths)
+    if not encoded_widths or width == 0:
+        return False
+    # Every row has one non-zero per numeric column and per encoded categorical
+    density = (n_numeric + len(encoded_widths)) / width
+    dense_bytes = n_rows * width * 8
+    return density < SPARSE_DENSITY_THRESHOLD and dense_bytes > SPARSE_MIN_DENSE_BYTES
+
+def load_dataset(filename: str, columns=None) -> pd.DataFrame:
+    # Prefer the columnar copy made at upload time; fall back to parsing the CSV
+    if dataset_store.exists(filename):
+        if columns is not None:
+            missing = [c for c in columns if c not in dataset_store.read_schema(filename)["columns"]]
+            if missing:
+                raise ValueError(f"Columns not found in dataset: {', '.join(missing)}")
+        return dataset_store.read_dataframe(filename, columns)
+    file_path = os.path.join(UPLOAD_DIR, filename)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Dataset {filename} not found")
+    return pd.read_csv(file_path, usecols=columns)
+
+def iter_dataset(filename: str, chunk_rows: int, columns=None):
+    # Same sources as load_dataset, but yields DataFrames of at most chunk_rows rows
+    if dataset_store.exists(filename):
+        yield from dataset_store.iter_dataframes(filename, chunk_rows, columns)
+        return
     file_path = os.path.join(UPLOAD_DIR, filename)
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Dataset {filename} not found")
-    return pd.read_csv(file_path)
+    yield from pd.read_csv(file_path, usecols=columns, chunksize=chunk_rows)
+
+def training_columns(feature_columns=None, target_column=None):
+    # Columns a training run reads; None reads every column
+    if not feature_columns:
+        return None
+    columns = list(dict.fromkeys(feature_columns))
+    if target_column and target_column not in columns:
+        columns.append(target_column)
+    return columns
+
+def split_columns(X: pd.DataFrame):
+    # Every int/float width and bool is numeric; strings, objects and categories
+    # are encoded. Anything else (e.g. timedeltas) is left out.
+    numeric, categorical = [], []
+    for column, dtype in X.dtypes.items():
+        if pd.api.types.is_numeric_dtype(dtype):
+            numeric.append(column)
+        elif pd.api.types.is_string_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype):
+            categorical.append(column)
+    return numeric, categorical
+
+def optimize_dtypes(df: pd.DataFrame, exclude=()):
+    # Shrinks df in place: integers to the smallest type holding their range,
+    # floats to float32 (about 7 significant digits, plenty for features) and
+    # low-cardinality strings to categories. Columns in exclude (the target) are kept.
+    before = df.memory_usage(deep=True).sum()
+    numeric, categorical = split_columns(df)
+    for column in numeric:
+        if column in exclude or pd.api.types.is_bool_dtype(df[column].dtype):
+            continue
+        kind = "integer" if pd.api.types.is_integer_dtype(df[column].dtype) else "float"
+        df[column] = pd.to_numeric(df[column], downcast=kind)
+    for column in categorical:
+        if column in exclude or isinstance(df[column].dtype, pd.CategoricalDtype):
+            continue
+        if df[column].nunique() <= CATEGORY_MAX_FRACTION * len(df):
+            df[column] = df[column].astype("category")
+    after = df.memory_usage(deep=True).sum()
+    return {
+        "memory_mb_before": before / 1024 ** 2,
+        "memory_mb": after / 1024 ** 2,
+        "memory_saved_mb": (before - after) / 1024 ** 2,
+    }
 
 def get_columns(filename: str):
+    if dataset_store.exists(filename):
+        schema = dataset_store.read_schema(filename)
+        return {"columns": schema["columns"], "dtypes": schema["dtypes"]}
     df = load_dataset(filename)
     return {"columns": df.columns.tolist(), "dtypes": df.dtypes.astype(str).to_dict()}
 
-def preprocess_data(df: pd.DataFrame, target_column: str = None, task_type: str = "Classification", use_scaling: bool = True):
-    # Separate features and target
-    X = df.copy()
+def preprocess_data(df: pd.DataFrame, target_column: str = None, task_type: str = "Classification", use_scaling: bool = True,
+                    sparse_mode: str = "auto", max_categories: int = None, hash_buckets: int = None):
+    # Separate features and target. The ColumnTransformer never modifies its
+    # input, so the features are used without copying the frame.
+    X = df
     y = None
     
     if target_column:
@@ -32,8 +137,7 @@ def preprocess_data(df: pd.DataFrame, target_column: str = None, task_type: str
         X = df.drop(columns=[target_column])
         y = df[target_column]
 
-    numeric_features = X.select_dtypes(include=['int64', 'float64']).columns.tolist()
-    categorical_features = X.select_dtypes(include=['object', 'category']).columns.tolist()
+    numeric_features, categorical_features = split_columns(X)
 
     # Define transformers
     numeric_steps = [('imputer', SimpleImputer(strategy='mean'))]
@@ -42,17 +146,36 @@ def preprocess_data(df: pd.DataFrame, target_column: str = None, task_type: str
     
     numeric_transformer = Pipeline(steps=numeric_steps)
 
+    # Split categoricals into one-hot and hashed columns based on their cardinality
+    cardinality = {c: X[c].nunique() for c in categorical_features}
+    hashed_features = []
+    if hash_buckets:
+        hashed_features = [c for c in categorical_features if cardinality[c] > HIGH_CARDINALITY_THRESHOLD]
+    onehot_features = [c for c in categorical_features if c not in hashed_features]
+
+    encoded_widths = [min(cardinality[c], max_categories or cardinality[c]) for c in onehot_features]
+    if hashed_features:
+        encoded_widths.append(hash_buckets)
+    sparse = choose_sparse(len(X), len(numeric_features), encoded_widths, sparse_mode)
+
     categorical_transformer = Pipeline(steps=[
         ('imputer', SimpleImputer(strategy='most_frequent')),
-        ('encoder', OneHotEncoder(handle_unknown='ignore', sparse_output=False))
+        # With max_categories the rarest values, and values unseen in training, share one infrequent column
+        ('encoder', OneHotEncoder(handle_unknown='infrequent_if_exist' if max_categories else 'ignore',
+                                  sparse_output=sparse, max_categories=max_categories))
     ])
 
+    transformers = [
+        ('num', numeric_transformer, numeric_features),
+        ('cat', categorical_transformer, onehot_features)
+    ]
+    if hashed_features:
+        transformers.append(('hash', HashingEncoder(n_features=hash_buckets), hashed_features))
+
     preprocessor = ColumnTransformer(
-        transformers=[
-            ('num', numeric_transformer, numeric_features),
-            ('cat', categorical_transformer, categorical_features)
-        ],
-        remainder='drop' # Drop columns not specified (e.g. datetime if not handled) - simplest for now
+        transformers=transformers,
+        remainder='drop', # Drop columns not specified (e.g. datetime if not handled) - simplest for now
+        sparse_threshold=1.0 if sparse else 0.0 # sparse mode keeps CSR output end to end
     )
     
     # For now, just fit_transform X
@@ -60,23 +183,26 @@ def preprocess_data(df: pd.DataFrame, target_column: str = None, task_type: str
     X_processed = preprocessor.fit_transform(X)
     
     # Get feature names after transformation
-    feature_names = numeric_features
-    if categorical_features:
+    feature_names = list(numeric_features)
+    if onehot_features:
         cat_encoder = preprocessor.named_transformers_['cat'].named_steps['encoder']
         # If the encoder was fitted, we can get feature names
         # Check if it supports get_feature_names_out (sklearn > 1.0)
         try:
              # This works if the transformer has been fitted, which it has in fit_transform
-             cat_feature_names = cat_encoder.get_feature_names_out(categorical_features)
+             cat_feature_names = cat_encoder.get_feature_names_out(onehot_features)
              feature_names.extend(cat_feature_names)
         except Exception:
              # Fallback or older sklearn versions
-             feature_names.extend([f"{c}_encoded" for c in categorical_features])
+             feature_names.extend([f"{c}_encoded" for c in onehot_features])
+    if hashed_features:
+        feature_names.extend(preprocessor.named_transformers_['hash'].get_feature_names_out())
 
     # Handle Target
+    label_encoder = None
     if task_type == "Classification" and y is not None:
-        le = LabelEncoder()
-        y = le.fit_transform(y)
+        label_encoder = LabelEncoder()
+        y = label_encoder.fit_transform(y)
     elif task_type == "Regression" and y is not None:
         y = y.values # Keep as is, maybe reshape if needed
         # Impute missing values in target if any? usually we drop rows with missing target
@@ -84,4 +210,39 @@ def preprocess_data(df: pd.DataFrame, target_column: str = None, task_type: str
         # Actually dropping rows with missing target is better.
         pass
 
-    return X_processed, y, feature_names
+    return X_processed, y, feature_names, preprocessor, label_encoder
+
+def load_features(filename: str, target_column: str = None, task_type: str = "Classification", use_scaling: bool = True,
+                  sparse_mode: str = "auto", max_categories: int = None, hash_buckets: int = None,
+                  feature_columns=None, optimize_memory: bool = False, timings=None):
+    # Repeat trainings on the same dataset/options reuse the transformed matrices.
+    # Only datasets with a content hash (i.e. ingested into the store) are cached,
+    # so a re-uploaded file with the same name never hits a stale entry.
+    options = dict(target_column=target_column, task_type=task_type, use_scaling=use_scaling,
+                   sparse_mode=sparse_mode, max_categories=max_categories, hash_buckets=hash_buckets)
+    columns = training_columns(feature_columns, target_column)
+    dataset_hash = None
+    if dataset_store.exists(filename):
+        dataset_hash = dataset_store.read_schema(filename).get("content_hash")
+
+    key = None
+    if dataset_hash:
+        key = feature_cache.cache_key(dataset_hash, columns=columns, optimize_memory=optimize_memory, **options)
+        with span(timings, "feature_cache"):
+            cached = feature_cache.get(key)
+        if cached is not None:
+            note(timings, "feature_cache", "hit")
+            return cached
+    note(timings, "feature_cache", "miss" if key is not None else "uncached")
+
+    with span(timings, "load"):
+        df = load_dataset(filename, columns)
+    if optimize_memory:
+        with span(timings, "optimize_dtypes"):
+            note(timings, "memory", optimize_dtypes(df, exclude=[target_column]))
+    with span(timings, "preprocess"):
+        X, y, feature_names, preprocessor, label_encoder = preprocess_data(df, **options)
+    if key is not None:
+        with span(timings, "feature_cache_store"):
+            feature_cache.put(key, X, y, feature_names, preprocessor, label_encoder)
+    return X, y, feature_names, preprocessor, label_encoder
@@ -0,0 +1,165 @@
+from services import dataset_store, sketches
+import pandas as pd
+import numpy as np
+import json
+import math
+import os
+
+# Dataset profiles are assembled from the summaries the store keeps up to date
+# during its single ingest/append pass: exact counts, moments, min/max and value
+# counts, HyperLogLog distinct counts and a uniform row sample for quantiles,
+# histograms and target correlation. Nothing here rereads the dataset, and the
+# result is cached next to the dataset until its contents change.
+PROFILE_FILE = "profile.json"
+HISTOGRAM_BINS = int(os.getenv("PROFILE_HISTOGRAM_BINS", 20))
+TOP_VALUES = int(os.getenv("PROFILE_TOP_VALUES", 10))
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+# Categorical columns with more distinct sampled values than this get no correlation
+CORRELATION_MAX_CATEGORIES = int(os.getenv("PROFILE_CORRELATION_MAX_CATEGORIES", 100))
+
+
+def _number(value):
+    # JSON has no NaN/inf
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _sample_frame(name):
+    sample = dataset_store.read_sample(name)
+    return sample.drop_columns([sketches.PRIORITY_COLUMN]).to_pandas()
+
+
+def _numeric_profile(entry, values, scale):
+    count = entry["count"]
+    profile = {
+        "mean": _number(entry["mean"]) if count else None,
+        "std": _number(math.sqrt(entry["m2"] / count)) if count else None,
+        "min": _number(entry["min"]),
+        "max": _number(entry["max"]),
+        "quantiles": None,
+        "histogram": None,
+    }
+    if len(values):
+        profile["quantiles"] = {f"p{round(q * 100)}": _number(v) for q, v in zip(QUANTILES, np.quantile(values, QUANTILES))}
+        # Bins span the exact range; sampled counts are scaled up to the full column
+        low, high = entry["min"], entry["max"]
+        counts, edges = np.histogram(values, bins=HISTOGRAM_BINS if high > low else 1, range=(low, high if high > low else low + 1))
+        profile["histogram"] = {"edges": [_number(e) for e in edges], "counts": np.rint(counts * scale).astype(int).tolist()}
+    return profile
+
+
+def _top_values(entry, values, scale):
+    if entry.get("values") is not None:
+        counts = pd.Series(entry["values"], dtype="int64")
+    else:
+        counts = (values.value_counts() * scale).round().astype("int64")
+    counts = counts.sort_values(ascending=False, kind="stable").head(TOP_VALUES)
+    return [{"value": value.item() if hasattr(value, "item") else value, "count": int(count)} for value, count in counts.items()]
+
+
+def build_profile(name):
+    schema = dataset_store.read_schema(name)
+    stats = dataset_store.read_stats(name)
+    if stats is None or dataset_store.read_sample(name) is None:
+        dataset_store.rebuild_summaries(name)
+        stats = dataset_store.read_stats(name)
+    sample = _sample_frame(name)
+    num_rows = schema["num_rows"]
+    # With every row in the sample the "approximate" figures are exact
+    exact = len(sample) == num_rows
+
+    columns = {}
+    for column in schema["columns"]:
+        entry = stats[column]
+        missing = schema["null_counts"].get(column, 0)
+        values = sample[column].dropna()
+        # Sampled non-null values stand for this many of the column's values
+        scale = (num_rows - missing) / len(values) if len(values) else 0.0
+        if exact:
+            distinct, distinct_exact = int(values.nunique()), True
+        elif entry.get("values") is not None:
+            distinct, distinct_exact = len(entry["values"]), True
+        else:
+            distinct, distinct_exact = sketches.hll_count(entry["hll"]), False
+
+        profile = {
+            "dtype": schema["dtypes"][column],
+            "kind": "numeric" if "mean" in entry else "categorical",
+            "missing": missing,
+            "missing_rate": missing / num_rows if num_rows else 0.0,
+            "distinct": min(distinct, num_rows - missing),
+            "distinct_exact": distinct_exact,
+        }
+        if "mean" in entry:
+            profile.update(_numeric_profile(entry, values.to_numpy(dtype="float64"), scale))
+        if entry.get("values") is not None or "mean" not in entry:
+            profile["top_values"] = _top_values(entry, values, scale)
+            profile["top_values_exact"] = exact or entry.get("values") is not None
+        columns[column] = profile
+
+    profile = {
+        "dataset_name": name,
+        "num_rows": num_rows,
+        "num_columns": len(schema["columns"]),
+        "content_hash": schema.get("content_hash"),
+        "sample_rows": len(sample),
+        "exact": exact,
+        "columns": columns,
+    }
+    dataset_store.save_json(name, PROFILE_FILE, profile)
+    return profile
+
+
+def _association(x, y, x_numeric, y_numeric):
+    # Pearson r for two numeric columns, the correlation ratio (eta) for numeric
+    # vs categorical and Cramer's V for two categorical columns
+    pair = pd.DataFrame({"x": x, "y": y}).dropna()
+    if len(pair) < 2:
+        return None, None
+    if x_numeric and y_numeric:
+        return "pearson", _number(pair["x"].astype("float64").corr(pair["y"].astype("float64")))
+    if x_numeric or y_numeric:
+        values, groups = (pair["x"], pair["y"]) if x_numeric else (pair["y"], pair["x"])
+        if groups.nunique() > CORRELATION_MAX_CATEGORIES:
+            return "correlation_ratio", None
+        values = values.astype("float64")
+        total = ((values - values.mean()) ** 2).sum()
+        grouped = values.groupby(groups.astype(str))
+        between = (grouped.count() * (grouped.mean() - values.mean()) ** 2).sum()
+        return "correlation_ratio", _number(math.sqrt(between / total)) if total > 0 else None
+    if max(pair["x"].nunique(), pair["y"].nunique()) > CORRELATION_MAX_CATEGORIES:
+        return "cramers_v", None
+    table = pd.crosstab(pair["x"].astype(str), pair["y"].astype(str)).to_numpy(dtype="float64")
+    expected = table.sum(axis=1, keepdims=True) * table.sum(axis=0, keepdims=True) / table.sum()
+    chi2 = ((table - expected) ** 2 / expected).sum()
+    k = min(table.shape) - 1
+    return "cramers_v", _number(math.sqrt(chi2 / table.sum() / k)) if k > 0 else None
+
+
+def target_correlations(name, profile, target):
+    if target not in profile["columns"]:
+        raise ValueError(f"Target column {target} not found in dataset")
+    sample = _sample_frame(name)
+    sample = sample[sample[target].notna()]
+    target_numeric = profile["columns"][target]["kind"] == "numeric"
+    correlations = {}
+    for column, column_profile in profile["columns"].items():
+        if column == target:
+            continue
+        method, value = _association(sample[column], sample[target], column_profile["kind"] == "numeric", target_numeric)
+        correlations[column] = {"method": method, "value": value}
+    return correlations
+
+
+def get_profile(name, target=None):
+    if not dataset_store.exists(name):
+        raise FileNotFoundError(f"Dataset {name} not found")
+    profile = dataset_store.load_json(name, PROFILE_FILE)
+    version = dataset_store.version(name)
+    if profile is None or (profile["num_rows"], profile["content_hash"]) != (version["num_rows"], version["content_hash"]):
+        profile = build_profile(name)
+    if target:
+        profile["target"] = {"column": target, "correlations": target_correlations(name, profile, target)}
+    return profile
@@ -0,0 +1,273 @@
+from services.model_factory import supports_sparse
+import math
+import os
+
+# Training jobs are sized and admitted against memory and time budgets instead
+# of fixed row caps. A job's peak memory and fit time are estimated from the
+# dataset's stored metadata (row count, column types, distinct counts) and a
+# cost profile of the model, and its sample is the largest number of rows whose
+# estimates stay within the per-job budgets. The job pool only starts a job once
+# its estimate fits in what the running jobs leave of the global memory budget;
+# requests that could never fit are rejected up front.
+
+
+# Memory limit files of cgroup v2 and v1; containers see host RAM in SC_PHYS_PAGES
+CGROUP_MEMORY_LIMIT_FILES = ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes")
+
+
+def _available_memory_mb():
+    # Physical memory, or the container's cgroup limit if that is lower
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        memory = 4096 * 1024 ** 2
+    for path in CGROUP_MEMORY_LIMIT_FILES:
+        try:
+            with open(path) as f:
+                limit = f.read().strip()
+        except OSError:
+            continue
+        # "max" (v2) or a huge page-aligned number (v1) mean no limit
+        if limit.isdigit():
+            memory = min(memory, int(limit))
+        break
+    return memory / 1024 ** 2
+
+
+# Memory all running training jobs together may use (default: half of the
+# physical memory or container limit)
+MEMORY_BUDGET_MB = float(os.getenv("TRAINING_MEMORY_BUDGET_MB", _available_memory_mb() / 2))
+# Memory and fit time one job is sized for
+JOB_MEMORY_BUDGET_MB = float(os.getenv("TRAINING_JOB_MEMORY_MB", MEMORY_BUDGET_MB / 2))
+JOB_TIME_BUDGET = float(os.getenv("TRAINING_TIME_BUDGET", 120))
+# Jobs allowed to wait for memory before further requests are turned away
+QUEUE_LIMIT = int(os.getenv("TRAINING_QUEUE_LIMIT", 50))
+# Samples never shrink below this many rows (or the whole dataset, if smaller)
+MIN_SAMPLE_ROWS = int(os.getenv("TRAINING_MIN_SAMPLE_ROWS", 1000))
+
+# Per model: fit time ~ seconds * features per row * training rows ** exponent.
+# Measured on one core with default parameters on dense synthetic data; they
+# only need to be right to within a small factor.
+MODEL_COSTS = {
+    "Logistic Regression": (1.0, 1e-7),
+    "Random Forest": (1.1, 6e-6),
+    "SVM": (2.0, 4e-9),
+    "KNN": (2.0, 3e-10),  # predicting on the train and test splits dominates
+    "SGD Classifier": (1.0, 3e-7),
+    "Linear Regression": (1.0, 1e-7),
+    "Random Forest Regressor": (1.1, 2.5e-5),
+    "Gradient Boosting": (1.1, 1.5e-5),
+    "SGD Regressor": (1.0, 3e-7),
+    "KMeans": (1.0, 5e-7),
+    "DBSCAN": (2.0, 2e-10),
+    "Agglomerative Clustering": (2.0, 3e-9),
+    "MiniBatch KMeans": (1.0, 1e-7),
+}
+ENSEMBLE_MODELS = {"Random Forest", "Random Forest Regressor", "Gradient Boosting"}
+# In-memory size of one raw value after loading: numbers, and strings as Python objects
+NUMERIC_VALUE_BYTES = 8
+STRING_VALUE_BYTES = 64
+
+
+class InsufficientMemory(Exception):
+    pass
+
+
+def matrix_shape(X):
+    # Shape of an already built feature matrix, as used by the estimates
+    rows, width = X.shape
+    if getattr(X, "nnz", None) is not None:
+        row_bytes = (X.data.nbytes + X.indices.nbytes + X.indptr.nbytes) / max(rows, 1)
+        features = X.nnz / max(rows, 1)
+    else:
+        row_bytes = X.dtype.itemsize * width
+        features = width
+    return {"rows": rows, "width": width, "features": features, "row_bytes": row_bytes, "load_bytes": rows * row_bytes}
+
+
+def _metadata_shape(request):
+    # Predicts matrix_shape of the preprocessed dataset from its stored schema
+    # and statistics, following the layout rules of preprocess_data
+    from services import dataset_store, sketches
+    if not dataset_store.exists(request.dataset_name):
+        return None
+    schema = dataset_store.read_schema(request.dataset_name)
+    stats = dataset_store.read_stats(request.dataset_name)
+    if stats is None:
+        return None
+    # preprocessing loads scikit-learn, so it is only imported once a request is sized
+    from services.preprocessing import choose_sparse, HIGH_CARDINALITY_THRESHOLD
+
+    columns = request.feature_columns or schema["columns"]
+    numeric, onehot_widths, hashed = 0, [], 0
+    raw_bytes = NUMERIC_VALUE_BYTES  # the target
+    for column in columns:
+        entry = stats.get(column)
+        if entry is None or column == request.target_column:
+            continue
+        if "mean" in entry:
+            numeric += 1
+            raw_bytes += NUMERIC_VALUE_BYTES
+            continue
+        raw_bytes += STRING_VALUE_BYTES
+        distinct = len(entry["values"]) if entry.get("values") is not None else sketches.hll_count(entry["hll"])
+        if request.hash_buckets and distinct > HIGH_CARDINALITY_THRESHOLD:
+            hashed += 1
+        else:
+            onehot_widths.append(min(distinct, request.max_categories or distinct))
+    encoded_widths = onehot_widths + ([request.hash_buckets] if hashed else [])
+
+    rows = schema["num_rows"]
+    width = numeric + sum(encoded_widths)
+    if choose_sparse(rows, numeric, encoded_widths, request.sparse_mode):
+        # One value per numeric column and per encoded categorical, as CSR data + indices
+        features = numeric + len(onehot_widths) + hashed
+        row_bytes = features * 12 + 8
+    else:
+        features = width
+        row_bytes = width * 8
+    # The loaded frame and the full matrix both exist before sampling
+    return {"rows": rows, "width": width, "features": features, "row_bytes": row_bytes,
+            "load_bytes": rows * (raw_bytes + row_bytes)}
+
+
+def _workload(request):
+    # (fits running side by side, fit time as a multiple of one fit on the sample)
+    from services.job_manager import CORES_PER_WORKER
+    cpus = CORES_PER_WORKER
+    if getattr(request, "model_names", None):
+        # Sweep candidates are fitted concurrently on the same matrix
+        return min(len(request.model_names), cpus), 1
+    if getattr(request, "param_space", None) is not None:
+        # Successive halving spends about one full-size cross-validation per rung
+        parallel = min(request.cv_folds, cpus)
+        rungs = int(math.log(max(request.n_candidates, 1), max(request.factor, 2))) + 1
+        return parallel, request.cv_folds * rungs / parallel + 1
+    if getattr(request, "use_cross_validation", False) and request.task_type != "Clustering":
+        parallel = min(request.cv_folds, cpus)
+        return parallel, request.cv_folds / parallel + 1
+    return 1, 1
+
+
+def _model_bytes(model_name, params, rows, row_bytes, width):
+    # Working memory of the estimator on top of its training matrix
+    if model_name in ("Random Forest", "Random Forest Regressor"):
+        # Fully grown trees have up to two ~100 byte nodes per distinct
+        # bootstrapped row (~64%), and the trees fit on a float32 copy of X
+        nodes = 2 * 0.64 * rows
+        if params.get("max_depth"):
+            nodes = min(nodes, 2 ** (params["max_depth"] + 1))
+        return params.get("n_estimators", 100) * nodes * 100 + rows * width * 4
+    if model_name == "Gradient Boosting":
+        return rows * (width * 4 + 64)
+    if model_name == "SVM":
+        # libsvm's kernel cache (at most the whole float32 kernel matrix) plus
+        # the support vectors (at most every row)
+        return min(params.get("cache_size", 200) * 1024 ** 2, rows * rows * 4) + rows * row_bytes
+    if model_name == "KNN":
+        # Prediction computes test x train distances in chunks of at most 1 GiB
+        return rows * row_bytes + min(rows * rows / 4 * 8, 1024 ** 3)
+    if model_name == "DBSCAN":
+        # Neighbourhood lists hold up to every pair of rows
+        return rows * rows * 8
+    if model_name == "Agglomerative Clustering":
+        # Ward linkage works on the condensed pairwise distance matrix
+        return rows * rows / 2 * 8
+    return rows * row_bytes
+
+
+def _estimate(model_name, task_type, shape, params, test_size, parallel, repeats, rows):
+    # (peak MB, fit seconds) of a job training on `rows` sampled rows
+    train_rows = rows if task_type == "Clustering" else rows * (1 - test_size)
+    dense = not supports_sparse(model_name)
+    row_bytes = shape["width"] * 8 if dense else shape["row_bytes"]
+    fit_bytes = train_rows * row_bytes + _model_bytes(model_name, params, train_rows, row_bytes, shape["width"])
+    # The sample and its train/test split are copies of the loaded matrix
+    memory = shape["load_bytes"] + 2 * rows * shape["row_bytes"] + parallel * fit_bytes
+
+    exponent, cost = MODEL_COSTS.get(model_name, (1.0, 1e-6))
+    seconds = cost * (shape["width"] if dense else shape["features"]) * train_rows ** exponent * repeats
+    if model_name in ENSEMBLE_MODELS:
+        seconds *= params.get("n_estimators", 100) / 100
+    return memory / 1024 ** 2, seconds
+
+
+def _largest(fits, low, high):
+    # Largest n in [low, high] with fits(n), or low if there is none
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def choose_sample(model_name, task_type, shape, params=None, test_size=0.2, parallel=1, repeats=1, limit=None,
+                  memory_budget_mb=None, time_budget=None):
+    # The sampling decision: the most rows (up to `limit`) whose estimates fit the budgets
+    params = params or {}
+    memory_budget_mb = memory_budget_mb or JOB_MEMORY_BUDGET_MB
+    time_budget = time_budget or JOB_TIME_BUDGET
+    rows = shape["rows"] if limit is None else min(shape["rows"], limit)
+    floor = min(MIN_SAMPLE_ROWS, rows)
+
+    def estimate(n):
+        return _estimate(model_name, task_type, shape, params, test_size, parallel, repeats, n)
+
+    by_memory = _largest(lambda n: estimate(n)[0] <= memory_budget_mb, floor, rows)
+    by_time = _largest(lambda n: estimate(n)[1] <= time_budget, floor, rows)
+    sample_rows = min(by_memory, by_time)
+    memory_mb, seconds = estimate(sample_rows)
+    limited_by = None
+    if sample_rows < rows:
+        limited_by = "memory" if by_memory <= by_time else "time"
+    return {
+        "rows_available": int(shape["rows"]),
+        "sample_rows": int(sample_rows),
+        "limited_by": limited_by,
+        "estimated_memory_mb": round(memory_mb, 1),
+        "estimated_seconds": round(seconds, 1),
+        "memory_budget_mb": memory_budget_mb,
+        "time_budget_seconds": time_budget,
+    }
+
+
+def plan(request, model_name):
+    # Sampling decision made at admission time from the dataset's metadata, or
+    # None for datasets without stored statistics
+    shape = _metadata_shape(request)
+    if shape is None:
+        return None
+    parallel, repeats = _workload(request)
+    return choose_sample(model_name, request.task_type, shape, getattr(request, "params", None), request.test_size,
+                         parallel, repeats)
+
+
+def admit(request, model_names):
+    # ({model: plan}, MB to reserve for the job). Raises InsufficientMemory when
+    # even the smallest sample would exceed the whole training memory budget.
+    plans = {model_name: plan(request, model_name) for model_name in model_names}
+    known = [p for p in plans.values() if p is not None]
+    if not known:
+        return plans, None
+    largest = max(known, key=lambda p: p["estimated_memory_mb"])
+    if largest["estimated_memory_mb"] > MEMORY_BUDGET_MB:
+        raise InsufficientMemory(
+            f"Training on {request.dataset_name} needs about {largest['estimated_memory_mb']:.0f} MB even on "
+            f"{largest['sample_rows']} rows, more than the training memory budget of {MEMORY_BUDGET_MB:.0f} MB"
+        )
+    return plans, largest["estimated_memory_mb"]
+
+
+def size_sample(request, model_name, X, planned=None):
+    # Final decision in the worker, from the actual feature matrix. It never
+    # exceeds the admitted plan, so the job stays within its reservation.
+    parallel, repeats = _workload(request)
+    decision = choose_sample(model_name, request.task_type, matrix_shape(X), getattr(request, "params", None),
+                             request.test_size, parallel, repeats, limit=planned and planned["sample_rows"])
+    if planned is not None:
+        decision["reserved_mb"] = planned["estimated_memory_mb"]
+        if decision["limited_by"] is None and decision["sample_rows"] < decision["rows_available"]:
+            decision["limited_by"] = planned["limited_by"]
+    return decision
@@ -0,0 +1,40 @@
+import hashlib
+import json
+import os
+from models.db_models import Experiment
+from services.paths import MODEL_DIR
+
+# Training is deterministic for a given dataset and request, so a request that
+# matches an earlier run is answered with that run's Experiment. The key covers
+# the dataset content hash and every training option; datasets that were never
+# ingested into the store have no content hash and are never cached.
+
+
+def request_key(request):
+    from services import dataset_store
+    if not dataset_store.exists(request.dataset_name):
+        return None
+    dataset_hash = dataset_store.read_schema(request.dataset_name).get("content_hash")
+    if not dataset_hash:
+        return None
+    options = request.model_dump(exclude={"dataset_name", "force"})
+    # Omitted and empty hyperparameters train the same model
+    options["params"] = options.get("params") or {}
+    payload = json.dumps({"dataset": dataset_hash, **options}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def find_experiment(db, key):
+    # Latest experiment stored for key whose model file still exists
+    experiment = (
+        db.query(Experiment)
+        .filter(Experiment.request_key == key)
+        .order_by(Experiment.created_at.desc(), Experiment.id.desc())
+        .first()
+    )
+    if experiment is None:
+        return None
+    model_id = (experiment.metrics or {}).get("model_id")
+    if model_id and not os.path.exists(os.path.join(MODEL_DIR, f"{model_id}.pkl")):
+        return None
+    return experiment
@@ -0,0 +1,91 @@
+from concurrent.futures import Future
+from database import SessionLocal
+import os
+import queue
+import threading
+import traceback
+
+# Results of finished jobs are written to the database by one background thread,
+# so neither request handlers nor the job pool's callback thread wait on it.
+# Writes queued together share a transaction: a burst of finished jobs costs one
+# commit instead of one each.
+WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", 32))
+
+_queue = queue.Queue()
+_lock = threading.Lock()
+_thread = None
+_STOP = object()
+
+
+def submit(write):
+    # write(db) adds rows to the session and returns a value (e.g. the new id);
+    # the returned Future resolves to that value once it is committed
+    global _thread
+    future = Future()
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="result-writer", daemon=True)
+            _thread.start()
+        _queue.put((write, future))
+    return future
+
+
+def _commit(batch):
+    db = SessionLocal()
+    try:
+        values = [write(db) for write, _ in batch]
+        db.commit()
+        return values
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _write(batch):
+    try:
+        values = _commit(batch)
+    except Exception as e:
+        if len(batch) == 1:
+            traceback.print_exc()
+            batch[0][1].set_exception(e)
+            return
+        # Retry one by one so a bad write only fails its own job
+        for item in batch:
+            _write([item])
+        return
+    for (_, future), value in zip(batch, values):
+        future.set_result(value)
+
+
+def _run():
+    while True:
+        item = _queue.get()
+        if item is _STOP:
+            return
+        batch = [item]
+        stop = False
+        while len(batch) < WRITE_BATCH_SIZE:
+            try:
+                item = _queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+        _write(batch)
+        if stop:
+            return
+
+
+def shutdown(timeout=10):
+    # Writes everything queued so far, then stops the thread
+    global _thread
+    with _lock:
+        thread, _thread = _thread, None
+        if thread is None:
+            return
+        _queue.put(_STOP)
+    thread.join(timeout)
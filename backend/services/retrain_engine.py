@@ -0,0 +1,128 @@
+from services import dataset_store
+from services.prediction_service import load_model, prepare_frame
+from services.model_factory import supports_partial_fit, supports_warm_start
+from services.training_engine import fit_and_evaluate
+from services.job_manager import report
+from services.telemetry import StageTimings, span
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+import numpy as np
+import copy
+import math
+import os
+
+# A warm-start retrain continues a saved model on the rows appended to its
+# dataset since it was trained. The model's fitted preprocessing is reused
+# unchanged so the feature layout (and everything the model learned on it)
+# stays valid. Ensembles grow in proportion to the new rows; partial_fit
+# models take them as one more batch.
+
+# Upper bound on the estimators a single retrain adds to an ensemble, so a large
+# append relative to the original data doesn't grow the model without limit
+RETRAIN_MAX_ESTIMATORS_ADDED = int(os.getenv("RETRAIN_MAX_ESTIMATORS_ADDED", 100))
+
+
+def _base_model(request):
+    model_id = request.warm_start_model_id
+    pipeline, metadata = load_model(model_id)
+    if metadata["task_type"] != request.task_type or metadata["model_name"] != request.model_name:
+        raise ValueError(f"Model {model_id} is a {metadata['task_type']} {metadata['model_name']} model")
+    if not supports_warm_start(request.model_name):
+        raise ValueError(f"{request.model_name} does not support warm-start retraining")
+    base = metadata.get("dataset")
+    if not base or base["name"] != request.dataset_name:
+        raise ValueError(f"Model {model_id} was not trained on {request.dataset_name}")
+    return pipeline, metadata, base
+
+
+def _feature_names(preprocessor):
+    # Same names preprocess_data reports, without the ColumnTransformer's "num__" prefixes
+    return [name.split("__", 1)[1] for name in preprocessor.get_feature_names_out()]
+
+
+def _split(X, y, request, stratify=False):
+    # New trees are fitted on the training part only, so keep every class in it when possible
+    if stratify:
+        try:
+            return train_test_split(X, y, test_size=request.test_size, random_state=request.random_state, stratify=y)
+        except ValueError:
+            pass  # a class with a single row can't be split both ways
+    return train_test_split(X, y, test_size=request.test_size, random_state=request.random_state)
+
+
+def retrain_model(request, progress=None):
+    # request is TrainRequest object with warm_start_model_id set
+    task_type = request.task_type
+    target_column = request.target_column
+    timings = StageTimings()
+    pipeline, metadata, base = _base_model(request)
+
+    base_rows = dataset_store.rows_at_version(request.dataset_name, base["content_hash"])
+    if base_rows is None:
+        raise ValueError("The dataset was replaced since this model was trained; train a new model instead")
+    dataset_version = dataset_store.version(request.dataset_name)
+    new_rows = dataset_version["num_rows"] - base_rows
+    if new_rows <= 0:
+        raise ValueError("No rows were appended since this model was trained")
+
+    report(progress, "preprocessing", 0.05)
+    columns = metadata["input_columns"] + ([target_column] if target_column else [])
+    with span(timings, "load"):
+        # Part files are append-only, so the new rows are exactly the tail of the table
+        df = dataset_store.read_table(request.dataset_name, columns).slice(base_rows).to_pandas()
+    with span(timings, "preprocess"):
+        y = None
+        label_encoder = None
+        if target_column:
+            df = df[df[target_column].notna()]
+            y = df.pop(target_column)
+        preprocessor = pipeline.named_steps["preprocessor"]
+        X = preprocessor.transform(prepare_frame(df, metadata))
+        if task_type == "Classification":
+            label_encoder = LabelEncoder()
+            label_encoder.classes_ = np.array(metadata["classes"])
+            unseen = set(y.unique()) - set(label_encoder.classes_.tolist())
+            if unseen:
+                raise ValueError(f"The appended rows contain classes the model was not trained on "
+                                 f"({', '.join(map(str, sorted(unseen, key=str)[:5]))}); train a new model instead")
+            y = label_encoder.transform(y)
+        elif task_type == "Regression":
+            y = y.to_numpy(dtype="float64")
+
+    # The loaded pipeline is shared through the model cache, so train a copy
+    model = copy.deepcopy(pipeline.named_steps["model"])
+    estimators_added = None
+    estimators_capped = False
+    grows_ensemble = not supports_partial_fit(request.model_name)
+    if grows_ensemble:
+        estimators_added = max(1, math.ceil(model.n_estimators * new_rows / max(base_rows, 1)))
+        estimators_capped = estimators_added > RETRAIN_MAX_ESTIMATORS_ADDED
+        estimators_added = min(estimators_added, RETRAIN_MAX_ESTIMATORS_ADDED)
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + estimators_added)
+
+    feature_names = _feature_names(preprocessor)
+    if task_type != "Clustering":
+        with span(timings, "split"):
+            X_train, X_test, y_train, y_test = _split(X, y, request, stratify=grows_ensemble and task_type == "Classification")
+        if grows_ensemble and task_type == "Classification" and len(np.unique(y_train)) < len(label_encoder.classes_):
+            # Trees fitted on fewer classes can't be combined with the existing ones
+            raise ValueError("The appended rows must contain every class, at least twice, to grow this ensemble")
+        result = fit_and_evaluate(task_type, request.model_name, X_train, y_train, X_test, y_test, feature_names,
+                                  preprocessor=preprocessor, label_encoder=label_encoder, progress=progress, timings=timings,
+                                  model=model, dataset_version=dataset_version)
+    else:
+        result = fit_and_evaluate(task_type, request.model_name, X, None, feature_names=feature_names,
+                                  preprocessor=preprocessor, progress=progress, timings=timings,
+                                  model=model, dataset_version=dataset_version)
+
+    result["warm_start"] = {
+        "base_model_id": request.warm_start_model_id,
+        "base_rows": base_rows,
+        "rows_added": new_rows,
+        "estimators_added": estimators_added,
+        "estimators_capped": estimators_capped,
+        # Hyperparameters and fitted preprocessing are the base model's
+        "params": "kept from base model",
+    }
+    result["timings"] = timings.as_dict()
+    return result
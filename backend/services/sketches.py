@@ -0,0 +1,85 @@
+import numpy as np
+import pyarrow as pa
+
+# Mergeable column summaries that stay small however large the dataset grows:
+#  - a HyperLogLog sketch for approximate distinct counts (~1.6% error at the
+#    default precision), and
+#  - a bottom-k row sample: every row draws a random priority and the k rows
+#    with the smallest priorities are kept. That is a uniform sample which can be
+#    updated block by block and across appends, and it keeps rows intact so
+#    quantiles and pairwise statistics can be read from the same sample.
+
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+PRIORITY_COLUMN = "__priority"
+
+
+def _mix64(x):
+    # splitmix64 finalizer; uint64 arithmetic wraps around as intended
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def hash_values(values):
+    # Numbers hash by value (so 3 and 3.0 agree), strings by their contents
+    values = np.asarray(values)
+    if values.dtype.kind in "biuf":
+        numbers = values.astype("float64") + 0.0  # -0.0 -> 0.0
+        return _mix64(numbers.view("uint64"))
+    import pandas as pd
+    return pd.util.hash_array(values.astype(object), categorize=False)
+
+
+def new_hll():
+    return np.zeros(HLL_REGISTERS, dtype="uint8")
+
+
+def hll_add(registers, values):
+    if len(values) == 0:
+        return registers
+    hashes = hash_values(values)
+    index = (hashes >> np.uint64(64 - HLL_PRECISION)).astype("intp")
+    # Rank = position of the first set bit after the index bits; the guard bit caps it
+    rest = (hashes << np.uint64(HLL_PRECISION)) | np.uint64(1 << (HLL_PRECISION - 1))
+    high = (rest >> np.uint64(32)).astype("float64")
+    low = (rest & np.uint64(0xFFFFFFFF)).astype("float64")
+    bit_length = np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+    rank = (65 - bit_length).astype("uint8")
+    np.maximum.at(registers, index, rank)
+    return registers
+
+
+def hll_count(registers):
+    m = HLL_REGISTERS
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.power(2.0, -registers.astype("float64")))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # Linear counting is more accurate for small cardinalities
+        estimate = m * np.log(m / zeros)
+    return int(round(estimate))
+
+
+def hll_to_hex(registers):
+    return registers.tobytes().hex()
+
+
+def hll_from_hex(value):
+    return np.frombuffer(bytes.fromhex(value), dtype="uint8").copy()
+
+
+def update_sample(sample, table, size, rng=None):
+    # sample is the previous result (or None); returns at most `size` rows of
+    # sample + table, each carrying its priority in PRIORITY_COLUMN
+    rng = rng or np.random.default_rng()
+    table = table.append_column(PRIORITY_COLUMN, pa.array(rng.random(table.num_rows)))
+    if sample is not None:
+        table = pa.concat_tables([sample, table])
+    if table.num_rows > size:
+        priorities = table.column(PRIORITY_COLUMN).to_numpy()
+        keep = np.sort(np.argpartition(priorities, size)[:size])
+        table = table.take(pa.array(keep))
+    return table
@@ -0,0 +1,111 @@
+from services.preprocessing import load_features
+from services import dataset_store
+from services.training_engine import downsample, fit_and_evaluate
+from services.job_manager import CORES_PER_WORKER, report
+from services.resource_governor import size_sample
+from sklearn.model_selection import train_test_split
+from joblib import Parallel, delayed
+import math
+import os
+import time
+
+# Worker processes used to fit sweep candidates side by side (default: the
+# job's share of the cores, -1 = all cores).
+# Arrays above SHARED_ARRAY_MIN_BYTES are handed to them as read-only memmaps
+# instead of being pickled into every worker.
+SWEEP_N_JOBS = int(os.getenv("SWEEP_N_JOBS", CORES_PER_WORKER))
+SHARED_ARRAY_MIN_BYTES = os.getenv("SHARED_ARRAY_MIN_BYTES", "1M")
+
+# Metric used to rank candidates for each task (higher is better)
+RANKING_METRICS = {
+    "Classification": "f1",
+    "Regression": "r2",
+    "Clustering": "silhouette",
+}
+
+
+def _fit_candidate(task_type, model_name, X_train, y_train, X_test, y_test, feature_names, preprocessor, label_encoder,
+                   dataset_version=None, sampling=None, max_train_rows=None):
+    # Costlier models get a smaller share of the common training rows; the test
+    # rows stay identical so every candidate is scored on the same data
+    if max_train_rows is not None:
+        X_train, y_train = downsample(X_train, y_train, task_type, max_train_rows)
+
+    start = time.perf_counter()
+    try:
+        result = fit_and_evaluate(task_type, model_name, X_train, y_train, X_test, y_test, feature_names,
+                                  preprocessor=preprocessor, label_encoder=label_encoder, dataset_version=dataset_version)
+    except Exception as e:
+        return {"model_name": model_name, "error": str(e) or e.__class__.__name__}
+    result["model_name"] = model_name
+    result["fit_seconds"] = time.perf_counter() - start
+    result["sampling"] = sampling
+    return result
+
+
+def build_leaderboard(task_type, candidates):
+    metric = RANKING_METRICS[task_type]
+
+    def sort_key(candidate):
+        score = candidate.get("metrics", {}).get(metric)
+        return (score is None, -(score or 0))
+
+    leaderboard = []
+    for rank, candidate in enumerate(sorted(candidates, key=sort_key), start=1):
+        leaderboard.append({
+            "rank": rank,
+            "model_name": candidate["model_name"],
+            "score": candidate.get("metrics", {}).get(metric),
+            "metric": metric,
+            "fit_seconds": candidate.get("fit_seconds"),
+            "error": candidate.get("error"),
+        })
+    return leaderboard
+
+
+def run_sweep(request, progress=None, sampling=None):
+    # request is SweepRequest object; sampling holds the admitted plan per model
+    task_type = request.task_type
+
+    # 1. Load, preprocess and split once for every candidate
+    report(progress, "preprocessing", 0.05)
+    dataset_version = dataset_store.version(request.dataset_name)
+    X, y, feature_names, preprocessor, label_encoder = load_features(
+        request.dataset_name, request.target_column, task_type, request.use_scaling,
+        sparse_mode=request.sparse_mode, max_categories=request.max_categories, hash_buckets=request.hash_buckets,
+        feature_columns=request.feature_columns, optimize_memory=request.optimize_memory
+    )
+    # Each candidate is sized as if all candidates fit side by side
+    sampling = {m: size_sample(request, m, X, (sampling or {}).get(m)) for m in request.model_names}
+    X, y = downsample(X, y, task_type, max(s["sample_rows"] for s in sampling.values()))
+    train_share = 1 if task_type == "Clustering" else 1 - request.test_size
+
+    if task_type != "Clustering":
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=request.test_size, random_state=request.random_state)
+    else:
+        X_train, X_test, y_train, y_test = X, None, None, None
+
+    # 2. Fit the candidates concurrently; results stream back as they finish
+    report(progress, "training", 0.1)
+    parallel = Parallel(
+        n_jobs=min(len(request.model_names), SWEEP_N_JOBS) if SWEEP_N_JOBS > 0 else SWEEP_N_JOBS,
+        max_nbytes=SHARED_ARRAY_MIN_BYTES,
+        mmap_mode="r",
+        return_as="generator_unordered",
+    )
+    tasks = (
+        delayed(_fit_candidate)(task_type, model_name, X_train, y_train, X_test, y_test, feature_names, preprocessor, label_encoder,
+                                dataset_version, sampling[model_name], math.ceil(sampling[model_name]["sample_rows"] * train_share))
+        for model_name in request.model_names
+    )
+
+    candidates = []
+    for candidate in parallel(tasks):
+        candidates.append(candidate)
+        progress_fraction = 0.1 + 0.85 * len(candidates) / len(request.model_names)
+        report(progress, "training", progress_fraction)
+
+    return {
+        "candidates": candidates,
+        "leaderboard": build_leaderboard(task_type, candidates),
+    }
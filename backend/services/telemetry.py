@@ -0,0 +1,177 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Stage timings travel with each result (training runs in worker processes);
+# the aggregated series below live in the API process and are rendered in the
+# Prometheus text format by GET /metrics.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _rss_mb():
+    # Current resident set size; /proc is Linux-only, elsewhere only the peak is reported
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, AttributeError, ValueError):
+        return None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimings:
+    # Records wall time and memory per named stage of one operation
+    def __init__(self):
+        self.stages = []
+        self.notes = {}  # e.g. {"feature_cache": "hit"}
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        rss_before = _rss_mb()
+        try:
+            yield
+        finally:
+            rss_after = _rss_mb()
+            self.stages.append({
+                "stage": name,
+                "seconds": time.perf_counter() - start,
+                "rss_mb": rss_after,
+                "rss_delta_mb": rss_after - rss_before if rss_after is not None and rss_before is not None else None,
+                "peak_rss_mb": _peak_rss_mb(),
+            })
+
+    def note(self, key, value):
+        self.notes[key] = value
+
+    def as_dict(self):
+        return {"total_seconds": time.perf_counter() - self.start, "stages": self.stages, **self.notes}
+
+    def server_timing(self):
+        # Value for the Server-Timing response header (durations in milliseconds)
+        return ", ".join(f"{s['stage']};dur={s['seconds'] * 1000:.1f}" for s in self.stages)
+
+
+@contextmanager
+def span(timings, name):
+    # No-op when the caller isn't collecting timings
+    if timings is None:
+        yield
+    else:
+        with timings.stage(name):
+            yield
+
+
+def note(timings, key, value):
+    if timings is not None:
+        timings.note(key, value)
+
+
+# --- Aggregated series (API process) ---
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+_help = {}
+_gauge_callbacks = []  # (name, function returning [(labels, value)])
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, help_text, amount=1, **labels):
+    with _lock:
+        _help[name] = ("counter", help_text)
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, help_text, value, **labels):
+    with _lock:
+        _help[name] = ("histogram", help_text)
+        key = _key(name, labels)
+        histogram = _histograms.setdefault(key, [[0] * len(LATENCY_BUCKETS), 0.0, 0])
+        index = bisect.bisect_left(LATENCY_BUCKETS, value)
+        if index < len(LATENCY_BUCKETS):
+            histogram[0][index] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def register_gauge(name, help_text, callback):
+    # callback() returns [(labels dict, value)] and is evaluated on every scrape
+    with _lock:
+        _help[name] = ("gauge", help_text)
+        _gauge_callbacks.append((name, callback))
+
+
+def cache_lookup(cache, hit):
+    inc("ml_cache_requests_total", "Cache lookups by cache and outcome", cache=cache, result="hit" if hit else "miss")
+
+
+def observe_stages(operation, timings):
+    # Feeds a StageTimings.as_dict() breakdown into the latency histograms
+    if not timings:
+        return
+    for stage in timings["stages"]:
+        observe("ml_stage_duration_seconds", "Duration of individual pipeline stages", stage["seconds"],
+                operation=operation, stage=stage["stage"])
+    observe("ml_operation_duration_seconds", "End-to-end duration of pipeline operations", timings["total_seconds"],
+            operation=operation)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + sorted(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render():
+    gauges = []
+    for name, callback in list(_gauge_callbacks):
+        for labels, value in callback():
+            gauges.append((_key(name, labels), value))
+
+    lines = []
+    with _lock:
+        series = {}
+        for (name, labels), value in list(_counters.items()) + gauges:
+            series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), (buckets, total, count) in _histograms.items():
+            rows = series.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                cumulative += bucket_count
+                rows.append(f"{name}_bucket{_format_labels(labels, le=bound)} {cumulative}")
+            rows.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {count}")
+            rows.append(f"{name}_sum{_format_labels(labels)} {total}")
+            rows.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for name in sorted(series):
+            kind, help_text = _help[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(series[name])
+    return "\n".join(lines) + "\n"
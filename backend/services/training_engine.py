@@ -1,78 +1,216 @@
-from services.preprocessing import load_dataset, preprocess_data
-from services.model_factory import get_model
+from services.preprocessing import load_features
+from services import dataset_store
+from services.model_factory import get_model, supports_sparse
 from services.metrics_engine import calculate_metrics
 from services.explanation_engine import generate_explanation
-from services.visualization_engine import generate_confusion_matrix, generate_feature_importance, generate_residual_plot, generate_cluster_plot
-from sklearn.model_selection import train_test_split
+from services.job_manager import CORES_PER_WORKER, report
+from services.telemetry import StageTimings, span
+from services.paths import MODEL_DIR
+from services.visualization_engine import confusion_matrix_data, feature_importance_data, residual_data, cluster_data
+from services.importance_engine import feature_groups, permutation_importance_data
+from services.resource_governor import size_sample
+from sklearn.model_selection import train_test_split, StratifiedShuffleSplit, KFold, StratifiedKFold
+from sklearn.pipeline import Pipeline
+from joblib import Parallel, delayed
+import numpy as np
+import scipy.sparse as sp
 import joblib
+import json
 import os
+import time
 import uuid
 
-MODEL_DIR = "models_saved"
-if not os.path.exists(MODEL_DIR):
-    os.makedirs(MODEL_DIR)
+# Worker processes used to evaluate cross-validation folds in parallel (default:
+# the job's share of the cores, -1 = all cores)
+CV_N_JOBS = int(os.getenv("CV_N_JOBS", CORES_PER_WORKER))
 
-def train_model(request):
-    # request is TrainRequest object
+def downsample(X, y, task_type, max_samples):
+    # Downsample if dataset is too large to prevent extremely long training times
+    if X.shape[0] <= max_samples:
+        return X, y
+
+    if y is not None and task_type == "Classification":
+        # Try stratified sampling first if we have enough samples of each class
+        try:
+            sss = StratifiedShuffleSplit(n_splits=1, train_size=max_samples, random_state=42)
+            for train_index, _ in sss.split(X, y):
+                return X[train_index], y[train_index]
+        except ValueError:
+            # Fallback to random sampling if stratified fails (e.g., small classes)
+            pass
+
+    indices = np.random.choice(X.shape[0], max_samples, replace=False)
+    X = X[indices]
+    if y is not None:
+        y = y[indices]
+    return X, y
+
+def train_model(request, progress=None, sampling=None):
+    # request is TrainRequest object; sampling is the plan it was admitted with
     dataset_name = request.dataset_name
     task_type = request.task_type
     model_name = request.model_name
     target_column = request.target_column
+    timings = StageTimings()
+    # Taken before loading so rows appended meanwhile count as new for a warm start
+    dataset_version = dataset_store.version(dataset_name)
     
-    # 1. Load Data
-    df = load_dataset(dataset_name)
-    
-    # 2. Preprocess
-    X, y, feature_names = preprocess_data(df, target_column, task_type, request.use_scaling)
+    # 1-2. Load and preprocess data (served from the feature cache on repeat runs)
+    report(progress, "preprocessing", 0.05)
+    X, y, feature_names, preprocessor, label_encoder = load_features(
+        dataset_name, target_column, task_type, request.use_scaling,
+        sparse_mode=request.sparse_mode, max_categories=request.max_categories, hash_buckets=request.hash_buckets,
+        feature_columns=request.feature_columns, optimize_memory=request.optimize_memory,
+        timings=timings
+    )
     
-    # 3. Downsample if dataset is too large to prevent extremely long training times
-    MAX_SAMPLES = 50000
-    if model_name in ["SVM", "KNN", "DBSCAN", "Agglomerative Clustering"]:
-        MAX_SAMPLES = 10000
-        
-    if X.shape[0] > MAX_SAMPLES:
-        import numpy as np
-        if y is not None and task_type == "Classification":
-            from sklearn.model_selection import StratifiedShuffleSplit
-            # Try stratified sampling first if we have enough samples of each class
-            try:
-                sss = StratifiedShuffleSplit(n_splits=1, train_size=MAX_SAMPLES, random_state=42)
-                for train_index, _ in sss.split(X, y):
-                    X = X[train_index]
-                    y = y[train_index]
-            except ValueError:
-                # Fallback to random sampling if stratified fails (e.g., small classes)
-                indices = np.random.choice(X.shape[0], MAX_SAMPLES, replace=False)
-                X = X[indices]
-                y = y[indices]
-        else:
-            indices = np.random.choice(X.shape[0], MAX_SAMPLES, replace=False)
-            X = X[indices]
-            if y is not None:
-                y = y[indices]
-
-    # 4. Get Model
-    model = get_model(task_type, model_name)
+    # 3. Downsample to the most rows that fit the memory and time budgets
+    with span(timings, "downsample"):
+        sampling = size_sample(request, model_name, X, sampling)
+        X, y = downsample(X, y, task_type, sampling["sample_rows"])
+
+    # 4. Optional k-fold cross-validation on the same matrix
+    cv_results = None
+    if request.use_cross_validation and task_type != "Clustering":
+        with span(timings, "cross_validation"):
+            cv_results = cross_validate(task_type, model_name, X, y, request.cv_folds, request.random_state, request.params, progress)
+
+    # 5. Train and Evaluate
+    if task_type != "Clustering":
+        with span(timings, "split"):
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=request.test_size, random_state=request.random_state)
+        result = fit_and_evaluate(task_type, model_name, X_train, y_train, X_test, y_test, feature_names, params=request.params,
+                                  preprocessor=preprocessor, label_encoder=label_encoder, progress=progress, timings=timings,
+                                  dataset_version=dataset_version)
+        if cv_results is not None:
+            result["cross_validation"] = cv_results
+    else:
+        result = fit_and_evaluate(task_type, model_name, X, None, feature_names=feature_names, params=request.params,
+                                  preprocessor=preprocessor, progress=progress, timings=timings, dataset_version=dataset_version)
+    result["timings"] = timings.as_dict()
+    result["sampling"] = sampling
+    return result
+
+def _evaluate_fold(task_type, model_name, params, X, y, fold, train_index, test_index):
+    # X arrives as a read-only memmap shared by all folds; only the fold's own
+    # rows are materialized here
+    X_train, X_test = X[train_index], X[test_index]
+    if sp.issparse(X_train) and not supports_sparse(model_name):
+        X_train, X_test = X_train.toarray(), X_test.toarray()
+
+    start = time.perf_counter()
+    model = get_model(task_type, model_name, params)
+    model.fit(X_train, y[train_index])
+    metrics = calculate_metrics(y[test_index], model.predict(X_test), task_type)
+    metrics["fit_seconds"] = time.perf_counter() - start
+    return {"fold": fold, **metrics}
+
+def cross_validate(task_type, model_name, X, y, n_folds=5, random_state=42, params=None, progress=None):
+    if task_type == "Classification":
+        splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+    else:
+        splitter = KFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+
+    parallel = Parallel(
+        n_jobs=min(n_folds, CV_N_JOBS) if CV_N_JOBS > 0 else CV_N_JOBS,
+        max_nbytes="1M",
+        mmap_mode="r",
+        return_as="generator_unordered",
+    )
+    tasks = (
+        delayed(_evaluate_fold)(task_type, model_name, params, X, y, fold, train_index, test_index)
+        for fold, (train_index, test_index) in enumerate(splitter.split(X, y))
+    )
+
+    # Per-fold metrics are published on the job as soon as each fold finishes
+    folds = []
+    for fold_metrics in parallel(tasks):
+        folds.append(fold_metrics)
+        report(progress, "cross_validation", 0.1 + 0.2 * len(folds) / n_folds, folds=sorted(folds, key=lambda f: f["fold"]))
+    folds.sort(key=lambda f: f["fold"])
+
+    metric_names = [k for k in folds[0] if k != "fold"]
+    return {
+        "n_folds": n_folds,
+        "folds": folds,
+        "mean": {k: float(np.mean([f[k] for f in folds])) for k in metric_names},
+        "std": {k: float(np.std([f[k] for f in folds])) for k in metric_names},
+    }
+
+def save_model(model, task_type, model_name, preprocessor=None, label_encoder=None, dataset_version=None):
+    # The fitted preprocessing is saved in front of the estimator so the pickle
+    # scores raw rows; the sidecar JSON describes its inputs and target classes
+    model_id = str(uuid.uuid4())
+    if preprocessor is not None:
+        model = Pipeline([("preprocessor", preprocessor), ("model", model)])
+    joblib.dump(model, os.path.join(MODEL_DIR, f"{model_id}.pkl"))
+
+    categorical_columns = []
+    if preprocessor is not None:
+        for name, _, columns in preprocessor.transformers_:
+            if name in ("cat", "hash"):
+                categorical_columns.extend(columns)
+    metadata = {
+        "task_type": task_type,
+        "model_name": model_name,
+        "pipeline": preprocessor is not None,
+        "input_columns": [str(c) for c in getattr(preprocessor, "feature_names_in_", [])],
+        "categorical_columns": [str(c) for c in categorical_columns],
+        "classes": label_encoder.classes_.tolist() if label_encoder is not None else None,
+        # Which rows the model has seen, so a warm-start retrain picks up only appended ones
+        "dataset": dataset_version,
+    }
+    with open(os.path.join(MODEL_DIR, f"{model_id}.json"), "w") as f:
+        json.dump(metadata, f)
+    return model_id
+
+def fit_and_evaluate(task_type, model_name, X_train, y_train, X_test=None, y_test=None, feature_names=None, params=None,
+                     preprocessor=None, label_encoder=None, progress=None, timings=None, model=None, dataset_version=None):
+    # Fits one model on an already prepared split and produces the full result
+    # (metrics, explanation, plots, saved model). For clustering X_train is the
+    # whole matrix and there is no test split. Passing a fitted `model` continues
+    # its training instead: partial_fit models take the rows as one more batch,
+    # warm_start ensembles add the estimators they were configured to add.
+
+    # Only densify for estimators without sparse support, after downsampling bounded the size
+    if sp.issparse(X_train) and not supports_sparse(model_name):
+        X_train = X_train.toarray()
+        if X_test is not None:
+            X_test = X_test.toarray()
+    X = X_train
+
+    continuing = model is not None
+    if not continuing:
+        model = get_model(task_type, model_name, params)
+    fit = getattr(model, "partial_fit", model.fit) if continuing else model.fit
     
-    # 4. Train and Evaluate
-    y_test = None
+    report(progress, "training", 0.3)
     y_pred = None
     
     if task_type != "Clustering":
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=request.test_size, random_state=request.random_state)
-        model.fit(X_train, y_train)
-        y_pred = model.predict(X_test)
+        with span(timings, "fit"):
+            fit(X_train, y_train)
+        with span(timings, "predict"):
+            y_pred = model.predict(X_test)
         
         # Check for overfitting (simple logic)
-        train_score = model.score(X_train, y_train)
-        test_score = model.score(X_test, y_test)
+        with span(timings, "score"):
+            train_score = model.score(X_train, y_train)
+            test_score = model.score(X_test, y_test)
     else:
-        y_pred = model.fit_predict(X)
+        with span(timings, "fit"):
+            if continuing:
+                fit(X)
+                y_pred = model.predict(X)
+            else:
+                y_pred = model.fit_predict(X)
         train_score = 0
         test_score = 0
         
     # 5. Metrics
-    metrics = calculate_metrics(y_test if task_type != "Clustering" else y_pred, y_pred, task_type, X if task_type == "Clustering" else None)
+    report(progress, "evaluating", 0.7)
+    with span(timings, "metrics"):
+        metrics = calculate_metrics(y_test if task_type != "Clustering" else y_pred, y_pred, task_type, X if task_type == "Clustering" else None)
     
     # Add overfitting info if relevant
     if task_type != "Clustering":
@@ -84,27 +222,36 @@ def train_model(request):
     if task_type != "Clustering" and train_score > test_score + 0.15:
         explanation += " Warning: The model shows signs of overfitting (high train score, low test score)."
     
-    # 7. Visualizations
-    visualizations = {}
-    if task_type == "Classification":
-        visualizations["confusion_matrix"] = generate_confusion_matrix(y_test, y_pred)
-        visualizations["feature_importance"] = generate_feature_importance(model, feature_names)
-        
-    elif task_type == "Regression":
-         visualizations["residual_plot"] = generate_residual_plot(y_test, y_pred)
-         visualizations["feature_importance"] = generate_feature_importance(model, feature_names)
-         
-    elif task_type == "Clustering":
-         visualizations["cluster_plot"] = generate_cluster_plot(X, y_pred)
+    # 7. Plot data (images are rendered on demand by the visualization endpoint)
+    report(progress, "visualizing", 0.8)
+    plot_data = {}
+    groups = feature_groups(preprocessor, X.shape[1])
+    with span(timings, "plots"):
+        if task_type == "Classification":
+            plot_data["confusion_matrix"] = confusion_matrix_data(y_test, y_pred)
+            plot_data["feature_importance"] = feature_importance_data(model, feature_names, groups=groups)
+            
+        elif task_type == "Regression":
+             plot_data["residual_plot"] = residual_data(y_test, y_pred)
+             plot_data["feature_importance"] = feature_importance_data(model, feature_names, groups=groups)
+             
+        elif task_type == "Clustering":
+             plot_data["cluster_plot"] = cluster_data(X, y_pred)
+    if task_type != "Clustering" and plot_data["feature_importance"] is None:
+        # Models without built-in importances (SVM, KNN, ...) get permutation importance
+        with span(timings, "importance"):
+            plot_data["feature_importance"] = permutation_importance_data(
+                model, X_test, y_test, groups or [(str(name), [i]) for i, name in enumerate(feature_names)])
+    plot_data = {kind: data for kind, data in plot_data.items() if data is not None}
 
     # 8. Save Model
-    model_id = str(uuid.uuid4())
-    model_path = os.path.join(MODEL_DIR, f"{model_id}.pkl")
-    joblib.dump(model, model_path)
+    report(progress, "saving", 0.95)
+    with span(timings, "save"):
+        model_id = save_model(model, task_type, model_name, preprocessor, label_encoder, dataset_version)
     
     return {
         "metrics": metrics,
         "explanation": explanation,
-        "visualizations": visualizations,
+        "plot_data": plot_data,
         "model_id": model_id
     }
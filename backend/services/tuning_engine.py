@@ -0,0 +1,143 @@
+from services.preprocessing import load_features
+from services import dataset_store
+from services.model_factory import get_model, supports_sparse
+from services.training_engine import downsample, fit_and_evaluate
+from services.job_manager import CORES_PER_WORKER, report
+from services.resource_governor import size_sample
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingRandomSearchCV, train_test_split
+from scipy.stats import loguniform, randint, uniform
+import numpy as np
+import scipy.sparse as sp
+import math
+import os
+import time
+
+# Worker processes used to evaluate configurations in parallel (default: the
+# job's share of the cores, -1 = all cores)
+TUNING_N_JOBS = int(os.getenv("TUNING_N_JOBS", CORES_PER_WORKER))
+
+
+def build_distributions(param_space):
+    # Lists are sampled as choices; {"low", "high", "log", "type": "int"} as ranges
+    distributions = {}
+    for name, spec in param_space.items():
+        if isinstance(spec, list):
+            distributions[name] = spec
+        elif isinstance(spec, dict) and "low" in spec and "high" in spec:
+            low, high = spec["low"], spec["high"]
+            if spec.get("type") == "int":
+                distributions[name] = randint(int(low), int(high) + 1)
+            elif spec.get("log"):
+                distributions[name] = loguniform(low, high)
+            else:
+                distributions[name] = uniform(low, high - low)
+        else:
+            raise ValueError(f"Invalid search space for parameter {name}")
+    return distributions
+
+
+def _to_python(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _run_bracket(estimator, distributions, X, y, n_candidates, min_resources, request, bracket):
+    search = HalvingRandomSearchCV(
+        estimator,
+        distributions,
+        n_candidates=n_candidates,
+        factor=request.factor,
+        resource="n_samples",
+        min_resources=min_resources,
+        cv=request.cv_folds,
+        random_state=request.random_state + bracket,
+        n_jobs=TUNING_N_JOBS,
+        refit=False,
+    )
+    search.fit(X, y)
+
+    results = search.cv_results_
+    trials = []
+    for i in range(len(results["params"])):
+        score = results["mean_test_score"][i]
+        trials.append({
+            "bracket": bracket,
+            "rung": int(results["iter"][i]),
+            "n_resources": int(results["n_resources"][i]),
+            "params": {k: _to_python(v) for k, v in results["params"][i].items()},
+            "score": None if np.isnan(score) else float(score),
+            "fit_seconds": float(results["mean_fit_time"][i]),
+            "score_seconds": float(results["mean_score_time"][i]),
+        })
+    return trials
+
+
+def tune_model(request, progress=None, sampling=None):
+    # request is TuneRequest object; sampling is the plan it was admitted with
+    task_type = request.task_type
+    model_name = request.model_name
+    if task_type == "Clustering":
+        raise ValueError("Hyperparameter search needs a supervised task")
+
+    report(progress, "preprocessing", 0.05)
+    dataset_version = dataset_store.version(request.dataset_name)
+    X, y, feature_names, preprocessor, label_encoder = load_features(
+        request.dataset_name, request.target_column, task_type, request.use_scaling,
+        sparse_mode=request.sparse_mode, max_categories=request.max_categories, hash_buckets=request.hash_buckets,
+        feature_columns=request.feature_columns, optimize_memory=request.optimize_memory
+    )
+    sampling = size_sample(request, model_name, X, sampling)
+    X, y = downsample(X, y, task_type, sampling["sample_rows"])
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=request.test_size, random_state=request.random_state)
+
+    X_search = X_train
+    if sp.issparse(X_search) and not supports_sparse(model_name):
+        X_search = X_search.toarray()
+
+    distributions = build_distributions(request.param_space)
+    estimator = get_model(task_type, model_name)
+
+    # Successive halving evaluates many configurations on small subsamples and
+    # only promotes the best 1/factor of them to the next, larger rung.
+    # Hyperband runs several such brackets that trade the number of starting
+    # configurations against the size of the smallest rung.
+    max_resources = X_search.shape[0]
+    floor_resources = max(request.cv_folds * 10, request.min_resources or 0)
+    if request.strategy == "hyperband":
+        s_max = max(int(math.log(max_resources / floor_resources, request.factor)), 0)
+        brackets = [
+            (s, math.ceil((s_max + 1) / (s + 1) * request.factor ** s), max(floor_resources, max_resources // request.factor ** s))
+            for s in range(s_max, -1, -1)
+        ]
+    else:
+        brackets = [(0, request.n_candidates, request.min_resources or "smallest")]
+
+    start = time.perf_counter()
+    trials = []
+    for i, (bracket, n_candidates, min_resources) in enumerate(brackets):
+        report(progress, "searching", 0.1 + 0.7 * i / len(brackets), bracket=bracket, trials=len(trials))
+        trials.extend(_run_bracket(estimator, distributions, X_search, y_train, n_candidates, min_resources, request, bracket))
+    search_seconds = time.perf_counter() - start
+
+    # The winner is the best score on the largest resource level any trial reached
+    scored = [t for t in trials if t["score"] is not None]
+    if not scored:
+        raise ValueError("Every configuration failed to fit; check the search space")
+    best = max(scored, key=lambda t: (t["n_resources"], t["score"]))
+
+    # Refit the best configuration on the full training split and evaluate it like a normal run
+    report(progress, "training", 0.85)
+    result = fit_and_evaluate(task_type, model_name, X_train, y_train, X_test, y_test, feature_names, params=best["params"],
+                              preprocessor=preprocessor, label_encoder=label_encoder, dataset_version=dataset_version)
+    result["tuning"] = {
+        "strategy": request.strategy,
+        "best_params": best["params"],
+        "best_cv_score": best["score"],
+        "n_trials": len(trials),
+        "search_seconds": search_seconds,
+        "trials": trials,
+    }
+    result["sampling"] = sampling
+    return result
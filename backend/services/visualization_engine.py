@@ -1,33 +1,42 @@
-import matplotlib
-matplotlib.use('Agg') # Non-interactive backend
-import matplotlib.pyplot as plt
-import seaborn as sns
 import io
-import base64
+import os
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
 from sklearn.metrics import confusion_matrix
+from sklearn.decomposition import PCA
+from sklearn.random_projection import SparseRandomProjection
+from services.metrics_engine import stratified_sample
+from services import telemetry
 import numpy as np
+import scipy.sparse as sp
 
-# Set style
-sns.set_theme(style="whitegrid")
+# Training only stores the compact data behind each plot; images are rendered
+# on first request and kept in a byte-bounded LRU of PNGs.
+PLOT_SAMPLE_SIZE = int(os.getenv("PLOT_SAMPLE_SIZE", 2000))
+# Above this many points scatter plots become a 2D histogram of every point (with
+# a few sampled markers on top), so payload and render time stay constant
+PLOT_DENSITY_THRESHOLD = int(os.getenv("PLOT_DENSITY_THRESHOLD", 5000))
+PLOT_DENSITY_BINS = int(os.getenv("PLOT_DENSITY_BINS", 60))
+DENSITY_MARKERS = 300
+# PCA is fitted on at most this many rows; sparse or very wide matrices use a random projection
+PROJECTION_FIT_SIZE = 10000
+PCA_MAX_FEATURES = 1000
+RENDER_CACHE_BYTES = int(os.getenv("RENDER_CACHE_BYTES", 64 * 1024 ** 2))
 
-def plot_to_base64(fig):
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight', dpi=100)
-    buf.seek(0)
-    img_str = base64.b64encode(buf.read()).decode('utf-8')
-    plt.close(fig)
-    return img_str
-
-def generate_confusion_matrix(y_true, y_pred, labels=None):
-    cm = confusion_matrix(y_true, y_pred)
-    fig, ax = plt.subplots(figsize=(8, 6))
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', ax=ax)
-    ax.set_title('Confusion Matrix')
-    ax.set_ylabel('Actual')
-    ax.set_xlabel('Predicted')
-    return plot_to_base64(fig)
+# --- Plot data (computed at training time, JSON-serializable) ---
 
-def generate_feature_importance(model, feature_names):
+def _sample_indices(n, max_points, random_state=42):
+    if n <= max_points:
+        return np.arange(n)
+    return np.sort(np.random.RandomState(random_state).choice(n, max_points, replace=False))
+
+def confusion_matrix_data(y_true, y_pred):
+    return {"matrix": confusion_matrix(y_true, y_pred).tolist()}
+
+def feature_importance_data(model, feature_names, top_k=10, groups=None):
+    # groups ([(input column, [feature indices])], see importance_engine.feature_groups)
+    # sums each column's encoded features back into one bar
     importances = None
     if hasattr(model, 'feature_importances_'):
         importances = model.feature_importances_
@@ -37,41 +46,185 @@ def generate_feature_importance(model, feature_names):
              importances = np.mean(np.abs(model.coef_), axis=0) # Average abs importance across classes
          else:
              importances = np.abs(model.coef_)
-             
+
     if importances is None:
         return None
-        
+
     # Sort top 10
     if len(feature_names) != len(importances):
          # Mismatch fallback
          return None
-         
-    indices = np.argsort(importances)[-10:]
-    
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.barh(range(len(indices)), importances[indices], color='#4f46e5', align='center')
-    ax.set_yticks(range(len(indices)))
-    ax.set_yticklabels([feature_names[i] for i in indices])
-    ax.set_xlabel('Relative Importance')
-    ax.set_title('Top 10 Feature Importances')
-    return plot_to_base64(fig)
 
-def generate_residual_plot(y_true, y_pred):
+    if groups is not None:
+        feature_names = [name for name, _ in groups]
+        importances = np.array([importances[positions].sum() for _, positions in groups])
+
+    indices = np.argsort(importances)[-top_k:]
+    return {
+        "features": [str(feature_names[i]) for i in indices],
+        "importances": [float(importances[i]) for i in indices],
+        "method": "native",
+    }
+
+def _density(x, y):
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=PLOT_DENSITY_BINS)
+    return {"x_edges": x_edges.tolist(), "y_edges": y_edges.tolist(), "counts": counts.astype(int).tolist()}
+
+def residual_data(y_true, y_pred, max_points=PLOT_SAMPLE_SIZE):
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
     residuals = y_true - y_pred
-    fig, ax = plt.subplots(figsize=(8, 6))
-    sns.scatterplot(x=y_pred, y=residuals, ax=ax, alpha=0.6)
+    if len(y_pred) > PLOT_DENSITY_THRESHOLD:
+        return {"mode": "density", "n_points": len(y_pred), **_density(y_pred, residuals)}
+    indices = _sample_indices(len(y_pred), max_points)
+    return {"predicted": y_pred[indices].tolist(), "residuals": residuals[indices].tolist()}
+
+def project_2d(X, random_state=42):
+    # Returns the 2D coordinates of every row and the projection method used
+    if X.shape[1] == 2:
+        return np.asarray(X.toarray() if sp.issparse(X) else X, dtype=float), "raw"
+    if sp.issparse(X) or X.shape[1] > PCA_MAX_FEATURES:
+        projection = SparseRandomProjection(n_components=2, random_state=random_state).fit(X)
+        points = projection.transform(X)
+        return np.asarray(points.toarray() if sp.issparse(points) else points, dtype=float), "random_projection"
+    pca = PCA(n_components=2, random_state=random_state)
+    pca.fit(X[_sample_indices(X.shape[0], PROJECTION_FIT_SIZE, random_state)])
+    return pca.transform(X), "pca"
+
+def cluster_data(X, labels, max_points=PLOT_SAMPLE_SIZE):
+    if X.shape[1] < 2:
+        return None
+    labels = np.asarray(labels)
+    points, projection = project_2d(X)
+
+    # Markers are sampled per cluster so small clusters stay visible
+    dense = len(labels) > PLOT_DENSITY_THRESHOLD
+    indices, _ = stratified_sample(labels, DENSITY_MARKERS if dense else max_points, min_per_cluster=5)
+    data = {
+        "projection": projection,
+        "x": points[indices, 0].tolist(),
+        "y": points[indices, 1].tolist(),
+        "labels": labels[indices].tolist(),
+    }
+    if dense:
+        data.update({"mode": "density", "n_points": len(labels), **_density(points[:, 0], points[:, 1])})
+    return data
+
+# --- Rendering (on demand) ---
+
+_plotting_lock = threading.Lock()
+_plotting = None
+
+def load_plotting():
+    # matplotlib and seaborn are imported on the first render, so training
+    # workers and API processes that never draw a plot don't pay for them
+    global _plotting
+    with _plotting_lock:
+        if _plotting is None:
+            import matplotlib
+            matplotlib.use('Agg') # Non-interactive backend
+            from matplotlib.figure import Figure
+            from matplotlib.colors import LogNorm
+            import seaborn as sns
+            sns.set_theme(style="whitegrid")
+            _plotting = SimpleNamespace(Figure=Figure, LogNorm=LogNorm, sns=sns)
+    return _plotting
+
+def plot_to_png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight', dpi=100)
+    return buf.getvalue()
+
+def render_confusion_matrix(data):
+    mpl = load_plotting()
+    fig = mpl.Figure(figsize=(8, 6))
+    ax = fig.subplots()
+    mpl.sns.heatmap(np.array(data["matrix"]), annot=True, fmt='d', cmap='Blues', ax=ax)
+    ax.set_title('Confusion Matrix')
+    ax.set_ylabel('Actual')
+    ax.set_xlabel('Predicted')
+    return plot_to_png(fig)
+
+def render_feature_importance(data):
+    fig = load_plotting().Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    positions = range(len(data["features"]))
+    ax.barh(positions, data["importances"], color='#4f46e5', align='center')
+    ax.set_yticks(positions)
+    ax.set_yticklabels(data["features"])
+    ax.set_xlabel('Score drop when shuffled' if data.get("method") == "permutation" else 'Relative Importance')
+    ax.set_title('Top 10 Feature Importances')
+    return plot_to_png(fig)
+
+def _draw_density(fig, ax, data):
+    counts = np.array(data["counts"]).T
+    mesh = ax.pcolormesh(data["x_edges"], data["y_edges"], np.ma.masked_equal(counts, 0), cmap='mako_r',
+                         norm=load_plotting().LogNorm(vmin=1, vmax=max(counts.max(), 1)))
+    fig.colorbar(mesh, ax=ax, label='Points per bin')
+
+def render_residual_plot(data):
+    mpl = load_plotting()
+    fig = mpl.Figure(figsize=(8, 6))
+    ax = fig.subplots()
+    if data.get("mode") == "density":
+        _draw_density(fig, ax, data)
+        ax.set_title(f'Residual Density ({data["n_points"]:,} points)')
+    else:
+        mpl.sns.scatterplot(x=data["predicted"], y=data["residuals"], ax=ax, alpha=0.6)
+        ax.set_title('Residual Plot')
     ax.axhline(0, color='r', linestyle='--')
     ax.set_xlabel('Predicted Values')
     ax.set_ylabel('Residuals')
-    ax.set_title('Residual Plot')
-    return plot_to_base64(fig)
+    return plot_to_png(fig)
 
-def generate_cluster_plot(X, labels):
-    # Visualize first two dimensions if > 2, or use PCA (simplified here - just first 2 cols)
-    if X.shape[1] < 2:
-        return None
-        
-    fig, ax = plt.subplots(figsize=(8, 6))
-    sns.scatterplot(x=X[:, 0], y=X[:, 1], hue=labels, palette='viridis', ax=ax, s=50)
-    ax.set_title('Cluster Visualization (First 2 Components)')
-    return plot_to_base64(fig)
+PROJECTION_TITLES = {
+    "pca": "PCA Projection",
+    "random_projection": "Random Projection",
+    "raw": "First 2 Components",
+}
+
+def render_cluster_plot(data):
+    mpl = load_plotting()
+    fig = mpl.Figure(figsize=(8, 6))
+    ax = fig.subplots()
+    title = f'Cluster Visualization ({PROJECTION_TITLES.get(data.get("projection"), "First 2 Components")})'
+    if data.get("mode") == "density":
+        _draw_density(fig, ax, data)
+        mpl.sns.scatterplot(x=data["x"], y=data["y"], hue=data["labels"], palette='viridis', ax=ax, s=12, edgecolor=None)
+        title += f' - {data["n_points"]:,} points'
+    else:
+        mpl.sns.scatterplot(x=data["x"], y=data["y"], hue=data["labels"], palette='viridis', ax=ax, s=50)
+    ax.set_title(title)
+    return plot_to_png(fig)
+
+RENDERERS = {
+    "confusion_matrix": render_confusion_matrix,
+    "feature_importance": render_feature_importance,
+    "residual_plot": render_residual_plot,
+    "cluster_plot": render_cluster_plot,
+}
+
+_render_lock = threading.Lock()
+_render_cache = OrderedDict()  # key -> PNG bytes
+_render_cache_bytes = 0
+
+def render_plot(key, kind, data):
+    # key identifies immutable plot data (e.g. experiment id + kind)
+    global _render_cache_bytes
+    with _render_lock:
+        png = _render_cache.get(key)
+        if png is not None:
+            _render_cache.move_to_end(key)
+            telemetry.cache_lookup("render", True)
+            return png
+        telemetry.cache_lookup("render", False)
+
+        # seaborn/matplotlib share global state, so renders are serialized
+        png = RENDERERS[kind](data)
+
+        _render_cache[key] = png
+        _render_cache_bytes += len(png)
+        while _render_cache_bytes > RENDER_CACHE_BYTES and len(_render_cache) > 1:
+            _, evicted = _render_cache.popitem(last=False)
+            _render_cache_bytes -= len(evicted)
+        return png
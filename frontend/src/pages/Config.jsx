@@ -18,6 +18,7 @@ const ConfigPage = () => {
     const [targetColumn, setTargetColumn] = useState('');
     const [testSize, setTestSize] = useState(0.2);
     const [useScaling, setUseScaling] = useState(true);
+    const [useCrossValidation, setUseCrossValidation] = useState(false);
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState(null);
 
@@ -48,11 +49,14 @@ const ConfigPage = () => {
 
     // Model Options
     const models = {
-        'Classification': ['Logistic Regression', 'Random Forest', 'SVM', 'KNN'],
-        'Regression': ['Linear Regression', 'Random Forest Regressor', 'Gradient Boosting'],
-        'Clustering': ['KMeans', 'DBSCAN', 'Agglomerative Clustering']
+        'Classification': ['Logistic Regression', 'Random Forest', 'SVM', 'KNN', 'SGD Classifier'],
+        'Regression': ['Linear Regression', 'Random Forest Regressor', 'Gradient Boosting', 'SGD Regressor'],
+        'Clustering': ['KMeans', 'DBSCAN', 'Agglomerative Clustering', 'MiniBatch KMeans']
     };
 
+    // These train chunk by chunk on the full dataset instead of a downsample
+    const streamingModels = ['SGD Classifier', 'SGD Regressor', 'MiniBatch KMeans'];
+
     // Auto-select first model when task type changes
     useEffect(() => {
         setModelName(models[taskType][0]);
@@ -73,18 +77,37 @@ const ConfigPage = () => {
             model_name: modelName,
             target_column: targetColumn || null,
             test_size: parseFloat(testSize),
-            use_scaling: useScaling
+            use_scaling: useScaling,
+            use_cross_validation: taskType !== 'Clustering' && useCrossValidation && !streamingModels.includes(modelName),
+            streaming: streamingModels.includes(modelName)
         };
 
         try {
             console.log("Sending payload:", payload);
-            const response = await client.post('/train', payload);
+            const { data: job } = await client.post('/train', payload);
+            console.log("Training job queued:", job);
+
+            // Training runs in a background worker; poll the job until it finishes
+            let status = job;
+            while (!['completed', 'failed', 'cancelled'].includes(status.status)) {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                status = (await client.get(`/jobs/${job.id}`)).data;
+            }
+            if (status.status !== 'completed') {
+                throw new Error(status.error || `Training ${status.status}.`);
+            }
+
+            const response = await client.get(`/jobs/${job.id}/result`);
             console.log("Received response:", response.data);
 
             // The API returns the full experiment object. 
             // The actual training results (metrics, viz, explanation) are stored in the 'metrics' field.
             // We need to unpack this for the Results page.
-            const trainingResults = response.data.metrics;
+            const trainingResults = {
+                ...response.data.metrics,
+                experiment_id: response.data.id,
+                model_name: response.data.model_name
+            };
             console.log("Unpacked results:", trainingResults);
 
             localStorage.setItem('training_results', JSON.stringify(trainingResults));
@@ -92,7 +115,7 @@ const ConfigPage = () => {
             navigate('/results');
         } catch (err) {
             console.error("Training error:", err);
-            setError(err.response?.data?.detail || "Training failed. Please check your configuration.");
+            setError(err.response?.data?.detail || err.message || "Training failed. Please check your configuration.");
         } finally {
             setLoading(false);
         }
@@ -196,6 +219,22 @@ const ConfigPage = () => {
                                 </button>
                             </div>
 
+                            {/* Cross-Validation Toggle */}
+                            {taskType !== 'Clustering' && (
+                                <div className="flex items-center justify-between p-4 bg-slate-950/50 rounded-xl border border-slate-800/50">
+                                    <div>
+                                        <h4 className="text-slate-200 font-medium mb-1">Cross-Validation</h4>
+                                        <p className="text-xs text-slate-500">Report 5-fold mean and spread of the metrics</p>
+                                    </div>
+                                    <button
+                                        onClick={() => setUseCrossValidation(!useCrossValidation)}
+                                        className={`w-12 h-6 rounded-full transition-colors relative ${useCrossValidation ? 'bg-brand-600' : 'bg-slate-700'}`}
+                                    >
+                                        <div className={`w-4 h-4 rounded-full bg-white absolute top-1 transition-transform shadow-sm ${useCrossValidation ? 'left-7' : 'left-1'}`} />
+                                    </button>
+                                </div>
+                            )}
+
                             {/* Test Split Slider */}
                             {taskType !== 'Clustering' && (
                                 <div className="p-4 bg-slate-950/50 rounded-xl border border-slate-800/50">
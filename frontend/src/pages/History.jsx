@@ -1,23 +1,35 @@
 import React, { useEffect, useState } from 'react';
 import client from '../api/client';
 import Card from '../components/ui/Card';
+import Button from '../components/ui/Button';
 import { motion } from 'framer-motion';
 
 const HistoryPage = () => {
     const [history, setHistory] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+
+    // History is paginated, most recent first; next_cursor fetches the page after the last one shown
+    const fetchHistory = async (cursor = null) => {
+        try {
+            const res = await client.get('/history', { params: cursor ? { cursor } : {} });
+            setHistory(prev => (cursor ? [...prev, ...res.data.items] : res.data.items));
+            setNextCursor(res.data.next_cursor);
+        } catch (err) {
+            console.error(err);
+        }
+    };
 
     useEffect(() => {
-        const fetchHistory = async () => {
-            try {
-                const res = await client.get('/history');
-                setHistory(res.data);
-            } catch (err) {
-                console.error(err);
-            }
-        };
         fetchHistory();
     }, []);
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        await fetchHistory(nextCursor);
+        setLoadingMore(false);
+    };
+
     const formatMetric = (taskType, metricsObj) => {
         if (!metricsObj) return 'N/A';
         // The backend stores the full result in the metrics column, meaning actual metrics might be nested
@@ -63,7 +75,7 @@ const HistoryPage = () => {
                         key={exp.id}
                         initial={{ opacity: 0, x: -20 }}
                         animate={{ opacity: 1, x: 0 }}
-                        transition={{ delay: index * 0.05 }}
+                        transition={{ delay: (index % 50) * 0.05 }}
                     >
                         <Card className="flex flex-col md:flex-row justify-between items-start md:items-center bg-slate-900/50 hover:bg-slate-800/80 transition-all duration-300 cursor-pointer border-slate-800/50 hover:border-brand-500/30 group">
                             <div className="mb-4 md:mb-0">
@@ -88,6 +100,14 @@ const HistoryPage = () => {
                     </motion.div>
                 ))}
             </div>
+
+            {nextCursor && (
+                <div className="flex justify-center mt-8">
+                    <Button variant="secondary" onClick={loadMore} disabled={loadingMore}>
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                    </Button>
+                </div>
+            )}
         </div>
     );
 };
@@ -40,7 +40,10 @@ const ResultsPage = () => {
         );
     }
 
-    const { metrics = {}, explanation = "No explanation available.", visualizations = {}, model_id } = results || {};
+    const { metrics = {}, explanation = "No explanation available.", plot_data = {}, model_id, experiment_id } = results || {};
+
+    // Plots are rendered on demand by the API (and cached by the browser)
+    const plotUrl = (kind) => `${client.defaults.baseURL}/experiments/${experiment_id}/plots/${kind}`;
 
     const formatKey = (key) => key.replace(/_/g, ' ').toUpperCase();
 
@@ -107,34 +110,34 @@ const ResultsPage = () => {
 
                 {/* Visualizations */}
                 <div className="lg:col-span-2 space-y-8">
-                    {visualizations && visualizations.confusion_matrix && (
+                    {experiment_id && plot_data.confusion_matrix && (
                         <Card title="Confusion Matrix">
                             <div className="bg-white/5 rounded-xl p-4">
-                                <img src={`data:image/png;base64,${visualizations.confusion_matrix}`} alt="Confusion Matrix" className="w-full rounded-lg" />
+                                <img src={plotUrl('confusion_matrix')} alt="Confusion Matrix" className="w-full rounded-lg" />
                             </div>
                         </Card>
                     )}
 
-                    {visualizations && visualizations.feature_importance && (
+                    {experiment_id && plot_data.feature_importance && (
                         <Card title="Feature Importance">
                             <div className="bg-white/5 rounded-xl p-4">
-                                <img src={`data:image/png;base64,${visualizations.feature_importance}`} alt="Feature Importance" className="w-full rounded-lg" />
+                                <img src={plotUrl('feature_importance')} alt="Feature Importance" className="w-full rounded-lg" />
                             </div>
                         </Card>
                     )}
 
-                    {visualizations && visualizations.residual_plot && (
+                    {experiment_id && plot_data.residual_plot && (
                         <Card title="Residuals">
                             <div className="bg-white/5 rounded-xl p-4">
-                                <img src={`data:image/png;base64,${visualizations.residual_plot}`} alt="Residual Plot" className="w-full rounded-lg" />
+                                <img src={plotUrl('residual_plot')} alt="Residual Plot" className="w-full rounded-lg" />
                             </div>
                         </Card>
                     )}
 
-                    {visualizations && visualizations.cluster_plot && (
+                    {experiment_id && plot_data.cluster_plot && (
                         <Card title="Cluster Visualization">
                             <div className="bg-white/5 rounded-xl p-4">
-                                <img src={`data:image/png;base64,${visualizations.cluster_plot}`} alt="Clusters" className="w-full rounded-lg" />
+                                <img src={plotUrl('cluster_plot')} alt="Clusters" className="w-full rounded-lg" />
                             </div>
                         </Card>
                     )}